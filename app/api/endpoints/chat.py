@@ -26,18 +26,18 @@ def _get_chat_session():
     response_model=ChatResponse,
     responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
 )
-def ask_question(request: ChatRequest):
+async def ask_question(request: ChatRequest):
     """
     Gửi câu hỏi và nhận câu trả lời từ hệ thống RAG.
     """
-    logger.info(f"[ASK] Received: question='{request.question}', tenant={request.tenant_id}, role={request.role_id}, user={request.user_id}, employee={request.employee_id}, is_manager={request.is_manager}, dept_ids={request.department_ids}")
+    logger.info(f"[ASK] Received: question='{request.question}', tenant={request.tenant_id}, role={request.role_id}, roles={request.role_ids}, user={request.user_id}, employee={request.employee_id}, is_manager={request.is_manager}, dept_ids={request.department_ids}")
     try:
         chat_session = _get_chat_session()
-        logger.info("[ASK] Calling chat_session()...")
-        result, processing_time = chat_session.chat_session(
+        logger.info("[ASK] Calling achat_session()...")
+        result, processing_time = await chat_session.achat_session(
             query_input=request.question,
             tenant_id=request.tenant_id,
-            access_role=request.role_id,
+            access_role=sorted({request.role_id, *request.role_ids}) if request.role_ids else request.role_id,
             employee_id=request.user_id,
             employee_db_id=request.employee_id,
             is_manager=request.is_manager,
@@ -54,6 +54,7 @@ def ask_question(request: ChatRequest):
             metadata={
                 "processing_time_seconds": round(processing_time, 2),
                 "citation": result.get("citation", ""),
+                "search_query": result.get("search_query", request.question),
                 "tenant_id": request.tenant_id,
                 "user_id": request.user_id,
                 "role_id": request.role_id,
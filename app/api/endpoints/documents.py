@@ -0,0 +1,69 @@
+"""
+Documents Endpoint
+Quản lý vòng đời tài liệu của tenant: liệt kê, xóa, thay thế (versioned, đổi phiên bản active 1 lần)
+"""
+
+import asyncio
+
+from fastapi import APIRouter, UploadFile, Form, HTTPException, BackgroundTasks
+
+from app.models.schemas import DocumentListResponse, ErrorResponse
+from app.api.endpoints.upload import process_file_background, save_upload_file
+from app.core.upload import invalidate_retrieval_cache
+
+router = APIRouter()
+
+
+def _get_db_client():
+    from app.core.upload import _get_db_client
+    return _get_db_client()
+
+
+@router.get("/documents", response_model=DocumentListResponse, responses={500: {"model": ErrorResponse}})
+def list_documents(tenant_id: str):
+    """Danh sách tài liệu đang active của tenant kèm số chunk."""
+    try:
+        documents = _get_db_client().list_documents(tenant_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Không thể lấy danh sách tài liệu: {e}")
+
+    return DocumentListResponse(tenant_id=tenant_id, documents=documents)
+
+
+@router.delete("/documents/{filename}", responses={500: {"model": ErrorResponse}})
+async def delete_document(filename: str, tenant_id: str):
+    """Xóa toàn bộ chunks (và parent sections) của tài liệu."""
+    try:
+        # Client khởi tạo lần đầu load model embedding -> không chạy trên event loop
+        db_client = await asyncio.to_thread(_get_db_client)
+        await db_client.adelete_document(tenant_id, filename)
+        await asyncio.to_thread(invalidate_retrieval_cache, tenant_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Không thể xóa tài liệu: {e}")
+
+    return {"success": True, "message": "Đã xóa tài liệu", "filename": filename}
+
+
+@router.put("/documents/{filename}")
+async def replace_document(
+    filename: str,
+    background_tasks: BackgroundTasks,
+    file: UploadFile,
+    tenant_id: str = Form(...),
+    accessed_role_list: str = Form(...),
+):
+    """
+    Thay thế tài liệu bằng file mới:
+    - Phiên bản cũ vẫn được search cho tới khi phiên bản mới ghi xong
+    - Đổi phiên bản active 1 lần, phiên bản cũ được xóa ở background
+    """
+    document_id, temp_path, role_list = await save_upload_file(file, accessed_role_list)
+
+    background_tasks.add_task(process_file_background, temp_path, tenant_id, role_list, document_id, filename, True)
+
+    return {
+        "success": True,
+        "message": "File đã được nhận, phiên bản mới đang xử lý ở background",
+        "document_id": document_id,
+        "filename": filename,
+    }
@@ -16,8 +16,14 @@ router = APIRouter()
 
 def _check_qdrant() -> bool:
     try:
+        if settings.qdrant_local_path:
+            # Local mode: dùng chung client embedded với VectorStoreService
+            from app.services.qdrant_service import get_local_client
+            get_local_client(settings.qdrant_local_path).get_collections()
+            return True
+
         from qdrant_client import QdrantClient
-        client = QdrantClient(url=settings.qdrant_url, timeout=3)
+        client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key, timeout=3)
         client.get_collections()
         return True
     except Exception:
@@ -64,3 +70,25 @@ async def health_check():
         services=services,
         version="1.0.0",
     )
+
+
+@router.get("/health/models")
+async def model_status():
+    """Thời gian load và bộ nhớ (RSS) của các model đã load trong process"""
+    from app.services.model_registry import model_registry
+    return model_registry.stats()
+
+
+@router.get("/health/query-rewrite")
+async def query_rewrite_status():
+    """Tỉ lệ lượt chat phải viết lại câu hỏi (theo lý do) và số lần dùng lại kết quả đã cache"""
+    from app.core.chat import query_rewriter
+    return query_rewriter.stats()
+
+
+@router.get("/health/document-gc")
+async def document_gc_status():
+    """Các lần xóa phiên bản cũ sau replace bị lỗi (point cũ vẫn bị ẩn, được xóa lại ở lần replace kế tiếp)"""
+    from app.core import upload
+    failures = list(upload._db_client.gc_failures) if upload._db_client is not None else []
+    return {"count": len(failures), "failures": failures}
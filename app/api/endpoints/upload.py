@@ -15,7 +15,7 @@ from app.models.schemas import ErrorResponse
 router = APIRouter()
 
 
-def process_file_background(temp_path: Path, tenant_id: str, role_list: list, document_id: str):
+def process_file_background(temp_path: Path, tenant_id: str, role_list: list, document_id: str, filename: str, replace: bool = False):
     """Background task: OCR → Chunking → Embedding → Qdrant"""
     try:
         print(f"[BG] Bắt đầu xử lý file: {temp_path.name} (doc_id: {document_id})")
@@ -27,6 +27,8 @@ def process_file_background(temp_path: Path, tenant_id: str, role_list: list, do
             src_file=temp_path,
             tenant_id=tenant_id,
             accessed_role_list=role_list,
+            src_name=filename,
+            replace=replace,
         )
 
         print(f"[BG] Hoàn thành: {temp_path.name} trong {time.time() - start:.1f}s")
@@ -43,20 +45,8 @@ def process_file_background(temp_path: Path, tenant_id: str, role_list: list, do
             pass
 
 
-@router.post("/upload")
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile,
-    tenant_id: str = Form(...),
-    accessed_role_list: str = Form(...),
-):
-    """
-    Upload file PDF:
-    1. Validate file (PDF, max 50MB)
-    2. Lưu file tạm
-    3. Trả response ngay cho client
-    4. Xử lý OCR + Chunking + Embedding ở background
-    """
+async def save_upload_file(file: UploadFile, accessed_role_list: str):
+    """Validate file (PDF, max 50MB) + role list, lưu file tạm. Trả về (document_id, temp_path, role_list)."""
 
     # --- Validate ---
     if not file.filename or not file.filename.lower().endswith(".pdf"):
@@ -84,8 +74,28 @@ async def upload_file(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Không thể lưu file: {e}")
 
+    return document_id, temp_path, role_list
+
+
+@router.post("/upload")
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile,
+    tenant_id: str = Form(...),
+    accessed_role_list: str = Form(...),
+):
+    """
+    Upload file PDF:
+    1. Validate file (PDF, max 50MB)
+    2. Lưu file tạm
+    3. Trả response ngay cho client
+    4. Xử lý OCR + Chunking + Embedding ở background
+    """
+
+    document_id, temp_path, role_list = await save_upload_file(file, accessed_role_list)
+
     # --- Đẩy vào background, trả response ngay ---
-    background_tasks.add_task(process_file_background, temp_path, tenant_id, role_list, document_id)
+    background_tasks.add_task(process_file_background, temp_path, tenant_id, role_list, document_id, file.filename)
 
     return {
         "success": True,
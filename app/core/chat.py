@@ -1,15 +1,20 @@
 import sys
 import os
 import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger("uvicorn.error")
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from app.services.llm_service import OllamaChatLLM, RerankerService, PromptBuilder
-from app.services.qdrant_service import VectorStoreService
+from app.services.qdrant_service import RERANK_PAYLOAD_FIELDS, VectorStoreService, fuse_candidates
 from app.services.memory_service import RedisChatMemory
+from app.services.query_rewriter import QueryRewriter, detect_follow_up
+from app.services.retrieval_cache import RetrievalCache
+from app.core.config import settings
 
 """
 Hệ thống trò chuyện:
@@ -45,12 +50,104 @@ rerank_client = RerankerService()
 prompt_client = PromptBuilder()
 memory_client = RedisChatMemory()
 llm_client = OllamaChatLLM()
+query_rewriter = QueryRewriter(memory_client)
+# Speculative retrieval: LLM viết lại câu hỏi chạy ở thread riêng trong lúc search câu hỏi gốc
+rewrite_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rewrite")
+# Cache bộ ứng viên đã rerank của lượt trước (theo tenant_id, employee_id)
+retrieval_cache = RetrievalCache() if settings.retrieval_cache_enabled else None
+
+
+# Mặc định của _cached_search(entry=...): phân biệt "chưa đọc cache" với "đã đọc, miss" (None)
+_UNSET = object()
+
+
+def _rewrite_query(query, tenant_id, employee_id, chat_history, reason):
+    try:
+        return query_rewriter.rewrite(query, tenant_id, employee_id, chat_history, reason)
+    except Exception as e:
+        logger.warning(f"[CHAT] Rewrite error: {e}. Using original query.")
+        return query
 
 class ChatSession():
     def __init__(self):
         pass
 
-    def chat_session(self, query_input, tenant_id, access_role, employee_id, employee_db_id=0, is_manager=False, department_ids=None): 
+    async def _speculative_search(self, query, tenant_id, access_role, employee_id, chat_history, reason, entry):
+        """
+        Search câu hỏi gốc song song với LLM viết lại câu hỏi.
+        Viết lại xong trước deadline -> search thêm câu đã viết lại và fuse (RRF) 2 bộ ứng viên;
+        quá deadline -> dùng luôn kết quả câu gốc (kết quả viết lại vẫn được cache cho lượt sau).
+        Cả 2 lần search đều qua retrieval cache (_cached_search) với entry đã đọc 1 lần cho cả lượt.
+        Trả về (query dùng để rerank, candidates, dense vector của query đó hoặc None).
+        """
+        deadline = time.monotonic() + settings.rewrite_deadline_seconds
+        rewrite_future = asyncio.wrap_future(rewrite_pool.submit(_rewrite_query, query, tenant_id, employee_id, chat_history, reason))
+
+        raw_results, raw_vector = await self._cached_search(query, tenant_id, access_role, employee_id, entry=entry)
+
+        try:
+            # shield: quá deadline chỉ ngừng chờ, việc viết lại vẫn chạy tiếp trong rewrite_pool
+            rewritten = await asyncio.wait_for(asyncio.shield(rewrite_future), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            logger.info(f"[CHAT] Rewrite exceeded {settings.rewrite_deadline_seconds}s deadline. Using raw query results.")
+            return query, raw_results, raw_vector
+
+        if rewritten == query:
+            return query, raw_results, raw_vector
+
+        rewritten_results, rewritten_vector = await self._cached_search(rewritten, tenant_id, access_role, employee_id, entry=entry)
+        return rewritten, fuse_candidates([rewritten_results, raw_results], limit=20), rewritten_vector
+
+    async def _load_cache_entry(self, tenant_id, access_role, employee_id):
+        """
+        Đọc entry retrieval cache của lượt trước và lấy lại content cho bộ ứng viên.
+        Trả về (entry hoặc None, generation của tenant lúc đọc - None nếu cache tắt / lỗi: lượt này không ghi cache).
+        """
+        if retrieval_cache is None:
+            return None, None
+
+        try:
+            entry, generation = await asyncio.to_thread(retrieval_cache.get, tenant_id, employee_id, access_role)
+        except Exception as e:
+            logger.warning(f"[CHAT] Retrieval cache error: {e}. Skipping cache.")
+            return None, None
+
+        if entry is not None:
+            # Cache chỉ giữ payload rút gọn -> lấy content cho bộ ứng viên đã cache bằng 1 lần retrieve theo id
+            entry["points"] = await asyncio.to_thread(db_client.fetch_payloads, entry["points"], RERANK_PAYLOAD_FIELDS)
+        return entry, generation
+
+    async def _cached_search(self, query, tenant_id, access_role, employee_id, entry=_UNSET):
+        """
+        Hybrid search có retrieval cache. Trả về (candidates, dense vector của query hoặc None).
+        - Không có cache hợp lệ: search đầy đủ (k=20, payload_fields=RERANK_PAYLOAD_FIELDS)
+        - Câu hỏi gần như trùng lượt trước: chỉ rerank lại bộ ứng viên đã cache, bỏ qua search
+        - Còn lại: bộ đã cache + search nhỏ hơn (retrieval_cache_fresh_k)
+        entry: entry đã đọc bằng _load_cache_entry cho cả lượt (None = đã biết là miss); không truyền -> tự đọc.
+        """
+        if retrieval_cache is None:
+            return await db_client.asearch_hybrid(query, tenant_id, access_role, k=20, payload_fields=RERANK_PAYLOAD_FIELDS), None
+
+        if entry is _UNSET:
+            entry, _ = await self._load_cache_entry(tenant_id, access_role, employee_id)
+
+        dense_vector = await asyncio.to_thread(db_client.dense_embedder.get_dense_vector, query)
+        if entry is None:
+            return await db_client.asearch_hybrid(query, tenant_id, access_role, k=20, payload_fields=RERANK_PAYLOAD_FIELDS, dense_vector=dense_vector), dense_vector
+
+        if retrieval_cache.is_near_duplicate(entry, query, dense_vector):
+            logger.info("[CHAT] Step 2: Near-duplicate of previous turn. Reusing cached candidates.")
+            return entry["points"], dense_vector
+
+        fresh_results = await db_client.asearch_hybrid(query, tenant_id, access_role, k=settings.retrieval_cache_fresh_k, payload_fields=RERANK_PAYLOAD_FIELDS, dense_vector=dense_vector)
+        logger.info(f"[CHAT] Step 2: Cached {len(entry['points'])} + fresh {len(fresh_results)} candidates.")
+        return fuse_candidates([fresh_results, entry["points"]]), dense_vector
+
+    async def achat_session(self, query_input, tenant_id, access_role, employee_id, employee_db_id=0, is_manager=False, department_ids=None):
+        """
+        Luồng chat async (route /ask): search qua AsyncQdrantClient (asearch_hybrid);
+        các bước chặn (embedding, rerank, LLM, retrieval cache) chạy trong thread để không chặn event loop.
+        """
         first_time = time.time()
 
         query = query_input.strip()
@@ -60,26 +157,66 @@ class ChatSession():
         # 1. Query Input + Conversation History -> LLM rewrite -> Context Query
         logger.info("[CHAT] Step 1: Getting chat history from Redis...")
         try:
-            chat_history = memory_client.get_history(tenant_id, employee_id, limit=40)
+            # summary mode: tóm tắt + các lượt gần nhất trong token budget; relevant mode: lượt liên quan + 2 lượt gần nhất
+            # window mode: 40 message gần nhất
+            history_summary, chat_history = await memory_client.aget_prompt_history(tenant_id, employee_id, limit=40, query=query)
         except Exception as e:
             logger.warning(f"[CHAT] Step 1: Redis error: {e}. Continuing without history.")
-            chat_history = []
-        logger.info(f"[CHAT] Step 1: Got {len(chat_history)} history messages. Contextualizing query via Ollama...")
-        # context_query = memory_client.contextualize_query(query, chat_history)
-        # logger.info(f"[CHAT] Step 1: Done. context_query='{context_query[:100]}'")
-        try:
-            memory_client.add_message(tenant_id, employee_id, "user", query)
-        except Exception as e:
-            logger.warning(f"[CHAT] Step 1: Redis save error: {e}. Skipping.")
+            history_summary, chat_history = "", []
+        logger.info(f"[CHAT] Step 1: Got {len(chat_history)} history messages.")
+
+        # Chỉ gọi LLM viết lại khi câu hỏi có đại từ / nối tiếp hoặc quá ngắn (bộ phát hiện regex, không tốn LLM)
+        query_rewriter.count_turn()
+        search_query = query
+        query_vector = None
+        rewrite_reason = detect_follow_up(query, chat_history)
+        # Retrieval cache đọc 1 lần trước khi search: mọi lần search của lượt dùng chung entry,
+        # generation đọc lúc này được ghi lại cùng kết quả (tài liệu đổi giữa chừng -> entry bị bỏ ở lượt sau)
+        cache_entry, cache_generation = await self._load_cache_entry(tenant_id, access_role, employee_id)
+        if rewrite_reason and settings.rewrite_speculative:
+            # 1 + 2. Speculative: search câu hỏi gốc ngay trong lúc viết lại, fuse khi có câu viết lại
+            logger.info(f"[CHAT] Step 1-2: Follow-up detected ({rewrite_reason}). Speculative rewrite + hybrid search...")
+            search_query, search_results, query_vector = await self._speculative_search(query, tenant_id, access_role, employee_id, chat_history, rewrite_reason, cache_entry)
+            logger.info(f"[CHAT] Step 1-2: Done. context_query='{search_query[:100]}', got {len(search_results)} results.")
+        else:
+            if rewrite_reason:
+                logger.info(f"[CHAT] Step 1: Follow-up detected ({rewrite_reason}). Contextualizing query via Ollama...")
+                search_query = await asyncio.to_thread(_rewrite_query, query, tenant_id, employee_id, chat_history, rewrite_reason)
+                logger.info(f"[CHAT] Step 1: Done. context_query='{search_query[:100]}'")
 
-        # 2. Hybrid search
-        logger.info("[CHAT] Step 2: Hybrid search in Qdrant...")
-        search_results = db_client.search_hybrid(query, tenant_id, access_role, k=20)
-        logger.info(f"[CHAT] Step 2: Done. Got {len(search_results)} results.")
+            # 2. Hybrid search
+            logger.info("[CHAT] Step 2: Hybrid search in Qdrant...")
+            search_results, query_vector = await self._cached_search(search_query, tenant_id, access_role, employee_id, entry=cache_entry)
+            logger.info(f"[CHAT] Step 2: Done. Got {len(search_results)} results.")
 
         # 3. Rerank
         logger.info("[CHAT] Step 3: Reranking...")
-        top_docs = rerank_client.rerank(query, search_results, top_k=5)
+        # Retrieval cache giữ nhiều ứng viên đã rerank hơn số đưa vào prompt
+        rerank_top_k = max(5, settings.retrieval_cache_size) if retrieval_cache is not None else 5
+        ranked_docs = await asyncio.to_thread(rerank_client.rerank, search_query, search_results, top_k=rerank_top_k)
+
+        # Chưa viết lại nhưng điểm rerank thấp -> viết lại câu hỏi rồi retrieve lại, giữ bộ kết quả tốt hơn
+        if not rewrite_reason and chat_history and query_rewriter.is_low_confidence(ranked_docs):
+            rewritten = await asyncio.to_thread(_rewrite_query, query, tenant_id, employee_id, chat_history, "low_confidence")
+            if rewritten != query:
+                logger.info(f"[CHAT] Step 3: Low rerank confidence. Retrying with context_query='{rewritten[:100]}'")
+                retry_results, retry_vector = await self._cached_search(rewritten, tenant_id, access_role, employee_id, entry=cache_entry)
+                retry_docs = await asyncio.to_thread(rerank_client.rerank, rewritten, retry_results, top_k=rerank_top_k)
+                if retry_docs and (not ranked_docs or float(retry_docs[0].score) > float(ranked_docs[0].score)):
+                    search_query, ranked_docs, query_vector = rewritten, retry_docs, retry_vector
+
+        if cache_generation is not None and ranked_docs:
+            try:
+                if query_vector is None:
+                    query_vector = await asyncio.to_thread(db_client.dense_embedder.get_dense_vector, search_query)
+                await asyncio.to_thread(retrieval_cache.put, tenant_id, employee_id, access_role, search_query, query_vector, ranked_docs, cache_generation)
+            except Exception as e:
+                logger.warning(f"[CHAT] Retrieval cache save error: {e}. Skipping.")
+
+        top_docs = ranked_docs[:5]
+        if settings.retrieval_small_to_big:
+            # Small-to-big: rerank trên child passages, prompt nhận parent sections (dedupe theo parent)
+            top_docs = await asyncio.to_thread(db_client.fetch_parents, top_docs)
         logger.info(f"[CHAT] Step 3: Done. Top {len(top_docs)} docs.")
 
         # 4. LLM generate
@@ -88,10 +225,11 @@ class ChatSession():
             query=query, 
             search_results=top_docs,
             chat_history=chat_history, 
-            reasoning=False
+            reasoning=False,
+            summary=history_summary
         )
 
-        response_obj, citation = llm_client.invoke(messages)
+        response_obj, citation = await asyncio.to_thread(llm_client.invoke, messages)
         logger.info("[CHAT] Step 4: Done. Got LLM response.")
                 
         final_answer = ""
@@ -100,9 +238,10 @@ class ChatSession():
         else:
             final_answer = str(response_obj) 
 
-        # Save message to Redis
+        # Save message to Redis: câu hỏi + câu trả lời trong 1 transaction (1 round-trip)
+        # (summary mode: lượt cũ được gộp vào tóm tắt ở background)
         try:
-            memory_client.add_message(tenant_id, employee_id, "assistant", final_answer)
+            await memory_client.aadd_turn(tenant_id, employee_id, query, final_answer)
         except Exception as e:
             logger.warning(f"[CHAT] Redis save error: {e}. Skipping.")
 
@@ -114,6 +253,7 @@ class ChatSession():
             "is_manager": is_manager,
             "department_ids": department_ids,
             "query": query,
+            "search_query": search_query,
             "answer": final_answer,
             "citation": citation
         }
@@ -131,7 +271,7 @@ def main():
     access_role = None
     employee_id = None
 
-    chat_client.chat_session(query_input, tenant_id, access_role, employee_id)
+    asyncio.run(chat_client.achat_session(query_input, tenant_id, access_role, employee_id))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -25,8 +25,22 @@ class Settings(BaseSettings):
     # ==================== QDRANT CONFIGURATION ====================
     qdrant_url: str = Field(default="http://localhost:6333", description="Qdrant server URL")
     qdrant_api_key: Optional[str] = Field(default=None, description="API key cho Qdrant Cloud (mà mình chạy local nên nô nít)")
+    qdrant_local_path: Optional[str] = Field(default=None, description="Qdrant local mode (embedded, không cần server): thư mục dữ liệu hoặc ':memory:'; đặt giá trị này thì bỏ qua qdrant_url")
     qdrant_collection_parent: str = Field(default="parent_chunks", description="Tên collection cho parent chunks")
     qdrant_collection_child: str = Field(default="child_chunks", description="Tên collection cho child chunks")
+    qdrant_collection_profile: str = Field(default="default", description="Layout collection: default (float32 on-disk) / scalar (int8) / binary")
+    qdrant_quantization_always_ram: bool = Field(default=True, description="Giữ vector quantized luôn trong RAM")
+    qdrant_search_oversampling: float = Field(default=2.0, description="Hệ số lấy dư ứng viên khi search trên vector quantized")
+    qdrant_search_rescore: bool = Field(default=True, description="Rescore ứng viên bằng vector gốc sau khi search quantized")
+    qdrant_prefer_grpc: bool = Field(default=False, description="Dùng gRPC thay cho REST khi kết nối Qdrant")
+    qdrant_grpc_port: int = Field(default=6334, description="Cổng gRPC của Qdrant")
+    qdrant_timeout: int = Field(default=30, description="Timeout mỗi request tới Qdrant (giây)")
+    qdrant_search_timeout: int = Field(default=5, description="Timeout cho mỗi truy vấn search (giây)")
+    qdrant_tenant_partitioning: bool = Field(default=False, description="Layout multi-tenant: tenant index (is_tenant) + HNSW graph riêng mỗi tenant (payload_m)")
+    qdrant_index_mode: str = Field(default="incremental", description="Vòng đời HNSW khi ingest: incremental (luôn bật) / bulk (tắt khi upload, rebuild 1 lần)")
+    qdrant_indexing_threshold: int = Field(default=20000, description="indexing_threshold (KB) của optimizer khi bật lại indexing")
+    qdrant_index_wait_timeout: int = Field(default=600, description="Thời gian tối đa chờ build index sau bulk upload (giây)")
+    qdrant_upload_parallel: int = Field(default=2, description="Số luồng upsert song song khi ingest (encode batch sau chạy chồng lên upsert batch trước)")
     
     # ==================== REDIS CONFIGURATION ====================
     redis_host: str = Field(default="localhost", description="Redis host")
@@ -34,6 +48,25 @@ class Settings(BaseSettings):
     redis_db: int = Field(default=0, description="Redis database number")
     redis_password: Optional[str] = Field(default=None, description="Redis password")
     redis_conversation_ttl: int = Field(default=3600, description="TTL cho conversation trong Redis (giây)")
+    redis_max_connections: int = Field(default=32, description="Số kết nối tối đa của connection pool Redis")
+    redis_history_max_messages: int = Field(default=40, description="Số message tối đa giữ lại cho mỗi conversation")
+    redis_compress_min_bytes: int = Field(default=1024, description="Message (msgpack) dài hơn ngưỡng này được nén zstd")
+    
+    # ==================== CHAT MEMORY ====================
+    memory_mode: str = Field(default="window", description="Lịch sử đưa vào prompt: window (N message gần nhất) / summary (tóm tắt + các lượt gần nhất) / relevant (lượt liên quan + 2 lượt gần nhất)")
+    memory_recent_turns: int = Field(default=3, description="Số lượt hỏi-đáp gần nhất giữ nguyên văn (mode summary)")
+    memory_history_token_budget: int = Field(default=1500, description="Ngân sách token cho tóm tắt + lịch sử trong prompt (mode summary)")
+    memory_summary_max_tokens: int = Field(default=300, description="Số token tối đa LLM sinh cho bản tóm tắt")
+    memory_relevant_top_k: int = Field(default=3, description="Số lượt cũ liên quan nhất tới câu hỏi đưa vào prompt (mode relevant)")
+    memory_relevant_min_score: float = Field(default=0.3, description="Cosine tối thiểu để 1 lượt cũ được coi là liên quan (mode relevant)")
+    
+    # ==================== QUERY REWRITE ====================
+    rewrite_enabled: bool = Field(default=True, description="Viết lại câu hỏi nối tiếp thành câu độc lập (chỉ khi bộ phát hiện kích hoạt)")
+    rewrite_short_query_words: int = Field(default=3, description="Câu hỏi có số từ <= ngưỡng này được coi là quá ngắn, cần viết lại")
+    rewrite_min_rerank_score: float = Field(default=0.0, description="Điểm rerank (logit) cao nhất dưới ngưỡng này -> viết lại câu hỏi và retrieve lại")
+    rewrite_history_messages: int = Field(default=6, description="Số message gần nhất dùng làm ngữ cảnh khi viết lại câu hỏi")
+    rewrite_speculative: bool = Field(default=False, description="Retrieve câu hỏi gốc song song với lúc LLM viết lại, fuse 2 bộ ứng viên trước rerank")
+    rewrite_deadline_seconds: float = Field(default=2.0, description="Hết thời gian này mà chưa viết lại xong -> dùng kết quả của câu hỏi gốc (mode speculative)")
     
     # ==================== MODEL CONFIGURATION ====================
     # OCR Model
@@ -47,7 +80,18 @@ class Settings(BaseSettings):
     )
     embedding_device: str = Field(default="cuda", description="Device để chạy embedding")
     embedding_dimension: int = Field(default=384, description="Dimension của embedding vector")
-    
+    embedding_num_workers: int = Field(default=0, description="Số process encode song song khi ingest lớn (0/1 = tắt, chạy 1 process)")
+    embedding_worker_threads: int = Field(default=1, description="Số thread PyTorch tối đa cho mỗi worker process")
+    embedding_multiprocess_min_chunks: int = Field(default=256, description="Số chunk tối thiểu để bật encode đa process")
+    embedding_cache_enabled: bool = Field(default=True, description="Bật cache embedding theo nội dung chunk khi ingest")
+    embedding_cache_path: str = Field(default="./data/embedding_cache.sqlite3", description="File SQLite lưu embedding cache")
+    
+    # Sparse (SPLADE) pruning - 0 = không prune
+    sparse_doc_top_k: int = Field(default=0, description="Số term giữ lại tối đa cho mỗi sparse vector của document")
+    sparse_doc_min_weight: float = Field(default=0.0, description="Trọng số tối thiểu của term trong sparse vector document")
+    sparse_query_top_k: int = Field(default=0, description="Số term giữ lại tối đa cho sparse vector của query")
+    sparse_query_min_weight: float = Field(default=0.0, description="Trọng số tối thiểu của term trong sparse vector query")
+
     # LLM Configuration
     llm_base_url: str = Field(default="http://localhost:11434", description="URL của Ollama server")
     llm_model_name: str = Field(default="llama3.1", description="Tên model LLM")
@@ -58,10 +102,24 @@ class Settings(BaseSettings):
     parent_chunk_header_level: int = Field(default=2, description="Level của markdown header để chia parent chunks")
     child_chunk_size: int = Field(default=512, description="Kích thước tối đa của child chunk (ký tự)")
     child_chunk_overlap: int = Field(default=50, description="Overlap giữa các child chunks")
+    chunking_semantic_backend: str = Field(default="langchain", description="Semantic split: langchain (SemanticChunker) / native (NumPy, embed câu 1 lần theo batch)")
+    chunking_pool_vectors: bool = Field(default=False, description="Native backend: dùng mean pooling vector câu làm dense vector của chunk thay vì embed lại")
+    chunking_table_row_groups: bool = Field(default=True, description="Chia bảng Markdown lớn (> MAX_TOKENS) theo nhóm dòng, lặp lại header ở mỗi nhóm")
+    chunking_table_max_tokens: int = Field(default=700, description="Ngân sách token tối đa của 1 nhóm dòng bảng (kể cả header)")
+
+    # ==================== STREAMING INGEST ====================
+    ingest_streaming: bool = Field(default=False, description="Upload theo luồng: OCR từng trang -> chunk section đã đóng -> embed/upsert ngay (không áp dụng cho replace)")
+    ingest_page_queue_size: int = Field(default=4, description="Số trang OCR tối đa chờ chunking (đầy -> OCR tạm dừng)")
+    ingest_chunk_queue_size: int = Field(default=8, description="Số đợt chunk tối đa chờ embed/upsert (đầy -> chunking tạm dừng)")
     
     # ==================== RETRIEVAL CONFIGURATION ====================
     top_k_children: int = Field(default=10, description="Số children chunks lấy ban đầu")
     top_k_rerank: int = Field(default=5, description="Số chunks sau khi rerank")
+    retrieval_small_to_big: bool = Field(default=False, description="Search + rerank child passages, trả về parent sections cho prompt")
+    retrieval_cache_enabled: bool = Field(default=False, description="Cache bộ ứng viên đã rerank của lượt trước theo (tenant_id, employee_id) trên Redis")
+    retrieval_cache_size: int = Field(default=10, description="Số ứng viên đã rerank được cache cho lượt sau")
+    retrieval_cache_fresh_k: int = Field(default=8, description="Số kết quả search mới lấy thêm khi có cache (thay cho 20)")
+    retrieval_cache_duplicate_threshold: float = Field(default=0.95, description="Cosine giữa 2 câu hỏi liên tiếp >= ngưỡng này -> bỏ qua search, chỉ rerank bộ đã cache")
     
     # ==================== DATA PATHS ====================
     data_raw_path: str = Field(default="./data/raw", description="Thư mục chứa file PDF gốc")
@@ -85,6 +143,38 @@ class Settings(BaseSettings):
             raise ValueError("Device phải là 'cuda' hoặc 'cpu'")
         return v
     
+    @validator("qdrant_collection_profile")
+    def validate_collection_profile(cls, v):
+        """Validate profile của Qdrant collection"""
+        valid_profiles = ["default", "scalar", "binary"]
+        if v not in valid_profiles:
+            raise ValueError(f"Collection profile phải là một trong: {valid_profiles}")
+        return v
+    
+    @validator("qdrant_index_mode")
+    def validate_index_mode(cls, v):
+        """Validate chế độ index khi ingest"""
+        valid_modes = ["incremental", "bulk"]
+        if v not in valid_modes:
+            raise ValueError(f"Index mode phải là một trong: {valid_modes}")
+        return v
+    
+    @validator("chunking_semantic_backend")
+    def validate_semantic_backend(cls, v):
+        """Validate backend của semantic split"""
+        valid_backends = ["langchain", "native"]
+        if v not in valid_backends:
+            raise ValueError(f"Semantic backend phải là một trong: {valid_backends}")
+        return v
+    
+    @validator("memory_mode")
+    def validate_memory_mode(cls, v):
+        """Validate chế độ lịch sử hội thoại"""
+        valid_modes = ["window", "summary", "relevant"]
+        if v not in valid_modes:
+            raise ValueError(f"Memory mode phải là một trong: {valid_modes}")
+        return v
+    
     @validator("log_level")
     def validate_log_level(cls, v):
         """Validate log level"""
@@ -1,10 +1,14 @@
 import sys
 import os
+import queue
+import threading
 from pathlib import Path
 import time
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
+from app.core.config import settings
+
 """
 Hệ thống upload tài liệu:
 - Input: File tài liệu đầu vào (PDF)
@@ -19,6 +23,9 @@ Luồng hoạt động:
     4. Chuyển các chunks từ dạng văn bản sang embedding:
     List Chunks -> Embedding Model -> Dense Vector (1024 Dimension) + Sparse Vector (Any Dimention)
     4. Insert vào Qdrant DB
+
+Streaming (settings.ingest_streaming): 3 stage chạy song song, nối bằng queue có giới hạn (backpressure):
+    OCR từng trang -> [page queue] -> chunk các section đã đóng -> [chunk queue] -> embed + upsert
 """
 
 
@@ -29,6 +36,7 @@ PATH_OUTPUT_FILE = "./data/md_dir"
 _db_client = None
 _ocr_client = None
 _chunking_client = None
+_retrieval_cache = None
 
 
 def _get_db_client():
@@ -42,11 +50,37 @@ def _get_db_client():
 def _get_ocr_client():
     global _ocr_client
     if _ocr_client is None:
-        from app.services.ocr_service import OCRService as OCR_document
+        from app.services.ocr_service import OCR_document
         _ocr_client = OCR_document()
     return _ocr_client
 
 
+def _get_retrieval_cache():
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        from app.services.retrieval_cache import RetrievalCache
+        _retrieval_cache = RetrievalCache()
+    return _retrieval_cache
+
+
+def invalidate_retrieval_cache(tenant_id):
+    """Tài liệu của tenant thay đổi -> bỏ các bộ ứng viên đã cache của luồng chat."""
+    if not settings.retrieval_cache_enabled:
+        return
+    try:
+        _get_retrieval_cache().invalidate_tenant(tenant_id)
+    except Exception as e:
+        print(f"[UPLOAD] Không thể invalidate retrieval cache của tenant {tenant_id}: {e}")
+
+
+async def aclose_clients():
+    """Shutdown: dừng process pool encode và đóng async client của VectorStoreService dùng cho upload."""
+    global _db_client
+    if _db_client is not None:
+        await _db_client.aclose()
+        _db_client = None
+
+
 def _get_chunking_client():
     global _chunking_client
     if _chunking_client is None:
@@ -55,32 +89,153 @@ def _get_chunking_client():
     return _chunking_client
 
 
+class _StageEnd:
+    """Đánh dấu stage phía trước đã xong (error != None: stage lỗi)."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+def _put(out_queue, item, stop):
+    # Queue đầy -> chờ (backpressure); thoát khi pipeline bị hủy
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(in_queue, stop):
+    """Generator: lấy item của stage trước tới khi gặp _StageEnd (raise lại lỗi của stage đó)."""
+    while not stop.is_set():
+        try:
+            item = in_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if isinstance(item, _StageEnd):
+            if item.error is not None:
+                raise item.error
+            return
+        yield item
+
+
+def _start_stage(name, produce, out_queue, stop):
+    """Chạy 1 stage trong thread riêng, đẩy kết quả của produce() vào out_queue."""
+    def run():
+        error = None
+        try:
+            for item in produce():
+                if not _put(out_queue, item, stop):
+                    return
+        except Exception as e:
+            error = e
+        _put(out_queue, _StageEnd(error), stop)
+
+    thread = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
 class ProcessFileInput():
     def __init__(self):
         pass
 
-    def process_file_upload(self, src_file, tenant_id, accessed_role_list):
+    def process_file_upload(self, src_file, tenant_id, accessed_role_list, src_name=None, replace=False):
+        """
+        src_name: tên tài liệu ổn định (vd. tên file gốc) dùng làm src_file trong Qdrant.
+        Upload lại cùng src_name sẽ chỉ cập nhật các chunk thay đổi (sync_document).
+        replace=True: ghi phiên bản mới rồi đổi version active 1 lần (replace_document).
+        """
         first_time = time.time()
+        doc_name = src_name or src_file
 
+        db_client = _get_db_client()
+
+        # Bulk mode: HNSW tạm dừng trong lúc ghi, rebuild 1 lần khi upload cuối cùng kết thúc
+        with db_client.index_manager.ingest(tenant_id):
+            if settings.ingest_streaming and not replace:
+                markdown_doc, ingest_stats = self._ingest_streaming(src_file, tenant_id, accessed_role_list, doc_name)
+            else:
+                markdown_doc, ingest_stats = self._ingest_batch(src_file, tenant_id, accessed_role_list, doc_name, replace)
+        invalidate_retrieval_cache(tenant_id)
+        print(f"[UPLOAD] {doc_name}: {ingest_stats['total_chunks']} chunks ({ingest_stats['upserted']} upserted, {ingest_stats['deleted']} deleted), embedding cache hit ratio {ingest_stats['cache_hit_ratio']:.1%}")
+
+        end_time = time.time() - first_time
+
+        # Return markdown text for backend team and time processing
+        return markdown_doc, end_time
+
+    def _ingest_batch(self, src_file, tenant_id, accessed_role_list, doc_name, replace):
         db_client = _get_db_client()
         ocr_client = _get_ocr_client()
         chunking_client = _get_chunking_client()
 
         # 1. Input data (PDF) -> OCR Model -> Output data (MD)
-        ocr_client.process_file(src_file)
+        ocr_client.processing_data(src_file)
         md_output = Path(PATH_OUTPUT_FILE) / (src_file.stem + ".md")
         with open(md_output, "r", encoding="utf-8") as f:
             markdown_doc = f.read()
 
         # 2. Output data (MD) -> Chunking -> List chunks
-        chunks = chunking_client.process_hybrid_splitting(markdown_doc, tenant_id, src_file, accessed_role_list)
+        if settings.retrieval_small_to_big:
+            # Parent sections (payload-only) + child passages (embed)
+            parents, chunks = chunking_client.process_small_to_big(markdown_doc, tenant_id, doc_name, accessed_role_list)
+        else:
+            parents, chunks = None, chunking_client.process_hybrid_splitting(markdown_doc, tenant_id, doc_name, accessed_role_list)
 
         # 3. List chunks -> Embedding -> Dense Vector + Sparse Vector -> Insert to Qdrant DB
-        db_client.add_chunks(chunks)
-
-        db_client.optimize_indexing()
-
-        end_time = time.time() - first_time
+        # Diff theo nội dung với phiên bản đang lưu: chỉ upsert chunk mới/thay đổi, xóa chunk đã bỏ
+        # Replace: ghi version mới song song version cũ, đổi version active khi ghi xong
+        if replace:
+            ingest_stats = db_client.replace_document(tenant_id, doc_name, chunks, parents)
+        else:
+            ingest_stats = db_client.sync_document(tenant_id, doc_name, chunks, parents)
+        return markdown_doc, ingest_stats
+
+    def _ingest_streaming(self, src_file, tenant_id, accessed_role_list, doc_name):
+        """
+        OCR, chunking và embed/upsert chạy chồng lên nhau: section đầu tiên search được ngay khi
+        trang chứa nó OCR xong, không phải chờ cả file. Bộ nhớ chỉ giữ các trang / đợt chunk đang chờ trong queue.
+        """
+        from app.services.chunking_service import IncrementalChunker
 
-        # Return markdown text for backend team and time processing
-        return markdown_doc, end_time
+        db_client = _get_db_client()
+        ocr_client = _get_ocr_client()
+        chunker = IncrementalChunker(
+            _get_chunking_client(), tenant_id, doc_name, accessed_role_list,
+            small_to_big=settings.retrieval_small_to_big,
+        )
+
+        started_at = time.perf_counter()
+        stop = threading.Event()
+        page_queue = queue.Queue(maxsize=settings.ingest_page_queue_size)
+        chunk_queue = queue.Queue(maxsize=settings.ingest_chunk_queue_size)
+        pages = []
+
+        def chunk_pages():
+            for page_text in _drain(page_queue, stop):
+                pages.append(page_text)
+                parents, chunks = chunker.feed(page_text)
+                if chunks:
+                    yield parents, chunks
+            parents, chunks = chunker.close()
+            if chunks:
+                yield parents, chunks
+
+        # 1. OCR từng trang -> 2. Chunk section đã đóng -> 3. Embed + upsert (thread hiện tại)
+        threads = [
+            _start_stage("ocr", lambda: ocr_client.iter_pages(src_file), page_queue, stop),
+            _start_stage("chunking", chunk_pages, chunk_queue, stop),
+        ]
+        try:
+            ingest_stats = db_client.stream_document(tenant_id, doc_name, _drain(chunk_queue, stop), started_at)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        return "".join(pages), ingest_stats
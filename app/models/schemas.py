@@ -78,6 +78,20 @@ class UploadFileResponse(BaseModel):
     processing_time_seconds: float = Field(..., description="Thời gian xử lý (giây)")
 
 
+# ==================== DOCUMENT MANAGEMENT ====================
+
+class DocumentInfo(BaseModel):
+    """Tài liệu đang active của tenant"""
+    src_file: str = Field(..., description="Tên tài liệu (tên file gốc)")
+    chunks: int = Field(..., description="Số chunk đang active")
+
+
+class DocumentListResponse(BaseModel):
+    """Response cho danh sách tài liệu"""
+    tenant_id: str = Field(..., description="ID của tenant")
+    documents: List[DocumentInfo] = Field(default_factory=list, description="Danh sách tài liệu")
+
+
 # ==================== CHAT REQUEST/RESPONSE ====================
 
 class ChatMessage(BaseModel):
@@ -95,6 +109,7 @@ class ChatRequest(BaseModel):
     question: str = Field(..., description="Câu hỏi / tin nhắn của user", min_length=1)
     tenant_id: str = Field(..., description="ID của tenant (công ty/tổ chức)")
     role_id: int = Field(..., description="Role ID để phân quyền truy cập tài liệu")
+    role_ids: List[int] = Field(default_factory=list, description="Các role khác user đang giữ (tìm tài liệu thuộc bất kỳ role nào)")
     user_id: str = Field(..., description="ID của user (AbpUsers.Id)")
     employee_id: int = Field(default=0, description="ID của employee (Dms_Employee.Id)")
     is_manager: bool = Field(default=False, description="Có phải manager không (từ Dms_WorkPosition.IsManager)")
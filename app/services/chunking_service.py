@@ -1,10 +1,13 @@
 import uuid
 import re 
-from typing import List, Dict
+import hashlib
+from typing import List, Dict, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
-from app.services.embedding_service import LocalDenseEmbedding
-from transformers import AutoTokenizer
+from app.services.embedding_service import get_dense_embedder, get_tokenizer
+from app.services.semantic_splitter import GradientSemanticSplitter
+from app.core.config import settings
 
 # CONFIG TOKEN BASED
 MIN_TOKENS = 200       
@@ -12,16 +15,24 @@ IDEAL_TOKENS = 700
 MAX_TOKENS = 1200      
 HARD_CAP = 1500   
 
-embedding_client = LocalDenseEmbedding()
+
+# Bảng Markdown: khối các dòng liên tiếp bắt đầu và kết thúc bằng "|"; dòng phân cách header "|---|:---:|"
+TABLE_BLOCK_PATTERN = re.compile(r'((?:^\|.*\|$\n?)+)', re.MULTILINE)
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\|(\s*:?-+:?\s*\|)+$")
 
 class ChunkingService:
-    def __init__(self):
+    def __init__(self, embedding_client=None, tokenizer=None):
 
-        # Load model embedding
-        self.embeddings = embedding_client.get_model()
+        # Load model embedding (dùng chung với VectorStoreService qua model registry)
+        if embedding_client is None:
+            embedding_client = get_dense_embedder()
+        # Không truyền SentenceTransformer gốc: LocalDenseEmbedding khóa inference dùng chung với luồng chat
+        self.embeddings = embedding_client
 
         # Load tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(embedding_client.get_model_name())
+        if tokenizer is None:
+            tokenizer = get_tokenizer(embedding_client.get_model_name())
+        self._init_token_counter(tokenizer)
 
         # Markdown Splitter
         self.header_splitter = MarkdownHeaderTextSplitter(
@@ -37,6 +48,14 @@ class ChunkingService:
             self.embeddings,
             breakpoint_threshold_type="gradient"
         )
+        # Native: embed mọi câu của section trong 1 batch, breakpoint bằng NumPy, giữ lại vector câu để pooling
+        self.semantic_backend = settings.chunking_semantic_backend
+        self.pool_vectors = settings.chunking_pool_vectors
+        self.native_splitter = GradientSemanticSplitter(embedding_client)
+
+        # Table Splitter: bảng lớn chia theo nhóm dòng, lặp lại header ở mỗi nhóm
+        self.table_row_groups = settings.chunking_table_row_groups
+        self.table_max_tokens = settings.chunking_table_max_tokens
 
         # Structure Splitter
         self.structure_splitter = RecursiveCharacterTextSplitter(
@@ -50,6 +69,13 @@ class ChunkingService:
             ]
         )
 
+        # Child Splitter (small-to-big): passage nhỏ để embed + rerank
+        self.child_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.child_chunk_size,
+            chunk_overlap=settings.child_chunk_overlap,
+            separators=["\n\n", "\n", ". ", " "]
+        )
+
         # Fallback Splitter
         self.fallback_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
             tokenizer=self.tokenizer,
@@ -57,87 +83,158 @@ class ChunkingService:
             chunk_overlap=100
         )
 
+    def _init_token_counter(self, tokenizer):
+        self.tokenizer = tokenizer
+        # Mỗi đoạn chỉ tokenize 1 lần; số token của đoạn gộp = tổng các phần + chi phí separator
+        self._special_tokens = len(tokenizer.encode(""))
+        self._separator_tokens = self._content_tokens("\n\n")
+        self._newline_tokens = self._content_tokens("\n")
+
+    def _content_tokens(self, text: str) -> int:
+        """Số token của nội dung (không tính special tokens) - cộng dồn được khi gộp các đoạn."""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
     def _count_tokens(self, text: str) -> int:
-        return len(self.tokenizer.encode(text))
+        return self._content_tokens(text) + self._special_tokens
 
     def _preprocess_tables(self, text: str) -> str:
         """
         Tìm bảng Markdown và cô lập bằng \n\n để tránh bị cắt đôi.
         """
-        table_block_pattern = r'((?:^\|.*\|$\n?)+)'
-        
         def isolate_table(match):
             table_content = match.group(1).strip()
             
             return f"\n\n{table_content}\n\n"
 
-        return re.sub(table_block_pattern, isolate_table, text, flags=re.MULTILINE)
+        return TABLE_BLOCK_PATTERN.sub(isolate_table, text)
+
+    def _table_row_groups(self, table: str) -> List[str]:
+        """
+        Chia bảng thành các nhóm dòng <= table_max_tokens, mỗi nhóm lặp lại header (+ dòng phân cách).
+        Không cắt giữa 1 dòng; dòng đơn lẻ vượt ngân sách thành 1 nhóm riêng.
+        """
+        lines = table.split("\n")
+        header_size = 2 if len(lines) > 1 and TABLE_SEPARATOR_PATTERN.match(lines[1].strip()) else 1
+        header, rows = lines[:header_size], lines[header_size:]
+        if not rows:
+            return [table]
+
+        header_tokens = self._content_tokens("\n".join(header))
+        groups, current, current_tokens = [], [], header_tokens
+        for row in rows:
+            row_tokens = self._newline_tokens + self._content_tokens(row)
+            if current and current_tokens + row_tokens > self.table_max_tokens:
+                groups.append(current)
+                current, current_tokens = [], header_tokens
+            current.append(row)
+            current_tokens += row_tokens
+        groups.append(current)
+
+        return ["\n".join(header + group) for group in groups]
+
+    def _split_large_tables(self, doc) -> List[Document]:
+        """Section quá lớn: tách bảng > MAX_TOKENS thành các nhóm dòng, phần văn bản xung quanh giữ nguyên thứ tự."""
+        content = doc.page_content
+        parts, last = [], 0
+        for match in TABLE_BLOCK_PATTERN.finditer(content):
+            table = match.group(1).strip()
+            if self._count_tokens(table) <= MAX_TOKENS:
+                continue
+            parts.append(content[last:match.start()])
+            parts.extend(self._table_row_groups(table))
+            last = match.end()
+
+        if not parts:
+            return [doc]
+        parts.append(content[last:])
+        return [Document(page_content=part.strip(), metadata=dict(doc.metadata)) for part in parts if part.strip()]
     
-    def _smart_merge_sections(self, splits):
+    def _smart_merge_sections(self, splits, token_counts=None):
         """
         Logic Merge:
         - Ưu tiên 1: Nếu < MIN_TOKENS -> BẮT BUỘC GỘP.
         - Ưu tiên 2: Nếu < IDEAL_TOKENS -> Gộp để tối ưu context.
+        token_counts: số token nội dung của từng split (tính 1 lần ở bước trước).
+        Returns: (merged_splits, merged_token_counts)
         """
-        if not splits: return []
+        if not splits: return [], []
+        if token_counts is None:
+            token_counts = [self._content_tokens(doc.page_content) for doc in splits]
         
-        merged = []
+        merged, merged_counts = [], []
         current_doc = splits[0]
+        # Số token của current_doc được cộng dồn, không tokenize lại đoạn đang lớn dần
+        current_content_tokens = token_counts[0]
         
-        for next_doc in splits[1:]:
-            curr_tokens = self._count_tokens(current_doc.page_content)
-            next_tokens = self._count_tokens(next_doc.page_content)
-            
-            # Điều kiện kiểm tra Topic (H1): Không gộp các section khác header (H1) để tránh hallucination
-            curr_h1 = current_doc.metadata.get("H1")
-            next_h1 = next_doc.metadata.get("H1")
-            same_topic = (curr_h1 == next_h1)
-
-            # Điều kiện an toàn kích thước
-            total_size = curr_tokens + next_tokens
-            is_safe_size = total_size < HARD_CAP
-
-            should_merge = False
-
-            if same_topic and is_safe_size:
-                # 1. Ép buộc merge nếu đang ít token (< 200)
-                if curr_tokens < MIN_TOKENS:
-                    should_merge = True
-                # 2. Merge tự nguyện nếu tổng kích thước vẫn đẹp (< 700)
-                elif total_size < IDEAL_TOKENS:
-                    should_merge = True
+        for next_doc, next_content_tokens in zip(splits[1:], token_counts[1:]):
+            should_merge = self._should_merge(
+                current_doc.metadata.get("H1"), current_content_tokens,
+                next_doc.metadata.get("H1"), next_content_tokens,
+            )
 
             if should_merge:
                 current_doc.page_content += "\n\n" + next_doc.page_content
+                current_content_tokens += self._separator_tokens + next_content_tokens
             else:
                 merged.append(current_doc)
+                merged_counts.append(current_content_tokens)
                 current_doc = next_doc
+                current_content_tokens = next_content_tokens
         
         merged.append(current_doc)
-        return merged
+        merged_counts.append(current_content_tokens)
+        return merged, merged_counts
+
+    def _should_merge(self, curr_h1, curr_content_tokens: int, next_h1, next_content_tokens: int) -> bool:
+        """Quyết định gộp của _smart_merge_sections cho section đang gộp (current) và section kế tiếp."""
+        curr_tokens = curr_content_tokens + self._special_tokens
+        next_tokens = next_content_tokens + self._special_tokens
+
+        # Điều kiện kiểm tra Topic (H1): Không gộp các section khác header (H1) để tránh hallucination
+        same_topic = (curr_h1 == next_h1)
+
+        # Điều kiện an toàn kích thước
+        total_size = curr_tokens + next_tokens
+        is_safe_size = total_size < HARD_CAP
+
+        if not (same_topic and is_safe_size):
+            return False
+        # 1. Ép buộc merge nếu đang ít token (< 200)
+        # 2. Merge tự nguyện nếu tổng kích thước vẫn đẹp (< 700)
+        return curr_tokens < MIN_TOKENS or total_size < IDEAL_TOKENS
+
+    def _semantic_split(self, content):
+        """Returns: (sub texts, pooled vectors hoặc None)."""
+        if self.semantic_backend == "native":
+            return self.native_splitter.split(content, pool_vectors=self.pool_vectors)
+        return [sub.page_content for sub in self.semantic_splitter.create_documents([content])], None
 
     def _apply_semantic_split(self, chunks_list, content, headers, tenant_id, src_file, accessed_role):
         try:
-            sub_docs = self.semantic_splitter.create_documents([content])
+            sub_texts, sub_vectors = self._semantic_split(content)
             
-            for sub in sub_docs:
-                t_count = self._count_tokens(sub.page_content)
+            for i, sub_text in enumerate(sub_texts):
+                t_count = self._count_tokens(sub_text)
                 
                 if t_count > HARD_CAP:
-                    hard_splits = self.fallback_splitter.split_text(sub.page_content)
+                    hard_splits = self.fallback_splitter.split_text(sub_text)
                     for hard_txt in hard_splits:
                         self._add_chunk(chunks_list, hard_txt, headers, tenant_id, src_file, accessed_role, "hard_cap_fallback")
                 else:
-                    self._add_chunk(chunks_list, sub.page_content, headers, tenant_id, src_file, accessed_role, "hybrid_semantic")
+                    self._add_chunk(chunks_list, sub_text, headers, tenant_id, src_file, accessed_role, "hybrid_semantic", t_count)
+                    if sub_vectors is not None:
+                        # Vector pooled từ câu: add_chunks dùng luôn, không embed lại chunk này
+                        chunks_list[-1]["dense_vector"] = sub_vectors[i]
                     
         except Exception as e:
             hard_splits = self.fallback_splitter.split_text(content)
             for hard_txt in hard_splits:
                 self._add_chunk(chunks_list, hard_txt, headers, tenant_id, src_file, accessed_role, "hard_cap_error_fallback")
 
-    def process_hybrid_splitting(self, text: str, tenant_id: str, src_file: str, accessed_role: List[int]) -> List[Dict]:
+    def _split_sections(self, text: str):
         """
-        1. Pre-process Tables -> 2. MD Split -> 3. Structure Split -> 4. Smart Merge -> 5. Semantic/Hard Cap
+        1. Pre-process Tables -> 2. MD Split -> 3. Structure Split
+        Returns: (refined_splits, refined_token_counts)
         """
         # 1: Processing Tables
         text_safe_tables = self._preprocess_tables(text)
@@ -145,25 +242,41 @@ class ChunkingService:
         # 2: Markdown Split
         raw_splits = self.header_splitter.split_text(text_safe_tables)
         
-        # 3: Structure Split
-        refined_splits = []
+        # 3: Structure Split (mỗi split được tokenize đúng 1 lần, số token đi kèm qua các bước sau)
+        refined_splits, refined_counts = [], []
         for doc in raw_splits:
-            if self._count_tokens(doc.page_content) > MAX_TOKENS:
-                sub_docs = self.structure_splitter.split_documents([doc])
-                refined_splits.extend(sub_docs)
-            else:
+            content_tokens = self._content_tokens(doc.page_content)
+            if content_tokens + self._special_tokens <= MAX_TOKENS:
                 refined_splits.append(doc)
+                refined_counts.append(content_tokens)
+                continue
+
+            # Bảng lớn -> nhóm dòng kèm header, không để structure / semantic split cắt ngang bảng
+            pieces = self._split_large_tables(doc) if self.table_row_groups else [doc]
+            for piece in pieces:
+                piece_tokens = content_tokens if piece is doc else self._content_tokens(piece.page_content)
+                if piece_tokens + self._special_tokens > MAX_TOKENS:
+                    sub_docs = self.structure_splitter.split_documents([piece])
+                    refined_splits.extend(sub_docs)
+                    refined_counts.extend(self._content_tokens(sub.page_content) for sub in sub_docs)
+                else:
+                    refined_splits.append(piece)
+                    refined_counts.append(piece_tokens)
+
+        return refined_splits, refined_counts
 
+    def _build_chunks(self, splits, token_counts, tenant_id: str, src_file: str, accessed_role: List[int]) -> List[Dict]:
+        """4. Smart Merge -> 5. Semantic/Hard Cap"""
         # 4: Smart Merge 
-        merged_splits = self._smart_merge_sections(refined_splits)
+        merged_splits, merged_counts = self._smart_merge_sections(splits, token_counts)
         
         final_chunks = []
 
         # 5: Final Processing
-        for doc in merged_splits:
+        for doc, content_tokens in zip(merged_splits, merged_counts):
             content = doc.page_content
             headers = doc.metadata
-            token_count = self._count_tokens(content)
+            token_count = content_tokens + self._special_tokens
 
             # Case A: Chunk > MAX_TOKENS -> Semantic Split
             if token_count > MAX_TOKENS:
@@ -172,15 +285,53 @@ class ChunkingService:
             # Case B: Chunk <= MAX_TOKENS -> Save
             else:
                 method = "markdown_adaptive" if token_count > MIN_TOKENS else "merged_small"
-                self._add_chunk(final_chunks, content, headers, tenant_id, src_file, accessed_role, method)
+                self._add_chunk(final_chunks, content, headers, tenant_id, src_file, accessed_role, method, token_count)
 
         return final_chunks
 
-    def _add_chunk(self, chunks_list, content, headers, tenant_id, src_file, accessed_role, method):
+    def process_hybrid_splitting(self, text: str, tenant_id: str, src_file: str, accessed_role: List[int]) -> List[Dict]:
+        """
+        1. Pre-process Tables -> 2. MD Split -> 3. Structure Split -> 4. Smart Merge -> 5. Semantic/Hard Cap
+        """
+        splits, token_counts = self._split_sections(text)
+        return self._build_chunks(splits, token_counts, tenant_id, src_file, accessed_role)
+
+    def process_small_to_big(self, text: str, tenant_id: str, src_file: str, accessed_role: List[int]):
+        """
+        Small-to-big: các chunk của process_hybrid_splitting làm parent section,
+        mỗi parent được chia tiếp thành child passages nhỏ (mang parent_id) để embed + rerank.
+        Returns: (parents, children)
+        """
+        parents = self.process_hybrid_splitting(text, tenant_id, src_file, accessed_role)
+        return parents, self._split_children(parents, tenant_id, src_file, accessed_role, {})
+
+    def _split_children(self, parents: List[Dict], tenant_id: str, src_file: str, accessed_role: List[int], occurrences: Dict) -> List[Dict]:
+        """Gán parent_id cho từng parent và chia thành child passages. occurrences: đếm nội dung trùng trong cả file."""
+        children = []
+
+        for parent in parents:
+            # parent_id cố định theo nội dung: sửa 1 section không làm đổi id các section khác
+            content_hash = hashlib.sha256(parent["content"].encode("utf-8")).hexdigest()
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+            parent_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{tenant_id}_{src_file}_parent_{content_hash}_{occurrence}"))
+            parent["parent_id"] = parent_id
+
+            metadata = parent["metadata"]
+            headers = {h.upper(): metadata[h] for h in ["h1", "h2", "h3"] if metadata.get(h)}
+
+            for child_text in self.child_splitter.split_text(parent["content"]):
+                self._add_chunk(children, child_text, headers, tenant_id, src_file, accessed_role, "small_to_big_child")
+                children[-1]["parent_id"] = parent_id
+
+        return children
+
+    def _add_chunk(self, chunks_list, content, headers, tenant_id, src_file, accessed_role, method, token_count=None):
         enriched_content = self._inject_header_context(content, headers)
         
         flat_metadata = {
-            "token_count": self._count_tokens(content),
+            # token_count đã tính ở bước trước thì dùng lại, không tokenize lần nữa
+            "token_count": token_count if token_count is not None else self._count_tokens(content),
             "h1": headers.get("H1", ""),
             "h2": headers.get("H2", ""),
             "h3": headers.get("H3", "")
@@ -202,3 +353,158 @@ class ChunkingService:
         if context_str not in content[:300]: 
             return f"**Bối cảnh: {context_str}**\n\n{content}"
         return content
+
+
+# Chunking tăng dần cho streaming ingest: nhận markdown từng trang OCR, chỉ chunk phần văn bản đã "đóng",
+# phần còn lại giữ trong buffer chờ trang tiếp theo. Kết quả giống hệt chunk cả file (nội dung, metadata, point_id).
+class IncrementalChunker:
+    """
+    Buffer được chia thành các segment tại dòng H1 / H2 mà header_splitter chắc chắn tách thành section mới
+    (metadata khác section trước, không rơi vào trường hợp gộp header đứng riêng). Mỗi segment đóng
+    (đã thấy header của segment sau) được split + đếm token đúng 1 lần.
+    Cắt tại đầu 1 segment khi _smart_merge_sections chắc chắn không gộp qua ranh giới đó:
+    - Giữa các segment đã đóng: quyết định gộp tính được chính xác (đã biết số token 2 bên)
+    - Trước segment đang mở: chỉ khi không gộp kể cả với section nhỏ nhất (khác H1, hoặc phần đã gộp >= IDEAL_TOKENS)
+    Segment bắt đầu bằng H2 được tách riêng nên header_splitter không thấy dòng H1 -> gán lại H1 đang mở.
+    """
+
+    def __init__(self, service: ChunkingService, tenant_id: str, src_file: str, accessed_role: List[int], small_to_big: bool = False):
+        self.service = service
+        self.tenant_id = tenant_id
+        self.src_file = src_file
+        self.accessed_role = accessed_role
+        self.small_to_big = small_to_big
+
+        self.buffer = ""
+        # Segment đã đóng: (vị trí bắt đầu trong buffer, splits, token counts)
+        self._segments = []
+        # Segment đang mở: vị trí bắt đầu, H1 gán lại cho các split thiếu H1, H1 của split đầu tiên
+        self._open_start = 0
+        self._open_carry_h1 = None
+        self._open_h1 = None
+        # Trạng thái đọc dòng của buffer (giống header_splitter): vị trí dòng chưa đọc, code block đang mở,
+        # header đang mở, dòng khác rỗng gần nhất
+        self._scanned = 0
+        self._fence = None
+        self._h1 = None
+        self._h2 = None
+        self._last_line = ""
+        # Đếm parent trùng nội dung trên cả file -> parent_id giống chunk cả file
+        self._parent_occurrences = {}
+
+    def _parse_line(self, line: str) -> Tuple[int, Optional[str], str]:
+        """(level 1/2 hoặc 0, tiêu đề, dòng đã strip) theo cách header_splitter nhận diện header (bỏ qua code block)."""
+        stripped = "".join(filter(str.isprintable, line.strip()))
+        if self._fence is None:
+            if stripped.startswith("```") and stripped.count("```") == 1:
+                self._fence = "```"
+            elif stripped.startswith("~~~"):
+                self._fence = "~~~"
+        elif stripped.startswith(self._fence):
+            self._fence = None
+
+        if self._fence is None:
+            for level, marker in ((2, "##"), (1, "#")):
+                if stripped == marker or stripped.startswith(marker + " "):
+                    return level, stripped[len(marker):].strip(), stripped
+        return 0, None, stripped
+
+    def _metadata(self) -> Dict:
+        return {name: title for name, title in (("H1", self._h1), ("H2", self._h2)) if title is not None}
+
+    def _sections(self, text: str, carry_h1: Optional[str]):
+        splits, token_counts = self.service._split_sections(text)
+        if carry_h1 is not None:
+            for doc in splits:
+                if "H1" not in doc.metadata:
+                    doc.metadata = {"H1": carry_h1, **doc.metadata}
+        return splits, token_counts
+
+    def _close_segment(self, end: int):
+        splits, token_counts = self._sections(self.buffer[self._open_start:end], self._open_carry_h1)
+        self._segments.append((self._open_start, splits, token_counts))
+
+    def _scan(self):
+        """Đọc các dòng đã đủ (kết thúc bằng \n): header bắt đầu section mới -> đóng segment đang mở."""
+        while True:
+            end = self.buffer.find("\n", self._scanned)
+            if end < 0:
+                return
+            start, self._scanned = self._scanned, end + 1
+
+            level, title, stripped = self._parse_line(self.buffer[start:end])
+            if level:
+                previous = self._metadata()
+                if level == 1:
+                    self._h1, self._h2 = title, None
+                else:
+                    self._h2 = title
+                current = self._metadata()
+
+                # header_splitter: metadata giống section trước -> gộp; section trước ít header hơn và kết thúc
+                # bằng dòng "#..." (header đứng riêng) -> gộp vào section mới
+                header_only = len(previous) < len(current) and self._last_line.startswith("#")
+                if start > self._open_start and current != previous and not header_only:
+                    self._close_segment(start)
+                    self._open_start = start
+                    self._open_carry_h1 = self._h1 if level == 2 else None
+                    self._open_h1 = self._h1
+
+            if stripped:
+                self._last_line = stripped
+
+    def _find_cut(self) -> int:
+        """Số segment đã đóng emit được: ranh giới cuối cùng mà smart merge chắc chắn không gộp qua."""
+        cut, current = 0, None
+        for index, (_, splits, token_counts) in enumerate(self._segments):
+            for position, (doc, tokens) in enumerate(zip(splits, token_counts)):
+                h1 = doc.metadata.get("H1")
+                if current is not None and self.service._should_merge(current[0], current[1], h1, tokens):
+                    current = (current[0], current[1] + self.service._separator_tokens + tokens)
+                    continue
+                if position == 0:
+                    cut = index
+                current = (h1, tokens)
+
+        # Segment đang mở: section đầu chưa biết kích thước -> giả sử nhỏ nhất (gộp dễ nhất)
+        if current is None or not self.service._should_merge(current[0], current[1], self._open_h1, 0):
+            return len(self._segments)
+        return cut
+
+    def _emit(self, count: int) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        closed, self._segments = self._segments[:count], self._segments[count:]
+        shift = self._segments[0][0] if self._segments else self._open_start
+        self.buffer = self.buffer[shift:]
+        self._segments = [(start - shift, splits, token_counts) for start, splits, token_counts in self._segments]
+        self._open_start -= shift
+        self._scanned -= shift
+
+        splits = [doc for _, segment_splits, _ in closed for doc in segment_splits]
+        token_counts = [tokens for _, _, segment_counts in closed for tokens in segment_counts]
+        if not splits:
+            return None, []
+
+        chunks = self.service._build_chunks(splits, token_counts, self.tenant_id, self.src_file, self.accessed_role)
+        if not self.small_to_big:
+            return None, chunks
+        children = self.service._split_children(chunks, self.tenant_id, self.src_file, self.accessed_role, self._parent_occurrences)
+        return chunks, children
+
+    def feed(self, page_text: str) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        """
+        Thêm markdown của 1 trang. Returns: (parents hoặc None, chunks) của các section vừa đóng
+        (rỗng nếu chưa có ranh giới nào).
+        """
+        self.buffer += page_text
+        self._scan()
+        count = self._find_cut()
+        if count == 0:
+            return None, []
+        return self._emit(count)
+
+    def close(self) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        """Hết tài liệu: chunk các section còn giữ lại (kể cả dòng cuối chưa có \n)."""
+        self._close_segment(len(self.buffer))
+        result = self._emit(len(self._segments))
+        self.buffer, self._segments, self._open_start, self._scanned = "", [], 0, 0
+        return result
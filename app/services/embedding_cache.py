@@ -0,0 +1,90 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Cache embedding theo nội dung (content-addressed) lưu trên SQLite:
+# key = (model_key, sha256(text)) -> vector. Upload lại tài liệu đã sửa một phần
+# chỉ phải encode các chunk có nội dung thay đổi.
+class EmbeddingCache:
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_key TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model_key, content_hash)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _get_many(self, model_key: str, texts: List[str]) -> List[Optional[bytes]]:
+        hashes = [self.content_hash(t) for t in texts]
+        found: Dict[str, bytes] = {}
+
+        with self._lock:
+            # SQLite giới hạn số tham số mỗi câu lệnh -> query theo lô 500
+            for i in range(0, len(hashes), 500):
+                part = hashes[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model_key = ? AND content_hash IN ({','.join('?' * len(part))})",
+                    [model_key, *part],
+                ).fetchall()
+                found.update(rows)
+
+        return [found.get(h) for h in hashes]
+
+    def _put_many(self, model_key: str, texts: List[str], blobs: List[bytes]):
+        rows = [(model_key, self.content_hash(t), blob) for t, blob in zip(texts, blobs)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    # Dense: float32 bytes <-> np.ndarray (không đi qua list Python)
+    def get_dense(self, model_key: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        return [
+            np.frombuffer(blob, dtype=np.float32) if blob is not None else None
+            for blob in self._get_many(model_key, texts)
+        ]
+
+    def put_dense(self, model_key: str, texts: List[str], vectors: np.ndarray):
+        self._put_many(model_key, texts, [np.asarray(v, dtype=np.float32).tobytes() for v in vectors])
+
+    # Sparse: n indices (int32) nối tiếp n values (float32)
+    def get_sparse(self, model_key: str, texts: List[str]) -> List[Optional[Dict]]:
+        results = []
+        for blob in self._get_many(model_key, texts):
+            if blob is None:
+                results.append(None)
+                continue
+            n = len(blob) // 8
+            results.append({
+                "indices": np.frombuffer(blob, dtype=np.int32, count=n).tolist(),
+                "values": np.frombuffer(blob, dtype=np.float32, offset=n * 4).tolist(),
+            })
+        return results
+
+    def put_sparse(self, model_key: str, texts: List[str], vectors: List[Dict]):
+        self._put_many(model_key, texts, [
+            np.asarray(v["indices"], dtype=np.int32).tobytes() + np.asarray(v["values"], dtype=np.float32).tobytes()
+            for v in vectors
+        ])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,22 @@
 import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import torch
+from tqdm.auto import tqdm
 from sentence_transformers import SentenceTransformer
 from transformers import AutoModelForMaskedLM, AutoTokenizer
+from app.core.config import settings
+from app.services.model_registry import model_registry
 
 # Model Name
 DENSE_MODEL_NAME = "AITeamVN/Vietnamese_Embedding"
 SPARSE_MODEL_NAME = "prithivida/Splade_PP_en_v1"
 
+# Micro-batch encode: khóa model được nhả giữa các micro-batch
+EMBED_BATCH_SIZE = 32
+
 # Save Model
 MODEL_CACHE_FOLDER = os.path.join(os.path.dirname(__file__), "models_cache")
 os.makedirs(MODEL_CACHE_FOLDER, exist_ok=True)
@@ -23,6 +33,9 @@ class LocalDenseEmbedding:
             cache_folder=cache_folder
         )
 
+        # Khóa inference: instance được chia sẻ giữa thread chat và thread upload
+        self._lock = threading.Lock()
+
     # Get model name
     def get_model_name(self):
         return self.model_name
@@ -31,46 +44,117 @@ class LocalDenseEmbedding:
     def get_model(self):
         return self.model
 
+    # Key cho embedding cache
+    def get_cache_key(self):
+        return f"dense:{self.model_name}"
+
     # Processing query input
     def get_dense_vector(self, query: str):
-        embedding = self.model.encode(query, normalize_embeddings=True)
+        with self._lock:
+            embedding = self.model.encode(query, normalize_embeddings=True)
 
         return embedding.tolist()
 
-    # Processing enterprise docs
-    def embed(self, texts: list[str]): 
-        embeddings = self.model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=True)
+    # Processing enterprise docs: trả về np.ndarray float32 (N, dim), không convert sang list Python
+    def embed(self, texts: list[str], show_progress_bar: bool = True) -> np.ndarray: 
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Khóa theo từng micro-batch: query của luồng chat chỉ chờ tối đa 1 micro-batch của upload, không chờ cả tài liệu
+        parts = []
+        starts = range(0, len(texts), EMBED_BATCH_SIZE)
+        for i in tqdm(starts, desc="Batches", disable=not show_progress_bar):
+            with self._lock:
+                parts.append(self.model.encode(
+                    texts[i : i + EMBED_BATCH_SIZE], batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False
+                ))
+
+        return np.ascontiguousarray(np.concatenate(parts), dtype=np.float32)
+
+    # Interface Embeddings của LangChain (SemanticChunker): đi qua cùng khóa inference
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.get_dense_vector(text)
+
+# Sparse tensor (batch, vocab) -> list {"indices", "values"}
+def extract_sparse_vectors(sparse_vec_batch: torch.Tensor, top_k: int = 0, min_weight: float = 0.0) -> list[dict]:
+    """
+    Trích sparse vector cho cả batch với đúng 1 lần copy device -> host.
+    - min_weight > 0: bỏ các term có trọng số < min_weight
+    - top_k > 0: chỉ giữ top_k term có trọng số lớn nhất mỗi vector
+    Indices trả về luôn được sắp xếp tăng dần.
+    """
+    batch_vectors = sparse_vec_batch.float()
+
+    if min_weight > 0:
+        batch_vectors = torch.where(batch_vectors >= min_weight, batch_vectors, torch.zeros_like(batch_vectors))
+
+    if 0 < top_k < batch_vectors.shape[-1]:
+        values, cols = torch.topk(batch_vectors, k=top_k, dim=-1)
+        cols, order = torch.sort(cols, dim=-1)
+        values = torch.gather(values, -1, order)
+        rows = torch.arange(batch_vectors.shape[0], device=cols.device).unsqueeze(-1).expand_as(cols)
+
+        keep = values > 0
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+    else:
+        rows, cols = batch_vectors.nonzero(as_tuple=True)
+        values = batch_vectors[rows, cols]
 
-        return embeddings.tolist()
+    # Gộp rows/cols/values vào 1 tensor float64 (chính xác tuyệt đối với id < 2^53) -> 1 lần transfer
+    packed = torch.stack([rows.double(), cols.double(), values.double()]).cpu().numpy()
+    rows_np = packed[0].astype(np.int64)
+    cols_np = packed[1].astype(np.int64)
+    values_np = packed[2]
+
+    # Kết quả đã sắp theo row (row-major) -> cắt theo số phần tử từng row
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(rows_np, minlength=batch_vectors.shape[0]))])
+
+    return [
+        {
+            "indices": cols_np[start:end].tolist(),
+            "values": values_np[start:end].tolist(),
+        }
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
 
 # Create embedding sparse-vector
 class LocalSparseEmbedding:
-    def __init__(self, model_name=SPARSE_MODEL_NAME, cache_folder=MODEL_CACHE_FOLDER):
+    def __init__(self, model_name=SPARSE_MODEL_NAME, cache_folder=MODEL_CACHE_FOLDER,
+                 doc_top_k=None, doc_min_weight=None, query_top_k=None, query_min_weight=None):
+        self.model_name = model_name
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        # Pruning cấu hình riêng cho documents và queries (0 = không prune)
+        self.doc_top_k = settings.sparse_doc_top_k if doc_top_k is None else doc_top_k
+        self.doc_min_weight = settings.sparse_doc_min_weight if doc_min_weight is None else doc_min_weight
+        self.query_top_k = settings.sparse_query_top_k if query_top_k is None else query_top_k
+        self.query_min_weight = settings.sparse_query_min_weight if query_min_weight is None else query_min_weight
+
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_folder)
         self.model = AutoModelForMaskedLM.from_pretrained(model_name, cache_dir=cache_folder, use_safetensors=True)
         self.model.to(self.device) 
         self.model.eval() 
 
+        # Tokenizer (Rust) không an toàn khi gọi đồng thời -> khóa cả tokenize + forward
+        self._lock = threading.Lock()
+
+    # Key cho embedding cache: pruning làm thay đổi vector nên phải nằm trong key
+    def get_cache_key(self):
+        return f"sparse:{self.model_name}:top_k={self.doc_top_k}:min_weight={self.doc_min_weight}"
+
     # Processing query input
     def get_sparse_vector(self, query: str):
-        tokens = self.tokenizer(query, return_tensors="pt").to(self.device)
-        
-        with torch.no_grad():
+        with self._lock, torch.no_grad():
+            tokens = self.tokenizer(query, return_tensors="pt").to(self.device)
             output = self.model(**tokens)
         
         logits = output.logits
-        weights = torch.max(torch.log(1 + torch.relu(logits)), dim=1).values.squeeze()
-        cols = weights.nonzero().squeeze().cpu().tolist()
-        weights = weights[cols].cpu().tolist()
-
-        if isinstance(cols, int): cols = [cols]
-        if isinstance(weights, float): weights = [weights]
+        weights = torch.max(torch.log(1 + torch.relu(logits)), dim=1).values
         
-        return {
-            "indices": cols,
-            "values": weights
-        }
+        return extract_sparse_vectors(weights, top_k=self.query_top_k, min_weight=self.query_min_weight)[0]
 
     # Processing enterprise docs
     def embed(self, texts: list[str], batch_size=32):
@@ -79,15 +163,15 @@ class LocalSparseEmbedding:
         for i in range(0, len(texts), batch_size):
             batch_texts = texts[i : i + batch_size]
             
-            inputs = self.tokenizer(
-                batch_texts, 
-                return_tensors="pt", 
-                padding=True, 
-                truncation=True, 
-                max_length=512
-            ).to(self.device)
-            
-            with torch.no_grad():
+            with self._lock, torch.no_grad():
+                inputs = self.tokenizer(
+                    batch_texts, 
+                    return_tensors="pt", 
+                    padding=True, 
+                    truncation=True, 
+                    max_length=512
+                ).to(self.device)
+                
                 outputs = self.model(**inputs)
                 logits = outputs.logits
 
@@ -96,13 +180,96 @@ class LocalSparseEmbedding:
                 masked_logits = log_logits * inputs.attention_mask.unsqueeze(-1)
                 sparse_vec_batch, _ = torch.max(masked_logits, dim=1)
             
-            for vec in sparse_vec_batch:
-                indices = vec.nonzero().squeeze().cpu().tolist()
-                values = vec[indices].cpu().tolist()
-                
-                if isinstance(indices, int): indices = [indices]
-                if isinstance(values, float): values = [values]
+            results.extend(extract_sparse_vectors(sparse_vec_batch, top_k=self.doc_top_k, min_weight=self.doc_min_weight))
                 
-                results.append({"indices": indices, "values": values})
-                
-        return results
\ No newline at end of file
+        return results
+
+
+# ==================== SHARED INSTANCES ====================
+# Luôn lấy model qua các hàm này thay vì khởi tạo trực tiếp: mỗi model chỉ load 1 lần / process.
+def get_dense_embedder(model_name=DENSE_MODEL_NAME) -> LocalDenseEmbedding:
+    return model_registry.get(f"dense:{model_name}", lambda: LocalDenseEmbedding(model_name))
+
+def get_sparse_embedder(model_name=SPARSE_MODEL_NAME) -> LocalSparseEmbedding:
+    return model_registry.get(f"sparse:{model_name}", lambda: LocalSparseEmbedding(model_name))
+
+def get_tokenizer(model_name=DENSE_MODEL_NAME):
+    return model_registry.get(
+        f"tokenizer:{model_name}",
+        lambda: AutoTokenizer.from_pretrained(model_name, cache_dir=MODEL_CACHE_FOLDER),
+    )
+
+def get_sentence_transformer(model_name: str) -> SentenceTransformer:
+    return model_registry.get(
+        f"sentence_transformer:{model_name}",
+        lambda: SentenceTransformer(model_name, cache_folder=MODEL_CACHE_FOLDER),
+    )
+
+
+# ==================== MULTI-PROCESS ENCODING ====================
+# Mỗi worker process tự load Dense + Sparse model một lần (initializer),
+# sau đó nhận từng đoạn texts và trả về cả hai loại vector.
+_worker_dense = None
+_worker_sparse = None
+
+def _init_embedding_worker(num_threads: int):
+    global _worker_dense, _worker_sparse
+
+    # Giới hạn thread cho từng worker để N process không tranh nhau toàn bộ CPU
+    torch.set_num_threads(num_threads)
+    _worker_dense = get_dense_embedder()
+    _worker_sparse = get_sparse_embedder()
+
+def _embed_in_worker(texts: list[str]):
+    return _worker_dense.embed(texts, show_progress_bar=False), _worker_sparse.embed(texts)
+
+class MultiProcessEmbedding:
+    """
+    Process pool encode Dense + Sparse song song cho bulk ingestion.
+    Texts được chia theo bội số của batch_size nên các batch sparse giống hệt đường chạy 1 process.
+    Worker process sống tới khi close() (hoặc hết khối `with`): chủ sở hữu phải đóng khi shutdown.
+    """
+    def __init__(self, num_workers: int, threads_per_worker: int = 1, batch_size: int = 32):
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.batch_size = batch_size
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Bắt buộc dùng "spawn": fork một process đã load torch dễ bị treo
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_embedding_worker,
+                initargs=(self.threads_per_worker,),
+            )
+        return self._executor
+
+    def embed(self, texts: list[str]):
+        """Trả về (dense_vectors: np.ndarray, sparse_vectors) theo đúng thứ tự texts."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32), []
+
+        # Chia đều cho các worker, làm tròn lên bội số của batch_size
+        per_worker = -(-len(texts) // self.num_workers)
+        chunk_size = -(-per_worker // self.batch_size) * self.batch_size
+        parts = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+        dense_parts, sparse_vectors = [], []
+        for dense, sparse in self._get_executor().map(_embed_in_worker, parts):
+            dense_parts.append(dense)
+            sparse_vectors.extend(sparse)
+
+        return np.concatenate(dense_parts), sparse_vectors
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
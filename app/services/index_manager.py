@@ -0,0 +1,101 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from qdrant_client import QdrantClient, models
+
+# Quản lý vòng đời HNSW index của collection trong lúc ingest:
+#   - "incremental": HNSW luôn bật, mỗi upload được index dần (phù hợp upload lẻ tẻ)
+#   - "bulk"       : tắt build index (indexing_threshold=0) khi đang upload, build lại đúng 1 lần
+#                    khi upload cuối cùng kết thúc, rồi chờ optimizer xong
+# Trong lúc rebuild, search nên dùng indexed_only để không rơi về brute force,
+# trừ tenant vừa ghi dữ liệu trong đợt bulk (dữ liệu mới chưa index -> indexed_only sẽ không thấy).
+class IndexLifecycleManager:
+    # Trạng thái dùng chung theo collection: VectorStoreService của luồng chat và luồng upload
+    # là 2 instance khác nhau nhưng phải thấy cùng trạng thái rebuild
+    _active_bulk = {}
+    _rebuilding = {}
+    # Tenant đã ghi trong đợt bulk hiện tại: giữ tới khi rebuild xong
+    _pending_tenants = {}
+    _lock = threading.Lock()
+
+    def __init__(self, client: QdrantClient, collection_name: str, hnsw_config: models.HnswConfigDiff,
+                 mode: str = "incremental", indexing_threshold: int = 20000, wait_timeout: int = 600):
+        self.client = client
+        self.collection_name = collection_name
+        self.hnsw_config = hnsw_config
+        self.mode = mode
+        self.indexing_threshold = indexing_threshold
+        self.wait_timeout = wait_timeout
+
+    def is_rebuilding(self) -> bool:
+        return self._rebuilding.get(self.collection_name, False)
+
+    def has_unindexed_data(self, tenant_id) -> bool:
+        """Tenant có dữ liệu ghi trong đợt bulk chưa được index (search không được dùng indexed_only)."""
+        with self._lock:
+            return tenant_id in self._pending_tenants.get(self.collection_name, ())
+
+    def _begin_bulk(self):
+        # Nhiều upload chạy song song -> chỉ upload đầu tiên tắt indexing, upload cuối cùng rebuild
+        with self._lock:
+            self._active_bulk[self.collection_name] = self._active_bulk.get(self.collection_name, 0) + 1
+            if self._active_bulk[self.collection_name] > 1:
+                return
+            self._rebuilding[self.collection_name] = True
+
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+        )
+
+    def _end_bulk(self):
+        with self._lock:
+            self._active_bulk[self.collection_name] -= 1
+            if self._active_bulk[self.collection_name] > 0:
+                return
+
+        try:
+            # Bật lại indexing + đảm bảo cấu hình HNSW đúng -> optimizer build index 1 lần
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                hnsw_config=self.hnsw_config,
+                optimizers_config=models.OptimizersConfigDiff(indexing_threshold=self.indexing_threshold),
+            )
+            self.wait_until_indexed()
+        finally:
+            with self._lock:
+                if self._active_bulk[self.collection_name] == 0:
+                    self._rebuilding[self.collection_name] = False
+                    self._pending_tenants.pop(self.collection_name, None)
+
+    def wait_until_indexed(self) -> bool:
+        """Chờ optimizer xử lý xong (collection GREEN). Trả về False nếu quá wait_timeout."""
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            info = self.client.get_collection(self.collection_name)
+            if info.status == models.CollectionStatus.GREEN and info.optimizer_status == models.OptimizersStatusOneOf.OK:
+                return True
+            time.sleep(1)
+
+        print(f"[INDEX] Hết {self.wait_timeout}s chờ '{self.collection_name}' build index xong.")
+        return False
+
+    @contextmanager
+    def ingest(self, tenant_id=None):
+        """
+        Bọc 1 lần upload: bulk mode tắt indexing trong lúc ghi và rebuild khi xong; incremental không làm gì.
+        tenant_id: tenant được ghi -> search của tenant này bỏ indexed_only cho tới khi rebuild xong.
+        """
+        if self.mode != "bulk":
+            yield
+            return
+
+        if tenant_id is not None:
+            with self._lock:
+                self._pending_tenants.setdefault(self.collection_name, set()).add(tenant_id)
+        self._begin_bulk()
+        try:
+            yield
+        finally:
+            self._end_bulk()
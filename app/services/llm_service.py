@@ -239,11 +239,14 @@ class PromptBuilder:
         return history_str
     
     # Respone format
-    def build_chat_messages(self, query: str, search_results: List[Any], chat_history: List[Any], reasoning: bool = False) -> List[Any]:
+    def build_chat_messages(self, query: str, search_results: List[Any], chat_history: List[Any], reasoning: bool = False, summary: str = "") -> List[Any]:
         
         # 1. Chuẩn bị Context
         context_str = self._format_context(search_results)
         history_str = self._fomat_history(chat_history)
+        if summary:
+            # Memory mode summary: tóm tắt các lượt cũ đứng trước các lượt gần nhất
+            history_str = f"(Tóm tắt hội thoại trước đó): {summary}\n{history_str}"
 
         # 2. Chọn hướng dẫn output dựa trên mode reasoning
         output_instruction = self.reasoning_instructions if reasoning else self.normal_instructions
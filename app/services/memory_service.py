@@ -1,44 +1,439 @@
+import asyncio
 import redis
+import redis.asyncio as aioredis
+import hashlib
 import json
+import msgpack
+import numpy as np
 import ollama
+import threading
+import zstandard
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
 
 NAME_LLM_MODEL = "qwen2.5:latest"
 
+# Định dạng lưu message trong Redis list (byte đầu là marker):
+#   b"M" + msgpack          : message ngắn
+#   b"Z" + zstd(msgpack)    : message dài (>= redis_compress_min_bytes), vd. câu trả lời dài của LLM
+#   b"{..."                 : JSON cũ (trước khi đổi định dạng) -> vẫn đọc được
+_MSGPACK = b"M"
+_ZSTD = b"Z"
+
 class RedisChatMemory:
-    def __init__(self, host='localhost', port=6379, db=0, password=None, max_message = 40):
-        self.redis_client = redis.Redis(
-            host=host, 
-            port=port, 
-            db=db, 
-            password=password, 
-            decode_responses=True,
+    """
+    Lịch sử hội thoại trên Redis list, mỗi (tenant_id, employee_id) 1 key có TTL.
+    Mỗi lần ghi là 1 transaction pipeline RPUSH + LTRIM + EXPIRE (1 round-trip).
+    Có cả bản sync và async (a*, redis.asyncio - luồng chat async của /ask), dùng chung cách mã hóa
+    msgpack/zstd, pipeline ghi và phần xử lý kết quả đọc; mỗi bản có connection pool riêng.
+
+    Mode "summary": các lượt cũ hơn memory_recent_turns được LLM gộp dần vào 1 bản tóm tắt lưu trên Redis
+    (chạy ở background sau khi ghi lượt chat, không nằm trên đường request); prompt nhận
+    tóm tắt + các lượt gần nhất trong giới hạn memory_history_token_budget.
+
+    Mode "relevant": mỗi lượt hỏi-đáp được embed 1 lần khi ghi (background) và lưu cùng vector
+    ở list chat_turns; prompt nhận top-k lượt cũ liên quan nhất tới câu hỏi + 2 lượt gần nhất.
+    """
+    def __init__(self, host=None, port=None, db=None, password=None, max_message=None, ttl=None):
+        self._connection_kwargs = dict(
+            host=host or settings.redis_host,
+            port=port or settings.redis_port,
+            db=settings.redis_db if db is None else db,
+            password=password or settings.redis_password,
+            max_connections=settings.redis_max_connections,
             socket_timeout=5,
             socket_connect_timeout=5,
         )
-        # self.ttl = 25920  # 72 hour
-        self.max_message = max_message
+        self.redis_client = redis.Redis(connection_pool=redis.ConnectionPool(**self._connection_kwargs))
+        # Async client tạo lazily (pool gắn với event loop đang chạy)
+        self._async_client = None
+
+        self.ttl = settings.redis_conversation_ttl if ttl is None else ttl
+        self.max_message = max_message or settings.redis_history_max_messages
+        self.compress_min_bytes = settings.redis_compress_min_bytes
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+        # Summary / relevant mode: 1 worker chạy ở background (gộp tóm tắt, embed lượt chat),
+        # mỗi conversation tối đa 1 job gộp đang chờ
+        self.mode = settings.memory_mode
+        self.recent_messages = settings.memory_recent_turns * 2
+        self.token_budget = settings.memory_history_token_budget
+        self.relevant_top_k = settings.memory_relevant_top_k
+        self.relevant_min_score = settings.memory_relevant_min_score
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory") if self.mode != "window" else None
+        self._fold_pending = set()
+        self._fold_lock = threading.Lock()
+        self._tokenizer = None
+        self._embedder = None
+
+    def _get_async_client(self) -> aioredis.Redis:
+        if self._async_client is None:
+            self._async_client = aioredis.Redis(connection_pool=aioredis.ConnectionPool(**self._connection_kwargs))
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
 
     def _generate_key(self, tenant_id, employee_id):
         return f"chat_history:{tenant_id}:{employee_id}"
 
-    def add_message(self, tenant_id, employee_id, role, content):
+    def _summary_key(self, tenant_id, employee_id):
+        return f"chat_summary:{tenant_id}:{employee_id}"
+
+    def _turns_key(self, tenant_id, employee_id):
+        return f"chat_turns:{tenant_id}:{employee_id}"
+
+    def _rewrites_key(self, tenant_id, employee_id):
+        return f"chat_rewrites:{tenant_id}:{employee_id}"
+
+    def _encode(self, role, content) -> bytes:
+        packed = msgpack.packb({"role": role, "content": content}, use_bin_type=True)
+        if len(packed) >= self.compress_min_bytes:
+            return _ZSTD + self._compressor.compress(packed)
+        return _MSGPACK + packed
+
+    def _decode(self, raw: bytes) -> Dict:
+        marker, body = raw[:1], raw[1:]
+        if marker == _MSGPACK:
+            return msgpack.unpackb(body, raw=False)
+        if marker == _ZSTD:
+            return msgpack.unpackb(self._decompressor.decompress(body), raw=False)
+        return json.loads(raw)
+
+    def _write_pipeline(self, pipe, tenant_id, employee_id, messages: List[Dict]):
+        # RPUSH + LTRIM + EXPIRE trong 1 MULTI/EXEC: giữ max_message mới nhất, gia hạn TTL mỗi lần ghi
         key = self._generate_key(tenant_id, employee_id)
-        message = json.dumps({"role": role, "content": content}, ensure_ascii=False)
-        
-        self.redis_client.rpush(key, message)
+        pipe.rpush(key, *(self._encode(m["role"], m["content"]) for m in messages))
+        pipe.ltrim(key, -self.max_message, -1)
+        pipe.expire(key, self.ttl)
+        # Bản tóm tắt / vector các lượt (nếu có) sống cùng TTL với lịch sử
+        pipe.expire(self._summary_key(tenant_id, employee_id), self.ttl)
+        pipe.expire(self._turns_key(tenant_id, employee_id), self.ttl)
+        pipe.expire(self._rewrites_key(tenant_id, employee_id), self.ttl)
+
+    def add_messages(self, tenant_id, employee_id, messages: List[Dict]):
+        if not messages:
+            return
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            self._write_pipeline(pipe, tenant_id, employee_id, messages)
+            pipe.execute()
 
-        if self.redis_client.llen(key) > self.max_message:
-            self.redis_client.ltrim(key, -self.max_message, -1)
+    async def aadd_messages(self, tenant_id, employee_id, messages: List[Dict]):
+        if not messages:
+            return
+        async with self._get_async_client().pipeline(transaction=True) as pipe:
+            self._write_pipeline(pipe, tenant_id, employee_id, messages)
+            await pipe.execute()
+
+    def add_message(self, tenant_id, employee_id, role, content):
+        self.add_messages(tenant_id, employee_id, [{"role": role, "content": content}])
+
+    def add_turn(self, tenant_id, employee_id, user_query, answer):
+        """Ghi câu hỏi + câu trả lời của 1 lượt chat trong cùng 1 transaction."""
+        self.add_messages(tenant_id, employee_id, [
+            {"role": "user", "content": user_query},
+            {"role": "assistant", "content": answer},
+        ])
+        self.schedule_fold(tenant_id, employee_id)
+        self.schedule_index_turn(tenant_id, employee_id, user_query, answer)
+
+    async def aadd_turn(self, tenant_id, employee_id, user_query, answer):
+        """Bản async của add_turn."""
+        await self.aadd_messages(tenant_id, employee_id, [
+            {"role": "user", "content": user_query},
+            {"role": "assistant", "content": answer},
+        ])
+        self.schedule_fold(tenant_id, employee_id)
+        self.schedule_index_turn(tenant_id, employee_id, user_query, answer)
 
     def get_history(self, tenant_id, employee_id, limit=2):
         key = self._generate_key(tenant_id, employee_id)
         raw_history = self.redis_client.lrange(key, -limit, -1)
         
-        return [json.loads(msg) for msg in raw_history]
+        return [self._decode(msg) for msg in raw_history]
+
+    async def aget_history(self, tenant_id, employee_id, limit=2):
+        key = self._generate_key(tenant_id, employee_id)
+        raw_history = await self._get_async_client().lrange(key, -limit, -1)
+
+        return [self._decode(msg) for msg in raw_history]
 
     def clear_history(self, tenant_id, employee_id):
         key = self._generate_key(tenant_id, employee_id)
-        self.redis_client.delete(key) 
+        self.redis_client.delete(
+            key,
+            self._summary_key(tenant_id, employee_id),
+            self._turns_key(tenant_id, employee_id),
+            self._rewrites_key(tenant_id, employee_id),
+        ) 
+
+    async def aclear_history(self, tenant_id, employee_id):
+        key = self._generate_key(tenant_id, employee_id)
+        await self._get_async_client().delete(
+            key,
+            self._summary_key(tenant_id, employee_id),
+            self._turns_key(tenant_id, employee_id),
+            self._rewrites_key(tenant_id, employee_id),
+        )
+
+    @staticmethod
+    def _rewrite_field(query, chat_history: List[Dict]) -> str:
+        # Cùng câu hỏi nhưng ngữ cảnh khác -> viết lại khác: key theo câu hỏi + các message ngữ cảnh
+        data = json.dumps([query.strip().lower(), [m["content"] for m in chat_history]], ensure_ascii=False)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def get_rewrite(self, tenant_id, employee_id, query, chat_history: List[Dict]):
+        """Câu hỏi đã viết lại (cache theo conversation) hoặc None."""
+        rewritten = self.redis_client.hget(self._rewrites_key(tenant_id, employee_id), self._rewrite_field(query, chat_history))
+        return rewritten.decode("utf-8") if rewritten is not None else None
+
+    def put_rewrite(self, tenant_id, employee_id, query, chat_history: List[Dict], rewritten):
+        key = self._rewrites_key(tenant_id, employee_id)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, self._rewrite_field(query, chat_history), rewritten.encode("utf-8"))
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+
+    def get_summary(self, tenant_id, employee_id) -> str:
+        summary = self.redis_client.get(self._summary_key(tenant_id, employee_id))
+        return summary.decode("utf-8") if summary else ""
+
+    def _count_tokens(self, text: str) -> int:
+        if self._tokenizer is None:
+            # Tokenizer của embedding model (đã load sẵn trong registry) - xấp xỉ token của LLM
+            from app.services.embedding_service import get_tokenizer
+            self._tokenizer = get_tokenizer()
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+    def _get_embedder(self):
+        if self._embedder is None:
+            # Dense embedder dùng chung với retrieval (model registry)
+            from app.services.embedding_service import get_dense_embedder
+            self._embedder = get_dense_embedder()
+        return self._embedder
+
+    def _summary_reads(self, pipe, tenant_id, employee_id, limit):
+        pipe.get(self._summary_key(tenant_id, employee_id))
+        pipe.lrange(self._generate_key(tenant_id, employee_id), -limit, -1)
+
+    def _budget_history(self, summary, raw_history) -> Tuple[str, List[Dict]]:
+        """Summary mode: bản tóm tắt + các message gần nhất, lấy từ mới về cũ tới khi hết token budget."""
+        summary = summary.decode("utf-8") if summary else ""
+        budget = self.token_budget - self._count_tokens(summary)
+
+        messages = []
+        for raw in reversed(raw_history):
+            message = self._decode(raw)
+            budget -= self._count_tokens(message["content"])
+            if budget < 0:
+                break
+            messages.append(message)
+        messages.reverse()
+
+        return summary, messages
+
+    def get_prompt_history(self, tenant_id, employee_id, limit=40, query=None) -> Tuple[str, List[Dict]]:
+        """
+        Lịch sử cho prompt: (summary, messages).
+        - window  : không có summary, `limit` message gần nhất
+        - summary : bản tóm tắt + các message gần nhất, lấy từ mới về cũ tới khi hết token budget
+        - relevant: top-k lượt cũ liên quan tới `query` + 2 lượt gần nhất (cần query)
+        """
+        if self.mode == "relevant" and query:
+            return "", self.get_relevant_history(tenant_id, employee_id, query)
+        if self.mode != "summary":
+            return "", self.get_history(tenant_id, employee_id, limit=limit)
+
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            self._summary_reads(pipe, tenant_id, employee_id, limit)
+            summary, raw_history = pipe.execute()
+
+        return self._budget_history(summary, raw_history)
+
+    async def aget_prompt_history(self, tenant_id, employee_id, limit=40, query=None) -> Tuple[str, List[Dict]]:
+        """Bản async của get_prompt_history."""
+        if self.mode == "relevant" and query:
+            return "", await self.aget_relevant_history(tenant_id, employee_id, query)
+        if self.mode != "summary":
+            return "", await self.aget_history(tenant_id, employee_id, limit=limit)
+
+        async with self._get_async_client().pipeline(transaction=False) as pipe:
+            self._summary_reads(pipe, tenant_id, employee_id, limit)
+            summary, raw_history = await pipe.execute()
+
+        return self._budget_history(summary, raw_history)
+
+    def _relevant_reads(self, pipe, tenant_id, employee_id):
+        pipe.lrange(self._generate_key(tenant_id, employee_id), -4, -1)
+        pipe.lrange(self._turns_key(tenant_id, employee_id), 0, -1)
+
+    def _relevant_candidates(self, raw_recent, raw_turns) -> Tuple[List[Dict], List[Dict]]:
+        """(2 lượt gần nhất, các lượt đã embed trừ 2 lượt gần nhất - đã luôn có trong prompt)."""
+        recent = [self._decode(raw) for raw in raw_recent]
+        recent_pairs = {
+            (recent[i]["content"], recent[i + 1]["content"])
+            for i in range(len(recent) - 1)
+            if recent[i]["role"] == "user" and recent[i + 1]["role"] == "assistant"
+        }
+
+        turns = [msgpack.unpackb(raw, raw=False) for raw in raw_turns]
+        turns = [turn for turn in turns if (turn["user"], turn["assistant"]) not in recent_pairs]
+        return recent, turns
+
+    def _select_relevant(self, recent: List[Dict], turns: List[Dict], query_vector) -> List[Dict]:
+        """Top-k lượt có cosine với query cao nhất (giữ thứ tự thời gian) + 2 lượt gần nhất."""
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        matrix = np.stack([np.frombuffer(turn["vector"], dtype=np.float16) for turn in turns]).astype(np.float32)
+        scores = matrix @ query_vector
+
+        top = np.argsort(-scores)[: self.relevant_top_k]
+        selected = sorted(i for i in top if scores[i] >= self.relevant_min_score)
+
+        messages = []
+        for i in selected:
+            messages.append({"role": "user", "content": turns[i]["user"]})
+            messages.append({"role": "assistant", "content": turns[i]["assistant"]})
+        return messages + recent
+
+    def get_relevant_history(self, tenant_id, employee_id, query) -> List[Dict]:
+        """Các lượt cũ có cosine với query cao nhất (giữ thứ tự thời gian) + 2 lượt gần nhất."""
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            self._relevant_reads(pipe, tenant_id, employee_id)
+            raw_recent, raw_turns = pipe.execute()
+
+        recent, turns = self._relevant_candidates(raw_recent, raw_turns)
+        if not turns:
+            return recent
+        return self._select_relevant(recent, turns, self._get_embedder().get_dense_vector(query))
+
+    async def aget_relevant_history(self, tenant_id, employee_id, query) -> List[Dict]:
+        """Bản async của get_relevant_history (embed query trong thread, không chặn event loop)."""
+        async with self._get_async_client().pipeline(transaction=False) as pipe:
+            self._relevant_reads(pipe, tenant_id, employee_id)
+            raw_recent, raw_turns = await pipe.execute()
+
+        recent, turns = self._relevant_candidates(raw_recent, raw_turns)
+        if not turns:
+            return recent
+        query_vector = await asyncio.to_thread(self._get_embedder().get_dense_vector, query)
+        return self._select_relevant(recent, turns, query_vector)
+
+    def schedule_index_turn(self, tenant_id, employee_id, user_query, answer):
+        """Embed lượt hỏi-đáp vừa ghi ở background (mode relevant)."""
+        if self.mode != "relevant":
+            return
+        self._background.submit(self._run_index_turn, tenant_id, employee_id, user_query, answer)
+
+    def _run_index_turn(self, tenant_id, employee_id, user_query, answer):
+        try:
+            self.index_turn(tenant_id, employee_id, user_query, answer)
+        except Exception as e:
+            print(f"[MEMORY] Lỗi embed lượt chat {self._turns_key(tenant_id, employee_id)}: {e}")
+
+    def index_turn(self, tenant_id, employee_id, user_query, answer):
+        """Embed 1 lần (vector đã normalize, lưu float16) và lưu cùng nội dung lượt chat vào chat_turns."""
+        vector = self._get_embedder().get_dense_vector(f"user: {user_query}\nassistant: {answer}")
+        turn = msgpack.packb({
+            "user": user_query,
+            "assistant": answer,
+            "vector": np.asarray(vector, dtype=np.float16).tobytes(),
+        }, use_bin_type=True)
+
+        key = self._turns_key(tenant_id, employee_id)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, turn)
+            pipe.ltrim(key, -(self.max_message // 2), -1)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+
+    def schedule_fold(self, tenant_id, employee_id):
+        """Đưa việc gộp lịch sử cũ vào tóm tắt sang background worker (mode summary)."""
+        if self.mode != "summary":
+            return
+
+        key = self._generate_key(tenant_id, employee_id)
+        with self._fold_lock:
+            if key in self._fold_pending:
+                return
+            self._fold_pending.add(key)
+        self._background.submit(self._run_fold, tenant_id, employee_id, key)
+
+    def _run_fold(self, tenant_id, employee_id, key):
+        try:
+            self.fold_history(tenant_id, employee_id)
+        except Exception as e:
+            print(f"[MEMORY] Lỗi gộp lịch sử {key}: {e}")
+        finally:
+            with self._fold_lock:
+                self._fold_pending.discard(key)
+
+    def fold_history(self, tenant_id, employee_id) -> int:
+        """
+        Gộp các message cũ hơn `recent_messages` vào bản tóm tắt rồi xóa chúng khỏi list.
+        Ghi summary + LTRIM trong 1 transaction, chỉ khi đầu list chưa bị thay đổi trong lúc LLM tóm tắt.
+        Trả về số message đã gộp.
+        """
+        key = self._generate_key(tenant_id, employee_id)
+        summary_key = self._summary_key(tenant_id, employee_id)
+
+        raw_history = self.redis_client.lrange(key, 0, -1)
+        fold_count = len(raw_history) - self.recent_messages
+        if fold_count <= 0:
+            return 0
+
+        old_raw = raw_history[:fold_count]
+        new_summary = self.summarize(self.get_summary(tenant_id, employee_id), [self._decode(raw) for raw in old_raw])
+
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.lrange(key, 0, fold_count - 1) != old_raw:
+                    return 0
+                pipe.multi()
+                pipe.set(summary_key, new_summary.encode("utf-8"), ex=self.ttl)
+                pipe.ltrim(key, fold_count, -1)
+                pipe.execute()
+            except redis.WatchError:
+                # List bị ghi/trim đồng thời -> bỏ qua, lượt chat sau sẽ gộp lại
+                return 0
+
+        return fold_count
+
+    def summarize(self, summary: str, messages: List[Dict]) -> str:
+        """LLM cập nhật bản tóm tắt đang có với các message mới bị đẩy ra khỏi cửa sổ gần nhất."""
+        messages_str = ""
+        for msg in messages:
+            role = "user" if msg['role'] == 'user' else "assistant"
+            messages_str += f"{role}: {msg['content']}\n"
+
+        summary_prompt = f"""
+        ### VAI TRÒ
+        Bạn là công cụ tóm tắt hội thoại giữa nhân viên (user) và trợ lý tài liệu nội bộ (assistant).
+
+        ### NHIỆM VỤ
+        Cập nhật BẢN TÓM TẮT HIỆN TẠI bằng các TIN NHẮN MỚI. Giữ lại: chủ đề, tên riêng, tài liệu, quy định,
+        con số và các yêu cầu người dùng đã nêu. Bỏ lời chào hỏi và chi tiết định dạng markdown.
+        Chỉ trả về bản tóm tắt mới bằng tiếng Việt, không giải thích.
+
+        [BẢN TÓM TẮT HIỆN TẠI]: {summary or "(trống)"}
+        [TIN NHẮN MỚI]:
+        {messages_str}
+
+        BẢN TÓM TẮT MỚI:
+        """
+
+        response = ollama.chat(
+            model=NAME_LLM_MODEL,
+            messages=[{'role': 'user', 'content': summary_prompt}],
+            options={'temperature': 0, 'num_predict': settings.memory_summary_max_tokens}
+        )
+
+        return response['message']['content'].strip()
 
     def contextualize_query(self, user_query, chat_history):
         if not chat_history:
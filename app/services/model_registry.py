@@ -0,0 +1,60 @@
+import threading
+import time
+import psutil
+from typing import Any, Callable, Dict
+
+# Registry dùng chung toàn process: mỗi model chỉ load 1 lần, load khi cần (lazy)
+# và ghi lại thời gian load + bộ nhớ tăng thêm để theo dõi.
+class ModelRegistry:
+    def __init__(self):
+        self._instances: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        with self._registry_lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Trả về instance đã load của `key`, gọi `factory` đúng 1 lần nếu chưa có."""
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+
+        # Lock riêng từng model: 2 model khác nhau vẫn load song song được
+        with self._get_lock(key):
+            instance = self._instances.get(key)
+            if instance is not None:
+                return instance
+
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            start = time.perf_counter()
+
+            instance = factory()
+
+            self._stats[key] = {
+                "load_time_seconds": round(time.perf_counter() - start, 3),
+                "rss_delta_mb": round((process.memory_info().rss - rss_before) / 1024 / 1024, 1),
+            }
+            self._instances[key] = instance
+            print(f"[MODEL] Loaded '{key}' in {self._stats[key]['load_time_seconds']}s (+{self._stats[key]['rss_delta_mb']} MB RSS)")
+
+            return instance
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._instances
+
+    def stats(self) -> Dict[str, Any]:
+        """Thời gian load và RSS tăng thêm của từng model, kèm RSS hiện tại của process."""
+        return {
+            "process_rss_mb": round(psutil.Process().memory_info().rss / 1024 / 1024, 1),
+            "models": dict(self._stats),
+        }
+
+
+# Singleton instance
+model_registry = ModelRegistry()
@@ -19,6 +19,14 @@ class OCR_document:
         self.processor = LightOnOcrProcessor.from_pretrained(model_name)
 
     def processing_data(self, path_input):
+        for _ in self.iter_pages(path_input):
+            pass
+
+    def iter_pages(self, path_input):
+        """
+        Generator: OCR từng trang và yield markdown của trang ngay khi xong (streaming ingest).
+        Vẫn ghi nối tiếp vào file .md như processing_data.
+        """
         path_output = Path(PATH_OUTPUT_FILE) / (path_input.stem + ".md")
         Path(PATH_OUTPUT_FILE).mkdir(parents=True, exist_ok=True)
 
@@ -61,5 +69,7 @@ class OCR_document:
 
                 with open(path_output, "a", encoding="utf-8") as f:
                     f.write(output_text)
+
+                yield output_text
         finally:
             pdf.close()
\ No newline at end of file
@@ -1,32 +1,186 @@
-from typing import List, Dict, Optional
-from qdrant_client import QdrantClient, models
-from app.services.embedding_service import LocalDenseEmbedding, LocalSparseEmbedding
+from typing import Iterable, List, Dict, Optional, Tuple, Union
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from app.services.embedding_service import get_dense_embedder, get_sparse_embedder, MultiProcessEmbedding
+from app.services.embedding_cache import EmbeddingCache
+from app.services.index_manager import IndexLifecycleManager
+from app.core.config import settings
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import uuid 
 import hashlib 
+import json
 
-# Setup DB
-QDRANT_URL = "http://localhost:6333" 
+# Setup DB (server: settings.qdrant_url, local mode: settings.qdrant_local_path)
 COLLECTION_NAME = "enterprise_docs" 
 DENSE_VECTOR_NAME = "dense-vector"
 SPARSE_VECTOR_NAME = "sparse-vector" 
 DENSE_DIMENSION = 1024 
 
-# Embedding Model
-dense_embedder = LocalDenseEmbedding()
-sparse_embedder = LocalSparseEmbedding()
+# Payload tối thiểu cho các luồng không rerank (cascade, cache lookup, batch eval):
+# đủ để định danh / dedupe kết quả, content + metadata lấy sau bằng fetch_payloads cho top-k cuối
+SLIM_PAYLOAD_FIELDS = ["src_file", "parent_id", "content_hash", "doc_version"]
+# Luồng chat (rerank + prompt): thêm content; bỏ metadata, tenant_id, accessed_role... không dùng tới
+RERANK_PAYLOAD_FIELDS = [*SLIM_PAYLOAD_FIELDS, "content"]
+
+# Collection profiles (settings.qdrant_collection_profile)
+#   - "default": float32 dense vector on-disk, không quantization (layout cũ)
+#   - "scalar" : int8 scalar quantization giữ trong RAM, vector gốc on-disk để rescoring
+#   - "binary" : binary quantization giữ trong RAM, vector gốc on-disk để rescoring
+
+def build_quantization_config(profile: str):
+    """Quantization config cho dense vector theo profile (None = không quantize)."""
+    if profile == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.qdrant_quantization_always_ram,
+            )
+        )
+    if profile == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(
+                always_ram=settings.qdrant_quantization_always_ram,
+            )
+        )
+    return None
+
+def build_search_params(profile: str, indexed_only: bool = False):
+    """
+    Search params cho dense prefetch: lấy dư (oversampling) trên vector quantized rồi rescore bằng vector gốc.
+    indexed_only: chỉ search segment đã có index (dùng khi đang rebuild HNSW để tránh brute force).
+    """
+    if profile == "default" and not indexed_only:
+        return None
+
+    quantization = None
+    if profile != "default":
+        quantization = models.QuantizationSearchParams(
+            ignore=False,
+            rescore=settings.qdrant_search_rescore,
+            oversampling=settings.qdrant_search_oversampling,
+        )
+    return models.SearchParams(quantization=quantization, indexed_only=indexed_only)
+
+# Qdrant local mode: mỗi thư mục chỉ mở được bởi 1 client trong process, còn ":memory:"
+# thì mỗi client là 1 DB riêng -> các VectorStoreService (chat, upload) dùng chung client theo location
+_local_clients: Dict[str, QdrantClient] = {}
+_local_clients_lock = threading.Lock()
+
+def get_local_client(location: str) -> QdrantClient:
+    with _local_clients_lock:
+        if location not in _local_clients:
+            if location == ":memory:":
+                _local_clients[location] = QdrantClient(location=location)
+            else:
+                _local_clients[location] = QdrantClient(path=location)
+        return _local_clients[location]
+
+def fuse_candidates(result_lists: List[List], limit: Optional[int] = None, rrf_k: int = 60) -> List:
+    """
+    Gộp nhiều danh sách kết quả search (vd. câu hỏi gốc + câu hỏi đã viết lại) bằng RRF phía client,
+    dedupe theo point id, giữ point của lần xuất hiện đầu tiên.
+    """
+    scores, points = {}, {}
+    for results in result_lists:
+        for rank, point in enumerate(results):
+            point_id = str(point.id)
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            points.setdefault(point_id, point)
+
+    fused = [points[point_id] for point_id in sorted(scores, key=scores.get, reverse=True)]
+    return fused[:limit] if limit is not None else fused
 
 class VectorStoreService:
-    def __init__(self, shard_number: int = 2):
-        # Connect Qdrant
-        self.client = QdrantClient(url=QDRANT_URL) 
+    def __init__(self, shard_number: int = 2, prefer_grpc: Optional[bool] = None, local_path: Optional[str] = None):
+        # local_path (hoặc settings.qdrant_local_path): Qdrant embedded, cùng API hybrid search, không cần server
+        self.local_path = settings.qdrant_local_path if local_path is None else local_path
+        # Connect Qdrant (REST hoặc gRPC theo settings.qdrant_prefer_grpc)
+        self.prefer_grpc = settings.qdrant_prefer_grpc if prefer_grpc is None else prefer_grpc
+        self.search_timeout = settings.qdrant_search_timeout
+        # Local client chạy trong process, không dùng nhiều luồng upsert song song
+        self.upload_parallel = 1 if self.local_path else max(1, settings.qdrant_upload_parallel)
+        if self.local_path:
+            self.client = get_local_client(self.local_path)
+        else:
+            self.client = QdrantClient(**self._client_options())
+        # Async client tạo lazily và dùng lại cho mọi request (giữ kết nối / gRPC channel)
+        self._async_client = None
         self.collection_name = COLLECTION_NAME
+        # Small-to-big: parent sections lưu payload-only, lấy theo id sau khi rerank children
+        self.parent_collection_name = settings.qdrant_collection_parent
         self.dense_vector = DENSE_VECTOR_NAME
         self.sparse_vector = SPARSE_VECTOR_NAME
         self.vector_size = DENSE_DIMENSION
         self.shard_number = shard_number 
+        self.profile = settings.qdrant_collection_profile
+        # Multi-tenant: tenant_id là tenant index + HNSW graph riêng cho từng tenant (payload_m)
+        self.tenant_partitioning = settings.qdrant_tenant_partitioning
+
+        # Embedding Model (dùng chung qua model registry, load ở lần dùng đầu tiên)
+        self.dense_embedder = get_dense_embedder()
+        self.sparse_embedder = get_sparse_embedder()
+
+        # Process pool encode cho bulk ingestion (tạo lazily ở lần upload lớn đầu tiên)
+        self.num_workers = settings.embedding_num_workers
+        self._multi_process_embedder = None
+
+        # Garbage collect version cũ sau replace_document (1 luồng, lỗi lưu lại để theo dõi)
+        self._gc_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qdrant-gc")
+        self.gc_failures = deque(maxlen=100)
+
+        # Cache embedding theo nội dung chunk (bỏ qua encode khi upload lại tài liệu)
+        self.embedding_cache = EmbeddingCache(settings.embedding_cache_path) if settings.embedding_cache_enabled else None
         
         self._ensure_collection()
 
+        # Vòng đời HNSW khi ingest (bulk: tắt index trong lúc upload, rebuild 1 lần khi xong)
+        self.index_manager = IndexLifecycleManager(
+            self.client,
+            self.collection_name,
+            self._indexed_hnsw_config(),
+            mode=settings.qdrant_index_mode,
+            indexing_threshold=settings.qdrant_indexing_threshold,
+            wait_timeout=settings.qdrant_index_wait_timeout,
+        )
+
+    def _client_options(self) -> Dict:
+        return dict(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            prefer_grpc=self.prefer_grpc,
+            grpc_port=settings.qdrant_grpc_port,
+            timeout=settings.qdrant_timeout,
+        )
+
+    def _get_async_client(self) -> AsyncQdrantClient:
+        if self._async_client is None:
+            self._async_client = AsyncQdrantClient(**self._client_options())
+        return self._async_client
+
+    def close(self):
+        """Dừng process pool encode (worker process không tự thoát khi reload / kết thúc test), chờ GC đang chạy."""
+        self._gc_executor.shutdown(wait=True)
+        if self._multi_process_embedder is not None:
+            self._multi_process_embedder.close()
+            self._multi_process_embedder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
     def _ensure_collection(self):
         """Tạo collection hỗ trợ cả Dense và Sparse vector, tối ưu cho Upload."""
 
@@ -53,127 +207,830 @@ class VectorStoreService:
                         )
                     )
                 },
-                # Tạm tắt Indexing HNSW để tăng tốc độ upload
-                hnsw_config=models.HnswConfigDiff(m=0),
+                # Quantization theo profile (None với profile "default")
+                quantization_config=build_quantization_config(self.profile),
+                # Payload (content + metadata) chỉ đọc cho top-k cuối -> để trên disk
+                on_disk_payload=self.profile != "default",
+                # HNSW bật sẵn; bulk upload tạm dừng build index qua IndexLifecycleManager
+                hnsw_config=self._indexed_hnsw_config(),
                 # Phân mảnh 
                 shard_number=self.shard_number
             )
             
             # Create Payload Indexes for tenant_id, filename, role_user fields 
             try:
-                self.client.create_payload_index(self.collection_name, "tenant_id", models.PayloadSchemaType.KEYWORD)
+                self.client.create_payload_index(self.collection_name, "tenant_id", self._tenant_index_schema())
                 self.client.create_payload_index(self.collection_name, "src_file", models.PayloadSchemaType.KEYWORD)
                 self.client.create_payload_index(self.collection_name, "accessed_role", models.PayloadSchemaType.INTEGER)
             except Exception:
                 pass
+        else:
+            self._sync_quantization()
+
+        # Index cho versioned replace (tạo cả trên collection cũ; tạo lại index đã có không lỗi)
+        try:
+            self.client.create_payload_index(self.collection_name, "doc_version", models.PayloadSchemaType.INTEGER)
+            self.client.create_payload_index(self.collection_name, "is_active", models.PayloadSchemaType.BOOL)
+        except Exception:
+            pass
+
+        if not self.client.collection_exists(self.parent_collection_name):
+            print(f"Tạo mới collection '{self.parent_collection_name}' trong Qdrant...")
+            # Parent collection không có vector: chỉ retrieve theo id
+            self.client.create_collection(
+                collection_name=self.parent_collection_name,
+                vectors_config={},
+                on_disk_payload=True,
+                shard_number=self.shard_number
+            )
+
+            try:
+                self.client.create_payload_index(self.parent_collection_name, "tenant_id", models.PayloadSchemaType.KEYWORD)
+                self.client.create_payload_index(self.parent_collection_name, "src_file", models.PayloadSchemaType.KEYWORD)
+            except Exception:
+                pass
     
+    @staticmethod
+    def _quantization_profile(quantization_config) -> str:
+        if isinstance(quantization_config, models.ScalarQuantization):
+            return "scalar"
+        if isinstance(quantization_config, models.BinaryQuantization):
+            return "binary"
+        return "default"
+
+    def _sync_quantization(self):
+        """
+        Profile chỉ được áp dụng lúc tạo collection. Collection đã có với quantization khác cấu hình
+        -> cập nhật quantization_config tại chỗ (Qdrant build lại vector quantized ở background).
+        on_disk_payload không đổi được sau khi tạo, chỉ quantization được đồng bộ.
+        """
+        live_profile = self._quantization_profile(
+            self.client.get_collection(self.collection_name).config.quantization_config
+        )
+        if live_profile == self.profile:
+            return
+
+        print(
+            f"[QDRANT] Cảnh báo: collection '{self.collection_name}' đang dùng quantization '{live_profile}', "
+            f"cấu hình là '{self.profile}'. Đang cập nhật quantization_config..."
+        )
+        try:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=build_quantization_config(self.profile) or models.Disabled.DISABLED,
+            )
+        except Exception as e:
+            # Search params phải khớp quantization thực tế của collection
+            print(f"[QDRANT] Không thể cập nhật quantization: {e}. Tiếp tục với profile '{live_profile}'.")
+            self.profile = live_profile
+
+    def _tenant_index_schema(self):
+        if self.tenant_partitioning:
+            # is_tenant: Qdrant gom dữ liệu cùng tenant lại gần nhau trên storage
+            return models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True)
+        return models.PayloadSchemaType.KEYWORD
+
+    def _indexed_hnsw_config(self) -> models.HnswConfigDiff:
+        """Cấu hình HNSW khi bật indexing."""
+        if self.tenant_partitioning:
+            # m=0: không build graph toàn cục; payload_m: mỗi tenant 1 graph riêng -> filter theo tenant không phải duyệt graph trộn
+            return models.HnswConfigDiff(m=0, payload_m=16, ef_construct=100)
+        return models.HnswConfigDiff(m=16, ef_construct=100)
+
+    def enable_tenant_partitioning(self):
+        """Chuyển collection đã tồn tại sang layout multi-tenant (tạo lại tenant index, build graph theo tenant)."""
+        self.tenant_partitioning = True
+        self.index_manager.hnsw_config = self._indexed_hnsw_config()
+        self.client.create_payload_index(self.collection_name, "tenant_id", self._tenant_index_schema())
+        self.optimize_indexing()
+
     def optimize_indexing(self):
         """Bật lại Indexing sau khi upload xong để tìm kiếm nhanh hơn."""
 
         self.client.update_collection(
             collection_name=self.collection_name,
-            hnsw_config=models.HnswConfigDiff(m=16, ef_construct=100)
+            hnsw_config=self._indexed_hnsw_config()
         )
 
     # Generate deterministic ID
-    def generate_deterministic_id(self, tenant_id: str, src_file: str, chunk_idx: int) -> str:
-        unique_str = f"{tenant_id}_{src_file}_{chunk_idx}"
+    def generate_deterministic_id(self, tenant_id: str, src_file: str, chunk_key: str) -> str:
+        unique_str = f"{tenant_id}_{src_file}_{chunk_key}"
         hash_obj = hashlib.md5(unique_str.encode('utf-8'))
         return str(uuid.UUID(hash_obj.hexdigest()))
 
+    @staticmethod
+    def chunk_fingerprint(chunk: Dict) -> str:
+        """Hash nội dung chunk (content + role + metadata + parent): đổi bất kỳ phần nào -> chunk mới."""
+        data = json.dumps(
+            [chunk.get("content"), chunk.get("accessed_role"), chunk.get("metadata", {}), chunk.get("parent_id")],
+            ensure_ascii=False, sort_keys=True, default=str,
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def assign_point_ids(self, chunks: List[Dict], occurrences: Optional[Dict] = None):
+        """
+        Gán point_id theo nội dung cho các chunk chưa có id.
+        Chèn thêm đoạn văn không làm lệch id các chunk phía sau như id theo vị trí.
+        Chunk trùng nội dung trong cùng file được phân biệt bằng số thứ tự lần xuất hiện.
+        Chunk có doc_version (replace_document) nhận id riêng theo version để không ghi đè phiên bản đang active.
+        occurrences: bộ đếm dùng chung giữa nhiều lần gọi (stream_document gán id theo từng đợt chunk).
+        """
+        occurrences = {} if occurrences is None else occurrences
+        for chunk in chunks:
+            fingerprint = self.chunk_fingerprint(chunk)
+            key = (chunk.get("tenant_id"), str(chunk.get("src_file")), fingerprint)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+
+            chunk_key = f"{fingerprint}_{occurrence}"
+            if chunk.get("doc_version") is not None:
+                chunk_key = f"v{chunk['doc_version']}_{chunk_key}"
+
+            chunk.setdefault("content_hash", fingerprint)
+            chunk.setdefault("point_id", self.generate_deterministic_id(
+                chunk.get("tenant_id"), chunk.get("src_file"), chunk_key
+            ))
+
+    def _document_selector(self, tenant_id: str, src_file: str) -> models.FilterSelector:
+        return models.FilterSelector(filter=self._document_filter(tenant_id, src_file))
+
+    def _document_filter(self, tenant_id: str, src_file: str, must=(), must_not=()) -> models.Filter:
+        return models.Filter(
+            must=[
+                models.FieldCondition(key="tenant_id", match=models.MatchValue(value=tenant_id)),
+                models.FieldCondition(key="src_file", match=models.MatchValue(value=src_file)),
+                *must,
+            ],
+            must_not=list(must_not) or None,
+        )
+
+    def list_documents(self, tenant_id: str, limit: int = 1000) -> List[Dict]:
+        """Danh sách tài liệu đang active của tenant kèm số chunk (facet trên payload index src_file)."""
+        response = self.client.facet(
+            collection_name=self.collection_name,
+            key="src_file",
+            facet_filter=models.Filter(
+                must=[models.FieldCondition(key="tenant_id", match=models.MatchValue(value=tenant_id))],
+                must_not=[self._inactive_condition()],
+            ),
+            limit=limit,
+            exact=True,
+        )
+        return [{"src_file": hit.value, "chunks": hit.count} for hit in response.hits]
+
+    def _delete_document_requests(self, tenant_id: str, src_file: str) -> List[Dict]:
+        """Tham số delete (chunks + parent sections) dùng chung cho bản sync và async."""
+        return [
+            dict(collection_name=collection_name, points_selector=self._document_selector(tenant_id, src_file))
+            for collection_name in (self.collection_name, self.parent_collection_name)
+        ]
+
     # Delete document by tenant_id and filename
     def delete_document(self, tenant_id: str, src_file: str):
         """Xóa toàn bộ chunks của một file cụ thể dựa trên tenant_id và src_file."""
+        for request in self._delete_document_requests(tenant_id, src_file):
+            self.client.delete(**request)
 
-        self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=models.FilterSelector(
-                filter=models.Filter(
-                    must=[
-                        models.FieldCondition(key="tenant_id", match=models.MatchValue(value=tenant_id)),
-                        models.FieldCondition(key="src_file", match=models.MatchValue(value=src_file)),
-                    ]
+    async def adelete_document(self, tenant_id: str, src_file: str):
+        """Bản async của delete_document (route DELETE /documents)."""
+        if self.local_path:
+            # Local mode không có async client dùng chung storage -> chạy bản sync trong thread
+            return await asyncio.to_thread(self.delete_document, tenant_id, src_file)
+
+        for request in self._delete_document_requests(tenant_id, src_file):
+            await self._get_async_client().delete(**request)
+
+    # Small-to-big: lưu parent sections (payload-only)
+    def add_parents(self, parents: List[Dict], batch_size: int = 256):
+        """Upsert parent sections vào parent collection, id = parent_id do ChunkingService sinh."""
+        for i in range(0, len(parents), batch_size):
+            batch_parents = parents[i : i + batch_size]
+            self.client.upsert(
+                collection_name=self.parent_collection_name,
+                points=models.Batch.model_construct(
+                    ids=[parent["parent_id"] for parent in batch_parents],
+                    vectors={},
+                    payloads=[
+                        {
+                            "tenant_id": parent.get("tenant_id"),
+                            "src_file": parent.get("src_file"),
+                            "accessed_role": parent.get("accessed_role"),
+                            "content": parent.get("content"),
+                            "metadata": parent.get("metadata", {})
+                        }
+                        for parent in batch_parents
+                    ],
+                )
+            )
+
+    def _scroll_document_ids(self, collection_name: str, tenant_id: str, src_file: str) -> set:
+        """Id của tất cả points thuộc (tenant_id, src_file), không lấy payload/vector."""
+        point_ids, offset = set(), None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=self._document_selector(tenant_id, src_file).filter,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            point_ids.update(str(record.id) for record in records)
+            if offset is None:
+                return point_ids
+
+    def sync_document(self, tenant_id: str, src_file: str, chunks: List[Dict], parents: Optional[List[Dict]] = None):
+        """
+        Cập nhật tài liệu đã có: so sánh id theo nội dung với các points đang lưu của (tenant_id, src_file),
+        chỉ embed + upsert chunk mới/thay đổi và xóa chunk không còn trong 1 lần delete.
+        Upsert trước, xóa sau để search không có khoảng trống giữa 2 phiên bản.
+        """
+        self.assign_point_ids(chunks)
+        existing_ids = self._scroll_document_ids(self.collection_name, tenant_id, src_file)
+        new_ids = {chunk["point_id"] for chunk in chunks}
+
+        changed_chunks = [chunk for chunk in chunks if chunk["point_id"] not in existing_ids]
+        stale_ids = list(existing_ids - new_ids)
+
+        if parents is not None:
+            existing_parent_ids = self._scroll_document_ids(self.parent_collection_name, tenant_id, src_file)
+            self.add_parents([parent for parent in parents if parent["parent_id"] not in existing_parent_ids])
+
+        stats = self.add_chunks(changed_chunks)
+
+        if stale_ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=stale_ids)
+            )
+        if parents is not None:
+            stale_parent_ids = list(existing_parent_ids - {parent["parent_id"] for parent in parents})
+            if stale_parent_ids:
+                self.client.delete(
+                    collection_name=self.parent_collection_name,
+                    points_selector=models.PointIdsList(points=stale_parent_ids)
                 )
+
+        stats.update({
+            "total_chunks": len(chunks),
+            "upserted": len(changed_chunks),
+            "deleted": len(stale_ids),
+            "unchanged": len(chunks) - len(changed_chunks),
+        })
+        print(f"Đồng bộ '{src_file}': +{stats['upserted']} / -{stats['deleted']} / ={stats['unchanged']} chunks")
+        return stats
+
+    def stream_document(self, tenant_id: str, src_file: str, batches: Iterable[Tuple[Optional[List[Dict]], List[Dict]]],
+                        started_at: Optional[float] = None):
+        """
+        sync_document theo từng đợt cho streaming ingest: mỗi đợt (parents, chunks) được embed + upsert ngay
+        khi tới nên search thấy các section đầu trong lúc phần sau của tài liệu còn đang OCR / chunk.
+        Chunk đã có (id theo nội dung) được bỏ qua; chunk cũ không còn xuất hiện chỉ bị xóa khi hết stream.
+        started_at (time.perf_counter()): mốc để tính thời gian tới khi đợt đầu tiên search được.
+        """
+        started_at = time.perf_counter() if started_at is None else started_at
+        existing_ids = self._scroll_document_ids(self.collection_name, tenant_id, src_file)
+        existing_parent_ids = None
+        seen_ids, seen_parent_ids, occurrences = set(), set(), {}
+        total = upserted = cache_hits = 0
+        first_searchable = None
+
+        for parents, chunks in batches:
+            self.assign_point_ids(chunks, occurrences)
+            if parents is not None:
+                if existing_parent_ids is None:
+                    existing_parent_ids = self._scroll_document_ids(self.parent_collection_name, tenant_id, src_file)
+                seen_parent_ids.update(parent["parent_id"] for parent in parents)
+                self.add_parents([parent for parent in parents if parent["parent_id"] not in existing_parent_ids])
+
+            changed_chunks = [chunk for chunk in chunks if chunk["point_id"] not in existing_ids]
+            seen_ids.update(chunk["point_id"] for chunk in chunks)
+            total += len(chunks)
+            if changed_chunks:
+                cache_hits += self.add_chunks(changed_chunks)["cache_hits"]
+                upserted += len(changed_chunks)
+            if first_searchable is None and chunks:
+                first_searchable = time.perf_counter() - started_at
+
+        stale_ids = list(existing_ids - seen_ids)
+        if stale_ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=stale_ids)
             )
+        if existing_parent_ids:
+            stale_parent_ids = list(existing_parent_ids - seen_parent_ids)
+            if stale_parent_ids:
+                self.client.delete(
+                    collection_name=self.parent_collection_name,
+                    points_selector=models.PointIdsList(points=stale_parent_ids)
+                )
+
+        stats = {
+            "total_chunks": total,
+            "upserted": upserted,
+            "deleted": len(stale_ids),
+            "unchanged": total - upserted,
+            "cache_hits": cache_hits,
+            "cache_hit_ratio": round(cache_hits / upserted, 4) if upserted else 0.0,
+            "first_searchable_seconds": round(first_searchable, 3) if first_searchable is not None else None,
+        }
+        print(f"Stream '{src_file}': +{upserted} / -{len(stale_ids)} / ={total - upserted} chunks, đợt đầu search được sau {stats['first_searchable_seconds']}s")
+        return stats
+
+    @staticmethod
+    def _inactive_condition() -> models.FieldCondition:
+        # Point không có is_active (ghi qua sync_document) được coi là active
+        return models.FieldCondition(key="is_active", match=models.MatchValue(value=False))
+
+    @staticmethod
+    def _older_version_condition(version: int) -> models.FieldCondition:
+        # Dùng trong must_not: khớp version >= version hiện tại; point cũ không có doc_version luôn lọt qua
+        return models.FieldCondition(key="doc_version", range=models.Range(gte=version))
+
+    def replace_document(self, tenant_id: str, src_file: str, chunks: List[Dict], parents: Optional[List[Dict]] = None):
+        """
+        Thay toàn bộ tài liệu bằng phiên bản mới, không có khoảng trống khi search:
+        1. Ghi chunks mới dưới doc_version mới với is_active=False (search chưa thấy)
+        2. Đổi phiên bản active trong 1 request batch_update_points: bật version mới rồi mới tắt version cũ.
+           2 thao tác KHÔNG atomic: mỗi shard áp dụng lần lượt, search chen giữa có thể thấy cả 2 version
+           (không bao giờ thấy 0 version) -> search_hybrid giữ version mới nhất theo src_file (_latest_versions)
+        3. Xóa các version cũ ở thread GC (wait=True, thử lại khi lỗi); lỗi cuối cùng được log và lưu vào
+           gc_failures. Point cũ còn sót luôn bị ẩn và bị xóa lại ở lần replace kế tiếp (cùng filter version cũ)
+        Chunk không đổi nội dung lấy lại embedding từ cache, không phải encode lại.
+        """
+        version = time.time_ns() // 1_000_000
+        for chunk in chunks:
+            chunk["doc_version"] = version
+            chunk["is_active"] = False
+
+        old_filter = self._document_filter(tenant_id, src_file, must_not=[self._older_version_condition(version)])
+        old_count = self.client.count(collection_name=self.collection_name, count_filter=old_filter, exact=True).count
+
+        if parents is not None:
+            existing_parent_ids = self._scroll_document_ids(self.parent_collection_name, tenant_id, src_file)
+            self.add_parents([parent for parent in parents if parent["parent_id"] not in existing_parent_ids])
+
+        stats = self.add_chunks(chunks)
+
+        # Bật version mới trước rồi mới tắt version cũ: không có lúc tài liệu biến mất (có thể thấy cả 2 trong chốc lát)
+        self.client.batch_update_points(
+            collection_name=self.collection_name,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(
+                    payload={"is_active": True},
+                    filter=self._document_filter(tenant_id, src_file, must=[
+                        models.FieldCondition(key="doc_version", match=models.MatchValue(value=version)),
+                    ]),
+                )),
+                models.SetPayloadOperation(set_payload=models.SetPayload(
+                    payload={"is_active": False},
+                    filter=old_filter,
+                )),
+            ],
+            wait=True,
         )
 
-    # Add chunks to Qdrant
-    def add_chunks(self, chunks: List[Dict], batch_size: int = 128):
+        # Garbage collect ở thread riêng: không chặn request nhưng lỗi không bị nuốt
+        gc_requests = [dict(collection_name=self.collection_name, points_selector=models.FilterSelector(filter=old_filter))]
+        if parents is not None:
+            stale_parent_ids = list(existing_parent_ids - {parent["parent_id"] for parent in parents})
+            if stale_parent_ids:
+                gc_requests.append(dict(
+                    collection_name=self.parent_collection_name,
+                    points_selector=models.PointIdsList(points=stale_parent_ids),
+                ))
+        self._gc_executor.submit(self._collect_garbage, tenant_id, src_file, gc_requests)
+
+        stats.update({
+            "total_chunks": len(chunks),
+            "upserted": len(chunks),
+            "deleted": old_count,
+            "doc_version": version,
+        })
+        print(f"Thay thế '{src_file}' -> version {version}: +{len(chunks)} chunks, {old_count} chunks cũ chờ xóa")
+        return stats
+
+    def _collect_garbage(self, tenant_id: str, src_file: str, requests: List[Dict], attempts: int = 3):
+        """Xóa version cũ (wait=True), thử lại khi lỗi; lỗi cuối cùng được log + lưu vào gc_failures."""
+        for request in requests:
+            for attempt in range(1, attempts + 1):
+                try:
+                    self.client.delete(**request, wait=True)
+                    break
+                except Exception as e:
+                    if attempt < attempts:
+                        time.sleep(attempt)
+                        continue
+                    print(f"[QDRANT] GC '{src_file}' ({request['collection_name']}) thất bại sau {attempts} lần: {e}. "
+                          f"Point cũ vẫn bị ẩn, sẽ được xóa lại ở lần replace kế tiếp.")
+                    self.gc_failures.append({
+                        "tenant_id": tenant_id,
+                        "src_file": src_file,
+                        "collection": request["collection_name"],
+                        "error": str(e),
+                        "time": time.time(),
+                    })
+
+    @staticmethod
+    def _latest_versions(points: List) -> List:
         """
-        Upload chunks theo từng batch nhỏ.
+        Bỏ các point thuộc doc_version cũ hơn version mới nhất của cùng src_file trong kết quả
+        (search chen giữa 2 bước đổi version active của replace_document). Point không có doc_version giữ nguyên.
         """
-        if not chunks:
-            return
+        latest = {}
+        for point in points:
+            payload = point.payload or {}
+            if payload.get("doc_version") is not None:
+                src_file = payload.get("src_file")
+                latest[src_file] = max(latest.get(src_file, payload["doc_version"]), payload["doc_version"])
+
+        return [
+            point for point in points
+            if (point.payload or {}).get("doc_version") is None
+            or point.payload["doc_version"] == latest[point.payload.get("src_file")]
+        ]
+
+    def fetch_payloads(self, points: List, payload_fields: Optional[List[str]] = None) -> List:
+        """
+        Lấy payload đầy đủ (hoặc payload_fields) cho các point đã search với payload rút gọn.
+        1 lần retrieve theo id cho top-k cuối; giữ nguyên thứ tự và score của points.
+        """
+        if not points:
+            return points
+
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=[point.id for point in points],
+            with_payload=self._payload_selector(payload_fields),
+            with_vectors=False,
+        )
+        payloads_by_id = {str(record.id): record.payload for record in records}
 
+        for point in points:
+            # Point đã bị xóa giữa 2 lần gọi (vd. garbage collect) -> giữ payload rút gọn
+            point.payload = {**(point.payload or {}), **payloads_by_id.get(str(point.id), {})}
+        return points
+
+    def fetch_parents(self, points: List) -> List:
+        """
+        Thay các child đã rerank bằng parent section tương ứng (giữ thứ tự, dedupe theo parent_id).
+        Tất cả parents được lấy bằng 1 lần retrieve theo id. Point không có parent_id giữ nguyên.
+        """
+        parent_ids = []
+        for point in points:
+            parent_id = point.payload.get("parent_id")
+            if parent_id and parent_id not in parent_ids:
+                parent_ids.append(parent_id)
+
+        if not parent_ids:
+            return points
+
+        records = self.client.retrieve(
+            collection_name=self.parent_collection_name,
+            ids=parent_ids,
+            # Prompt chỉ cần content + nguồn
+            with_payload=self._payload_selector(["content"]),
+            with_vectors=False,
+        )
+        parents_by_id = {str(record.id): record for record in records}
+
+        results, seen = [], set()
+        for point in points:
+            parent_id = point.payload.get("parent_id")
+            if not parent_id:
+                results.append(point)
+                continue
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            # Parent bị thiếu (vd. đang re-ingest) -> dùng tạm child
+            results.append(parents_by_id.get(parent_id, point))
+
+        return results
+
+    def _get_multi_process_embedder(self):
+        if self._multi_process_embedder is None:
+            self._multi_process_embedder = MultiProcessEmbedding(
+                num_workers=self.num_workers,
+                threads_per_worker=settings.embedding_worker_threads,
+            )
+        return self._multi_process_embedder
+
+    def _encode(self, texts: List[str], use_multi_process: bool):
+        if use_multi_process:
+            # Dense + Sparse encode song song trên process pool
+            return self._get_multi_process_embedder().embed(texts)
+        return self.dense_embedder.embed(texts), self.sparse_embedder.embed(texts)
+
+    def _embed_texts(self, texts: List[str], use_multi_process: bool, cache_stats: Dict, precomputed_dense: Optional[List] = None):
+        """
+        Dense (np.ndarray float32 (N, dim)) + Sparse vectors cho texts.
+        Chỉ các text chưa có trong embedding cache mới được encode.
+        precomputed_dense: dense vector có sẵn theo từng text (vd. pooled từ semantic splitter), None = phải encode.
+        Vector có sẵn không được ghi vào embedding cache (không phải embedding gốc của text).
+        """
+        has_precomputed = precomputed_dense is not None and any(v is not None for v in precomputed_dense)
+        if self.embedding_cache is None and not has_precomputed:
+            return self._encode(texts, use_multi_process)
+
+        dense_key = self.dense_embedder.get_cache_key()
+        sparse_key = self.sparse_embedder.get_cache_key()
+        if self.embedding_cache is not None:
+            cached_dense = self.embedding_cache.get_dense(dense_key, texts)
+            sparse_vectors = self.embedding_cache.get_sparse(sparse_key, texts)
+            cache_stats["hits"] += sum(1 for d, s in zip(cached_dense, sparse_vectors) if d is not None and s is not None)
+        else:
+            cached_dense, sparse_vectors = [None] * len(texts), [None] * len(texts)
+
+        if has_precomputed:
+            cached_dense = [d if p is None else p for d, p in zip(cached_dense, precomputed_dense)]
+
+        # Ma trận dense của cả batch: điền hàng cached trước, hàng miss sau khi encode
+        dense_vectors = np.empty((len(texts), self.vector_size), dtype=np.float32)
+        for j, d in enumerate(cached_dense):
+            if d is not None:
+                dense_vectors[j] = d
+
+        if use_multi_process:
+            # Pool luôn trả về cả 2 loại vector -> encode các text thiếu 1 trong 2
+            miss = [j for j in range(len(texts)) if cached_dense[j] is None or sparse_vectors[j] is None]
+            if miss:
+                miss_texts = [texts[j] for j in miss]
+                new_dense, new_sparse = self._encode(miss_texts, use_multi_process)
+                dense_vectors[miss] = new_dense
+                for j, s in zip(miss, new_sparse):
+                    sparse_vectors[j] = s
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put_dense(dense_key, miss_texts, new_dense)
+                    self.embedding_cache.put_sparse(sparse_key, miss_texts, new_sparse)
+            return dense_vectors, sparse_vectors
+
+        dense_miss = [j for j, v in enumerate(cached_dense) if v is None]
+        if dense_miss:
+            miss_texts = [texts[j] for j in dense_miss]
+            new_dense = self.dense_embedder.embed(miss_texts)
+            dense_vectors[dense_miss] = new_dense
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_dense(dense_key, miss_texts, new_dense)
+
+        sparse_miss = [j for j, v in enumerate(sparse_vectors) if v is None]
+        if sparse_miss:
+            miss_texts = [texts[j] for j in sparse_miss]
+            new_sparse = self.sparse_embedder.embed(miss_texts)
+            for j, s in zip(sparse_miss, new_sparse):
+                sparse_vectors[j] = s
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_sparse(sparse_key, miss_texts, new_sparse)
+
+        return dense_vectors, sparse_vectors
+
+    def _build_batch(self, ids: List, dense_vectors: np.ndarray, sparse_vectors: List[Dict], payloads: List[Dict]) -> models.Batch:
+        """
+        Đóng gói vectors theo cột cho upsert.
+        Dùng model_construct để bỏ qua validate pydantic từng float (không tạo N PointStruct).
+        Ma trận dense VẪN được copy sang list float Python tại đây: serializer REST (pydantic JSON) và
+        converter gRPC của qdrant-client không nhận np.ndarray (upload_collection cũng gọi .tolist() bên trong).
+        Phần tiết kiệm được là validate + object PointStruct, không phải bản copy float này.
+        """
+        return models.Batch.model_construct(
+            ids=ids,
+            vectors={
+                self.dense_vector: dense_vectors.tolist(),
+                self.sparse_vector: [
+                    models.SparseVector.model_construct(indices=v["indices"], values=v["values"])
+                    for v in sparse_vectors
+                ],
+            },
+            payloads=payloads,
+        )
+
+    def _iter_point_batches(self, chunks: List[Dict], batch_size: int, cache_stats: Dict):
+        """
+        Generator: encode + đóng gói từng batch chunks thành models.Batch sẵn sàng upsert.
+        Với upload lớn (>= embedding_multiprocess_min_chunks) và embedding_num_workers > 1,
+        mỗi batch được encode song song trên nhiều process.
+        """
         total_chunks = len(chunks)
-        
+        self.assign_point_ids(chunks)
+        use_multi_process = self.num_workers > 1 and total_chunks >= settings.embedding_multiprocess_min_chunks
+        if use_multi_process:
+            # Batch lớn hơn để mỗi worker có đủ việc
+            batch_size = max(batch_size, 32 * self.num_workers)
+
         # BATCHING
         for i in range(0, total_chunks, batch_size):
             batch_chunks = chunks[i : i + batch_size]
+
+            # 1. Lấy text
+            texts = [chunk['content'] for chunk in batch_chunks]
             
-            try:
-                # 1. Lấy text
-                texts = [chunk['content'] for chunk in batch_chunks]
-                
-                # 2. Tạo Dense Vectors
-                dense_vectors = dense_embedder.embed(texts)
+            # 2 + 3. Tạo Dense + Sparse Vectors (cache miss mới phải encode)
+            # Dense vector đã pooled sẵn ở bước chunking (chunking_pool_vectors) thì không encode lại
+            precomputed_dense = [chunk.get("dense_vector") for chunk in batch_chunks]
+            dense_vectors, sparse_vectors = self._embed_texts(texts, use_multi_process, cache_stats, precomputed_dense)
+            
+            ids, payloads = [], []
+            for j, chunk in enumerate(batch_chunks):
 
-                # 3. Tạo Sparse Vectors
-                sparse_vectors = sparse_embedder.embed(texts)
-                
-                points = []
-                for j, chunk in enumerate(batch_chunks):
-
-                    payload = {
-                        "tenant_id": chunk.get("tenant_id"),      
-                        "src_file": chunk.get("src_file"),
-                        "accessed_role": chunk.get("accessed_role"),              
-                        "content": chunk.get("content"),          
-                        "metadata": chunk.get("metadata", {})
-                    }
-
-                    # Tạo ID cố định
-                    global_idx = i + j
-                    point_id = self.generate_deterministic_id(
-                        payload["tenant_id"], 
-                        payload["src_file"], 
-                        global_idx
-                    )
+                payload = {
+                    "tenant_id": chunk.get("tenant_id"),      
+                    "src_file": chunk.get("src_file"),
+                    "accessed_role": chunk.get("accessed_role"),              
+                    "content": chunk.get("content"),          
+                    "metadata": chunk.get("metadata", {})
+                }
+                if chunk.get("parent_id"):
+                    payload["parent_id"] = chunk["parent_id"]
+                payload["content_hash"] = chunk["content_hash"]
+                if chunk.get("doc_version") is not None:
+                    payload["doc_version"] = chunk["doc_version"]
+                    payload["is_active"] = chunk.get("is_active", True)
+
+                # ID cố định theo nội dung (assign_point_ids)
+                ids.append(chunk["point_id"])
+                payloads.append(payload)
 
-                    # Tạo Point
-                    points.append(models.PointStruct(
-                        id=point_id,
-                        vector={
-                            self.dense_vector: dense_vectors[j],
-                            self.sparse_vector: sparse_vectors[j]
-                        },
-                        payload=payload
-                    ))
-
-                # Upsert Batch
-                self.client.upsert(
-                    collection_name=self.collection_name,
-                    points=points
+            # Batch dạng cột (1 Batch thay vì N PointStruct)
+            yield self._build_batch(ids, dense_vectors, sparse_vectors, payloads)
+
+    def _ingest_stats(self, total_chunks: int, cache_stats: Dict, timings: Optional[Dict] = None) -> Dict:
+        stats = {
+            "total_chunks": total_chunks,
+            "cache_hits": cache_stats["hits"],
+            "cache_hit_ratio": round(cache_stats["hits"] / total_chunks, 4) if total_chunks else 0.0,
+        }
+        if timings and timings["wall"] > 0:
+            # Utilization = thời gian bận / thời gian thực; upsert chia thêm cho số luồng song song
+            stats.update({
+                "wall_seconds": round(timings["wall"], 3),
+                "encode_seconds": round(timings["encode"], 3),
+                "upsert_seconds": round(timings["upsert"], 3),
+                "encode_utilization": round(timings["encode"] / timings["wall"], 4),
+                "upsert_utilization": round(timings["upsert"] / (timings["wall"] * self.upload_parallel), 4),
+            })
+        if total_chunks:
+            print(f"Quá trình upload hoàn tất. Embedding cache hit: {stats['cache_hits']}/{total_chunks} ({stats['cache_hit_ratio']:.1%})")
+            if "wall_seconds" in stats:
+                print(
+                    f"Pipeline {stats['wall_seconds']}s | encode bận {stats['encode_utilization']:.1%}"
+                    f" | upsert bận {stats['upsert_utilization']:.1%} ({self.upload_parallel} luồng)"
                 )
-                
-            except Exception as e:
-                raise e
-        
-        print("Quá trình upload hoàn tất.")
+        return stats
 
-    def search_hybrid(self, query: str, tenant_id: str, accessed_role: int, k: int = 10, top_k: Optional[int] = None):
-        if top_k is not None:
-            k = top_k
-        
-        # Tạo Vector cho câu Query
-        dense_vector = dense_embedder.get_dense_vector(query)
-        
-        sparse_vector = sparse_embedder.get_sparse_vector(query)
+    def _write_barrier_request(self) -> Dict:
+        """
+        Barrier cho các upsert wait=False trước đó: 1 lệnh set_payload theo filter (không khớp point nào)
+        được gửi tới mọi shard; Qdrant áp dụng update theo thứ tự trên từng shard nên wait=True ở đây
+        chỉ trả về khi mọi update trước đó trên mọi shard đã được áp dụng.
+        """
+        never = models.FieldCondition(key="__write_barrier__", match=models.MatchValue(value=True))
+        return dict(
+            collection_name=self.collection_name,
+            payload={"__write_barrier__": True},
+            points=models.Filter(must=[never], must_not=[never]),
+            wait=True,
+        )
 
-        # Cấu hình Prefetch 
-        prefetch_limit = k * 2 # Lấy dư ra để Fusion tốt hơn
+    def _upserted_count_request(self, point_ids: List[str]) -> Dict:
+        """Đếm chính xác các id vừa ghi (sau barrier)."""
+        return dict(
+            collection_name=self.collection_name,
+            count_filter=models.Filter(must=[models.HasIdCondition(has_id=list(set(point_ids)))]),
+            exact=True,
+        )
+
+    def _check_upserted(self, stored: int, point_ids: List[str]):
+        expected = len(set(point_ids))
+        if stored != expected:
+            raise RuntimeError(f"Upsert chưa hoàn tất: {stored}/{expected} points có trong '{self.collection_name}'")
+
+    def _write_barrier(self):
+        self.client.set_payload(**self._write_barrier_request())
+
+    def _verify_upserted(self, point_ids: List[str]):
+        """Sau barrier: đếm chính xác các id vừa ghi; thiếu point (upsert wait=False lỗi khi áp dụng) -> raise."""
+        self._write_barrier()
+        self._check_upserted(self.client.count(**self._upserted_count_request(point_ids)).count, point_ids)
 
-        filter_condition = models.Filter(
+    async def _averify_upserted(self, point_ids: List[str]):
+        """Bản async của _verify_upserted."""
+        client = self._get_async_client()
+        await client.set_payload(**self._write_barrier_request())
+        self._check_upserted((await client.count(**self._upserted_count_request(point_ids))).count, point_ids)
+
+    # Add chunks to Qdrant
+    def add_chunks(self, chunks: List[Dict], batch_size: int = 128):
+        """
+        Upload chunks theo pipeline: encode batch i+1 chạy chồng lên upsert batch i.
+        - Tối đa `upload_parallel` upsert chạy song song (wait=False), encode bị chặn khi đủ số luồng (backpressure)
+        - Kết quả mọi request upsert đều được kiểm tra (request lỗi -> raise)
+        - Cuối cùng: barrier wait=True gửi tới mọi shard + đếm lại đúng các id vừa ghi (_verify_upserted)
+        Chunk đã có trong embedding cache không bị encode lại; trả về thống kê cache hit và utilization từng stage.
+        """
+        cache_stats = {"hits": 0}
+        timings = {"encode": 0.0, "upsert": 0.0, "wall": 0.0}
+        timings_lock = threading.Lock()
+        wall_start = time.perf_counter()
+
+        def upsert(batch: models.Batch, wait: bool):
+            start = time.perf_counter()
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=batch,
+                wait=wait
+            )
+            with timings_lock:
+                timings["upsert"] += time.perf_counter() - start
+
+        batches = self._iter_point_batches(chunks, batch_size, cache_stats)
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.upload_parallel, thread_name_prefix="qdrant-upsert") as executor:
+            while True:
+                start = time.perf_counter()
+                batch = next(batches, None)
+                timings["encode"] += time.perf_counter() - start
+                if batch is None:
+                    break
+
+                if len(in_flight) >= self.upload_parallel:
+                    in_flight.popleft().result()
+                in_flight.append(executor.submit(upsert, batch, False))
+
+            # result() của từng future: request upsert bị lỗi không được bỏ qua
+            for future in in_flight:
+                future.result()
+
+        if chunks:
+            start = time.perf_counter()
+            self._verify_upserted([chunk["point_id"] for chunk in chunks])
+            timings["upsert"] += time.perf_counter() - start
+
+        timings["wall"] = time.perf_counter() - wall_start
+        return self._ingest_stats(len(chunks), cache_stats, timings)
+
+    async def aadd_chunks(self, chunks: List[Dict], batch_size: int = 128):
+        """
+        Bản async của add_chunks qua AsyncQdrantClient (gRPC nếu qdrant_prefer_grpc), cùng các bước:
+        batch từ _iter_point_batches (encode chạy trong thread, không chặn event loop), tối đa `upload_parallel`
+        upsert wait=False đồng thời, kiểm tra kết quả mọi request, cuối cùng barrier + đếm lại (_averify_upserted).
+        """
+        if self.local_path:
+            # Local mode không có async client dùng chung storage -> chạy bản sync trong thread
+            return await asyncio.to_thread(self.add_chunks, chunks, batch_size)
+
+        client = self._get_async_client()
+        cache_stats = {"hits": 0}
+        timings = {"encode": 0.0, "upsert": 0.0, "wall": 0.0}
+        wall_start = time.perf_counter()
+
+        async def upsert(batch: models.Batch):
+            start = time.perf_counter()
+            await client.upsert(
+                collection_name=self.collection_name,
+                points=batch,
+                wait=False
+            )
+            timings["upsert"] += time.perf_counter() - start
+
+        batches = self._iter_point_batches(chunks, batch_size, cache_stats)
+        in_flight = deque()
+        try:
+            while True:
+                start = time.perf_counter()
+                batch = await asyncio.to_thread(next, batches, None)
+                timings["encode"] += time.perf_counter() - start
+                if batch is None:
+                    break
+
+                if len(in_flight) >= self.upload_parallel:
+                    await in_flight.popleft()
+                in_flight.append(asyncio.create_task(upsert(batch)))
+
+            # Chờ từng task: request upsert bị lỗi không được bỏ qua
+            while in_flight:
+                await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        if chunks:
+            start = time.perf_counter()
+            await self._averify_upserted([chunk["point_id"] for chunk in chunks])
+            timings["upsert"] += time.perf_counter() - start
+
+        timings["wall"] = time.perf_counter() - wall_start
+        return self._ingest_stats(len(chunks), cache_stats, timings)
+
+    def _access_filter(self, tenant_id: str, accessed_role: Union[int, List[int]]) -> models.Filter:
+        """Filter theo tenant + role. User có nhiều role -> MatchAny (chunk khớp bất kỳ role nào)."""
+        if isinstance(accessed_role, (list, tuple, set)):
+            role_match = models.MatchAny(any=list(accessed_role))
+        else:
+            role_match = models.MatchValue(value=accessed_role)
+
+        return models.Filter(
             must=[
                 models.FieldCondition(
                     key="tenant_id", 
@@ -181,32 +1038,116 @@ class VectorStoreService:
                 ),
                 models.FieldCondition(
                     key="accessed_role", 
-                    match=models.MatchValue(value=accessed_role)
+                    match=role_match
                 )
-            ]
+            ],
+            # Bỏ qua version đang staged / chờ garbage collect
+            must_not=[self._inactive_condition()]
         )
 
+    @staticmethod
+    def _payload_selector(payload_fields: Optional[List[str]]):
+        """None -> toàn bộ payload; list -> chỉ các field được chọn (payload selector) + field cần để lọc version."""
+        if payload_fields is None:
+            return True
+        return models.PayloadSelectorInclude(include=list(dict.fromkeys([*payload_fields, "src_file", "doc_version"])))
+
+    def _use_indexed_only(self, tenant_id: str) -> bool:
+        # Đang rebuild HNSW sau bulk upload -> chỉ search segment đã index,
+        # trừ tenant vừa upload (tài liệu mới / phiên bản vừa replace chưa có index sẽ bị ẩn)
+        return self.index_manager.is_rebuilding() and not self.index_manager.has_unindexed_data(tenant_id)
+
+    def _hybrid_query(self, dense_vector, sparse_vector, tenant_id: str, accessed_role: Union[int, List[int]], k: int,
+                      payload_fields: Optional[List[str]] = None, indexed_only: bool = False) -> Dict:
+        """Tham số query_points cho hybrid search (prefetch Sparse + Dense, fusion RRF)."""
+        # Cấu hình Prefetch 
+        prefetch_limit = k * 2 # Lấy dư ra để Fusion tốt hơn
+
+        filter_condition = self._access_filter(tenant_id, accessed_role)
+
         prefetch_sparse = models.Prefetch(
             query=sparse_vector,
             using=self.sparse_vector,
             limit=prefetch_limit,
-            filter=filter_condition
+            filter=filter_condition,
+            params=models.SearchParams(indexed_only=True) if indexed_only else None
         )
 
         prefetch_dense = models.Prefetch(
             query=dense_vector,
             using=self.dense_vector,
             limit=prefetch_limit,
-            filter=filter_condition
+            filter=filter_condition,
+            params=build_search_params(self.profile, indexed_only=indexed_only)
         )
 
         # Query Fusion
-        results = self.client.query_points(
+        return dict(
             collection_name=self.collection_name,
             prefetch=[prefetch_sparse, prefetch_dense],
             query=models.FusionQuery(fusion=models.Fusion.RRF),
             limit=k, 
-            with_payload=True,
+            with_payload=self._payload_selector(payload_fields),
+            timeout=self.search_timeout,
         )
 
-        return results.points
\ No newline at end of file
+    def _hybrid_requests(self, dense_vector, sparse_vector, tenant_id: str, accessed_role: Union[int, List[int]], k: int,
+                         payload_fields: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Các request query_points theo thứ tự thử, dùng chung cho search_hybrid và asearch_hybrid:
+        đang rebuild HNSW -> indexed_only trước; rỗng (dữ liệu của tenant chưa có segment nào được index,
+        vd. upload từ process khác) -> search đầy đủ.
+        """
+        requests = [self._hybrid_query(dense_vector, sparse_vector, tenant_id, accessed_role, k, payload_fields)]
+        if self._use_indexed_only(tenant_id):
+            requests.insert(0, self._hybrid_query(dense_vector, sparse_vector, tenant_id, accessed_role, k, payload_fields, indexed_only=True))
+        return requests
+
+    def search_hybrid(self, query: str, tenant_id: str, accessed_role: Union[int, List[int]], k: int = 10, top_k: Optional[int] = None,
+                      payload_fields: Optional[List[str]] = None, dense_vector: Optional[List[float]] = None):
+        """
+        payload_fields: chỉ lấy các field này (vd. SLIM_PAYLOAD_FIELDS) cho luồng không cần content;
+        None (mặc định) lấy toàn bộ payload như luồng rerank cần.
+        dense_vector: vector query đã tính sẵn (vd. retrieval cache vừa dùng để so câu hỏi trùng).
+        """
+        if top_k is not None:
+            k = top_k
+        
+        # Tạo Vector cho câu Query
+        if dense_vector is None:
+            dense_vector = self.dense_embedder.get_dense_vector(query)
+        
+        sparse_vector = self.sparse_embedder.get_sparse_vector(query)
+
+        for request in self._hybrid_requests(dense_vector, sparse_vector, tenant_id, accessed_role, k, payload_fields):
+            results = self.client.query_points(**request)
+            if results.points:
+                break
+
+        return self._latest_versions(results.points)
+
+    async def asearch_hybrid(self, query: str, tenant_id: str, accessed_role: Union[int, List[int]], k: int = 10, top_k: Optional[int] = None,
+                             payload_fields: Optional[List[str]] = None, dense_vector: Optional[List[float]] = None):
+        """
+        Bản async của search_hybrid qua AsyncQdrantClient (gRPC nếu qdrant_prefer_grpc, timeout theo search_timeout):
+        cùng request (_hybrid_requests), payload rút gọn, fallback indexed_only và dedupe version (_latest_versions).
+        """
+        if top_k is not None:
+            k = top_k
+
+        if self.local_path:
+            # Local mode không có async client dùng chung storage -> chạy bản sync trong thread
+            return await asyncio.to_thread(self.search_hybrid, query, tenant_id, accessed_role, k, None, payload_fields, dense_vector)
+
+        # Embedding query chạy trong thread để không chặn event loop
+        if dense_vector is None:
+            dense_vector = await asyncio.to_thread(self.dense_embedder.get_dense_vector, query)
+        sparse_vector = await asyncio.to_thread(self.sparse_embedder.get_sparse_vector, query)
+
+        client = self._get_async_client()
+        for request in self._hybrid_requests(dense_vector, sparse_vector, tenant_id, accessed_role, k, payload_fields):
+            results = await client.query_points(**request)
+            if results.points:
+                break
+
+        return self._latest_versions(results.points)
@@ -0,0 +1,107 @@
+import re
+import threading
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+# Đại từ thay thế cho chủ thể đã nhắc trong lịch sử ("Nó nộp ở đâu?", "Anh ấy thuộc phòng nào?")
+# Bỏ "chúng tôi / chúng ta / chúng mình" (ngôi thứ nhất) và "họ tên / họ và tên" (trường thông tin nhân sự)
+ANAPHORA_PATTERN = re.compile(
+    r"\b("
+    r"nó|họ(?! (và )?tên\b)|chúng(?! (tôi|ta|mình)\b)|"
+    r"(ông|bà|anh|chị|cô|chú|em|bạn) ấy|"
+    r"cái (đó|này|kia)|điều (đó|này)|việc (đó|này)|vấn đề (đó|này)"
+    r")\b",
+    re.IGNORECASE,
+)
+# Danh từ + chỉ định ("Quy trình này mất bao lâu?"); bỏ các liên từ "trong đó", "sau đó", "do đó"...
+# và mốc thời gian "năm đó", "ngày đó", "hôm đó"
+DEMONSTRATIVE_PATTERN = re.compile(r"\b(\w+) (này|đó|kia|ấy)\b", re.IGNORECASE)
+DEMONSTRATIVE_CONNECTIVES = {
+    "trong", "sau", "trước", "khi", "lúc", "do", "vì", "từ", "đến", "tới", "ngoài", "bên", "ở", "tại", "như", "bởi",
+    "năm", "tháng", "tuần", "ngày", "hôm", "giờ",
+}
+# Câu hỏi nối tiếp dạng "Còn phòng kế toán thì sao?", "Vậy còn hợp đồng thử việc?"
+FOLLOW_UP_PATTERN = re.compile(r"^(thế còn|vậy còn|vậy thì|thế thì)\b|thì (sao|thế nào|như thế nào)\s*\??$", re.IGNORECASE)
+# "Còn ..." chỉ là nối tiếp khi không tự đặt câu hỏi: "Còn phòng kế toán?" khác "Còn bao nhiêu ngày phép?"
+BARE_CON_PATTERN = re.compile(r"^còn\b", re.IGNORECASE)
+INTERROGATIVE_PATTERN = re.compile(r"\b(bao nhiêu|bao lâu|mấy|gì|nào|không|ai|đâu|sao|chưa)\b", re.IGNORECASE)
+
+
+def _has_demonstrative(text: str) -> bool:
+    return any(match.group(1).lower() not in DEMONSTRATIVE_CONNECTIVES for match in DEMONSTRATIVE_PATTERN.finditer(text))
+
+
+def detect_follow_up(query: str, chat_history: Optional[List[Dict]]) -> Optional[str]:
+    """
+    Bộ phát hiện rẻ (regex + đếm từ) trước khi retrieve: trả về lý do cần viết lại câu hỏi
+    ("anaphora" / "short") hoặc None nếu câu hỏi đã đủ ý.
+    Không có lịch sử hội thoại -> không có gì để tham chiếu, luôn trả về None (lượt đầu không bị viết lại).
+    """
+    if not chat_history:
+        return None
+
+    text = query.strip()
+    if ANAPHORA_PATTERN.search(text) or _has_demonstrative(text) or FOLLOW_UP_PATTERN.search(text):
+        return "anaphora"
+    if BARE_CON_PATTERN.search(text) and not INTERROGATIVE_PATTERN.search(text):
+        return "anaphora"
+    if len(text.split()) <= settings.rewrite_short_query_words:
+        return "short"
+    return None
+
+
+# Chỉ gọi LLM viết lại câu hỏi (contextualize_query) khi cần:
+#   - trước retrieve: câu hỏi có đại từ / nối tiếp hoặc quá ngắn
+#   - sau rerank   : điểm rerank cao nhất < rewrite_min_rerank_score (retrieve lại với câu đã viết lại)
+# Kết quả viết lại được cache theo conversation (RedisChatMemory); thống kê tỉ lệ lượt phải viết lại.
+class QueryRewriter:
+    def __init__(self, memory_client):
+        self.memory_client = memory_client
+        self.enabled = settings.rewrite_enabled
+        self.min_rerank_score = settings.rewrite_min_rerank_score
+
+        self._lock = threading.Lock()
+        self._stats = {"turns": 0, "rewritten": 0, "cache_hits": 0, "reasons": {}}
+
+    def _record(self, reason: Optional[str] = None, cache_hit: bool = False):
+        with self._lock:
+            if reason is None:
+                self._stats["turns"] += 1
+                return
+            self._stats["rewritten"] += 1
+            self._stats["cache_hits"] += int(cache_hit)
+            self._stats["reasons"][reason] = self._stats["reasons"].get(reason, 0) + 1
+
+    def count_turn(self):
+        self._record()
+
+    def is_low_confidence(self, top_docs: List) -> bool:
+        if not top_docs:
+            return True
+        return max(float(doc.score) for doc in top_docs) < self.min_rerank_score
+
+    def rewrite(self, query: str, tenant_id, employee_id, chat_history: List[Dict], reason: str) -> str:
+        """Viết lại câu hỏi thành câu độc lập; dùng lại kết quả đã cache cho cùng câu hỏi + ngữ cảnh."""
+        if not self.enabled or not chat_history:
+            return query
+
+        recent = chat_history[-settings.rewrite_history_messages:]
+        cached = self.memory_client.get_rewrite(tenant_id, employee_id, query, recent)
+        if cached is not None:
+            self._record(reason, cache_hit=True)
+            return cached
+
+        rewritten = self.memory_client.contextualize_query(query, recent) or query
+        self.memory_client.put_rewrite(tenant_id, employee_id, query, recent, rewritten)
+        self._record(reason)
+        return rewritten
+
+    def stats(self) -> Dict:
+        with self._lock:
+            turns = self._stats["turns"]
+            return {
+                **self._stats,
+                "reasons": dict(self._stats["reasons"]),
+                "rewrite_fraction": round(self._stats["rewritten"] / turns, 4) if turns else 0.0,
+            }
@@ -0,0 +1,102 @@
+import msgpack
+import numpy as np
+import redis
+import zstandard
+from typing import Dict, List, Optional, Tuple, Union
+
+from qdrant_client import models
+
+from app.core.config import settings
+from app.services.qdrant_service import SLIM_PAYLOAD_FIELDS
+
+# Cache bộ ứng viên đã rerank của lượt chat gần nhất theo (tenant_id, employee_id).
+# Lượt hỏi nối tiếp rerank lại bộ này cùng 1 lần search nhỏ hơn; câu hỏi gần như trùng lặp thì bỏ qua search.
+# Mỗi point chỉ lưu payload rút gọn (SLIM_PAYLOAD_FIELDS), content được lấy lại theo id khi dùng (fetch_payloads).
+# Mỗi tenant có 1 generation counter: upload / thay thế / xóa tài liệu tăng counter -> mọi cache của tenant mất hiệu lực.
+class RetrievalCache:
+    def __init__(self):
+        self.redis_client = redis.Redis(connection_pool=redis.ConnectionPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            max_connections=settings.redis_max_connections,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+        ))
+        self.ttl = settings.redis_conversation_ttl
+        self.size = settings.retrieval_cache_size
+        self.duplicate_threshold = settings.retrieval_cache_duplicate_threshold
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def _cache_key(self, tenant_id, employee_id):
+        return f"chat_retrieval:{tenant_id}:{employee_id}"
+
+    def _generation_key(self, tenant_id):
+        return f"retrieval_generation:{tenant_id}"
+
+    @staticmethod
+    def _roles(access_role: Union[int, List[int]]) -> List[int]:
+        return sorted(access_role) if isinstance(access_role, (list, tuple, set)) else [access_role]
+
+    def get(self, tenant_id, employee_id, access_role) -> Tuple[Optional[Dict], int]:
+        """
+        (entry, generation). Entry của lượt trước: {"query", "vector" (np.float32), "points" (ScoredPoint, payload rút gọn -
+        chưa có content)}; None nếu chưa có, tài liệu của tenant đã thay đổi hoặc quyền truy cập khác lượt trước.
+        generation: counter của tenant tại thời điểm đọc (trước khi search) -> truyền lại cho put() của lượt này.
+        """
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(self._cache_key(tenant_id, employee_id))
+            pipe.get(self._generation_key(tenant_id))
+            raw, generation = pipe.execute()
+
+        generation = int(generation or 0)
+        if raw is None:
+            return None, generation
+
+        entry = msgpack.unpackb(self._decompressor.decompress(raw), raw=False)
+        if entry["generation"] != generation or entry["roles"] != self._roles(access_role):
+            return None, generation
+
+        return {
+            "query": entry["query"],
+            "vector": np.frombuffer(entry["vector"], dtype=np.float16).astype(np.float32),
+            "points": [
+                models.ScoredPoint(id=point["id"], version=0, score=point["score"], payload=point["payload"])
+                for point in entry["points"]
+            ],
+        }, generation
+
+    def put(self, tenant_id, employee_id, access_role, query: str, query_vector, points: List, generation: int):
+        """
+        Lưu top `size` ứng viên đã rerank của lượt này (kèm vector câu hỏi để so trùng ở lượt sau).
+        generation: giá trị get() trả về trước khi search - tài liệu thay đổi trong lúc lượt chat đang chạy
+        (invalidate_tenant) thì entry này mang generation cũ và bị bỏ qua ở lượt sau.
+        """
+        entry = msgpack.packb({
+            "query": query,
+            "vector": np.asarray(query_vector, dtype=np.float16).tobytes(),
+            "roles": self._roles(access_role),
+            "generation": generation,
+            "points": [
+                {
+                    "id": point.id,
+                    "score": float(point.score),
+                    "payload": {field: point.payload[field] for field in SLIM_PAYLOAD_FIELDS if field in (point.payload or {})},
+                }
+                for point in points[: self.size]
+            ],
+        }, use_bin_type=True)
+
+        self.redis_client.set(self._cache_key(tenant_id, employee_id), self._compressor.compress(entry), ex=self.ttl)
+
+    def is_near_duplicate(self, entry: Dict, query: str, query_vector) -> bool:
+        if query.strip().lower() == entry["query"].strip().lower():
+            return True
+        # Vector dense đã normalize -> tích vô hướng = cosine
+        return float(np.dot(entry["vector"], np.asarray(query_vector, dtype=np.float32))) >= self.duplicate_threshold
+
+    def invalidate_tenant(self, tenant_id):
+        """Tài liệu của tenant thay đổi -> mọi bộ ứng viên đã cache của tenant không còn dùng được."""
+        self.redis_client.incr(self._generation_key(tenant_id))
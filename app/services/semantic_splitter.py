@@ -0,0 +1,71 @@
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Tách câu giống SemanticChunker của LangChain (kết thúc bằng . ? ! rồi khoảng trắng)
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.?!])\s+")
+
+# Semantic splitter chạy trực tiếp trên NumPy, tương đương SemanticChunker(breakpoint_threshold_type="gradient"):
+#   1. Tách câu, ghép mỗi câu với buffer_size câu trước/sau
+#   2. Embed toàn bộ câu (đã ghép) của tài liệu trong 1 lần gọi batch
+#   3. Khoảng cách cosine giữa 2 câu liên tiếp -> gradient -> ngắt tại các điểm có gradient > percentile
+# Vector câu được giữ lại: mean pooling theo từng chunk cho ra vector dense của chunk (tùy chọn).
+class GradientSemanticSplitter:
+    def __init__(self, embedder, buffer_size: int = 1, breakpoint_percentile: float = 95.0):
+        self.embedder = embedder
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile = breakpoint_percentile
+
+    @staticmethod
+    def split_sentences(text: str) -> List[str]:
+        return [s for s in SENTENCE_SPLIT_PATTERN.split(text) if s.strip()]
+
+    def _combine_sentences(self, sentences: List[str]) -> List[str]:
+        n = len(sentences)
+        return [
+            " ".join(sentences[max(0, i - self.buffer_size) : min(n, i + self.buffer_size + 1)])
+            for i in range(n)
+        ]
+
+    def _embed_sentences(self, sentences: List[str]) -> np.ndarray:
+        vectors = self.embedder.embed(self._combine_sentences(sentences), show_progress_bar=False)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def find_breakpoints(self, vectors: np.ndarray) -> np.ndarray:
+        """Chỉ số câu i mà chunk kết thúc sau câu i (ngắt giữa câu i và i+1)."""
+        if len(vectors) < 2:
+            return np.empty(0, dtype=np.int64)
+
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        if len(distances) < 2:
+            # 2 câu -> không tính được gradient; như LangChain: mỗi câu 1 chunk
+            return np.arange(len(distances))
+
+        gradient = np.gradient(distances)
+        threshold = np.percentile(gradient, self.breakpoint_percentile)
+        return np.flatnonzero(gradient > threshold)
+
+    def split(self, text: str, pool_vectors: bool = False) -> Tuple[List[str], Optional[np.ndarray]]:
+        """
+        Returns: (chunk texts, chunk vectors (N, dim) đã normalize hoặc None nếu pool_vectors=False).
+        """
+        sentences = self.split_sentences(text)
+        if not sentences:
+            return [], None
+        if len(sentences) == 1:
+            vectors = self._embed_sentences(sentences) if pool_vectors else None
+            return sentences, vectors
+
+        vectors = self._embed_sentences(sentences)
+        bounds = [0, *(self.find_breakpoints(vectors) + 1).tolist(), len(sentences)]
+
+        chunks = [" ".join(sentences[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+        if not pool_vectors:
+            return chunks, None
+
+        # Mean pooling vector câu theo chunk (np.add.reduceat: 1 lần cho mọi chunk)
+        pooled = np.add.reduceat(vectors, bounds[:-1], axis=0) / np.diff(bounds)[:, None]
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return chunks, pooled.astype(np.float32)
@@ -1,11 +1,11 @@
-from sentence_transformers import SentenceTransformer
+from app.services.embedding_service import get_sentence_transformer
 
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+LEGACY_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
 
 class EmbeddingService:
     def __init__(self):
-        self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+        self.model = get_sentence_transformer(LEGACY_MODEL_NAME)
 
     def encode(self, chunks):
         embeddings = self.model.encode(chunks)
-        return embeddings
\ No newline at end of file
+        return embeddings
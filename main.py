@@ -9,7 +9,7 @@ from contextlib import asynccontextmanager
 import time
 
 from app.core.config import settings
-from app.api.endpoints import chat, upload, health
+from app.api.endpoints import chat, upload, health, documents
 
 # Pre-load tất cả AI models (Reranker, Embedding, Qdrant, Redis) ngay khi start
 # Để request đầu tiên không phải chờ load model
@@ -26,8 +26,13 @@ async def lifespan(app: FastAPI):
     settings.ensure_directories()
     print(f"🚀 TPV-Chatbot API đang chạy tại http://{settings.api_host}:{settings.api_port}")
     yield
-    # Shutdown
+    # Shutdown: dừng process pool embedding + đóng async clients (worker không sống sót qua reload)
     print("👋 Đang tắt server...")
+    from app.core import chat as chat_core
+    from app.core.upload import aclose_clients
+    await chat_core.db_client.aclose()
+    await chat_core.memory_client.aclose()
+    await aclose_clients()
 
 
 app = FastAPI(
@@ -78,6 +83,7 @@ api_prefix = f"/api/{settings.api_version}"
 app.include_router(health.router, prefix=api_prefix, tags=["Health"])
 app.include_router(upload.router, prefix=api_prefix, tags=["Upload"])
 app.include_router(chat.router, prefix=api_prefix, tags=["Chat"])
+app.include_router(documents.router, prefix=api_prefix, tags=["Documents"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark đếm token trong ChunkingService (structure split -> smart merge -> tạo chunk):
+- legacy     : tokenize lại toàn bộ đoạn đang gộp ở mỗi vòng lặp + đếm lại ở bước tạo chunk (bậc 2 theo số section)
+- incremental: mỗi split tokenize 1 lần, số token được cộng dồn qua merge và tạo chunk
+Bỏ qua semantic split (cần embedding model) để chỉ đo phần đếm token.
+Chạy: python scripts/bench_chunking_tokens.py --sections 2000 [--file docs/sample.md]
+"""
+
+import argparse
+import copy
+import sys
+import time
+from pathlib import Path
+
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.chunking_service import HARD_CAP, IDEAL_TOKENS, MIN_TOKENS, ChunkingService
+from app.services.embedding_service import get_tokenizer
+
+
+def make_markdown(num_sections: int) -> str:
+    # Nhiều section nhỏ cùng 1 H1 -> smart merge gộp dần thành đoạn lớn (trường hợp xấu nhất của bản cũ)
+    parts = ["# Sổ tay nhân viên"]
+    for i in range(num_sections):
+        parts.append(f"## Điều {i + 1}")
+        parts.append(f"Nhân viên thực hiện quy định số {i + 1} theo hướng dẫn của phòng nhân sự. " * 3)
+    return "\n\n".join(parts)
+
+
+class CountingTokenizer:
+    """Bọc tokenizer để đếm số lần gọi encode và tổng số ký tự đã tokenize."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.calls = 0
+        self.chars = 0
+
+    def encode(self, text, **kwargs):
+        self.calls += 1
+        self.chars += len(text)
+        return self.tokenizer.encode(text, **kwargs)
+
+
+def run_legacy(tokenizer, splits):
+    count = lambda text: len(tokenizer.encode(text))
+    merged = []
+    current_doc = splits[0]
+    for next_doc in splits[1:]:
+        curr_tokens = count(current_doc.page_content)
+        next_tokens = count(next_doc.page_content)
+        same_topic = current_doc.metadata.get("H1") == next_doc.metadata.get("H1")
+        total_size = curr_tokens + next_tokens
+        should_merge = same_topic and total_size < HARD_CAP and (curr_tokens < MIN_TOKENS or total_size < IDEAL_TOKENS)
+        if should_merge:
+            current_doc.page_content += "\n\n" + next_doc.page_content
+        else:
+            merged.append(current_doc)
+            current_doc = next_doc
+    merged.append(current_doc)
+    # Bước tạo chunk đếm lại 2 lần (phân loại + metadata)
+    return [(count(doc.page_content), count(doc.page_content)) for doc in merged]
+
+
+def run_incremental(tokenizer, splits):
+    service = ChunkingService.__new__(ChunkingService)
+    service._init_token_counter(tokenizer)
+    counts = [service._content_tokens(doc.page_content) for doc in splits]
+    _, merged_counts = service._smart_merge_sections(splits, counts)
+    return [c + service._special_tokens for c in merged_counts]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--file", help="File markdown dài thay cho dữ liệu sinh ngẫu nhiên")
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text(encoding="utf-8") if args.file else make_markdown(args.sections)
+    splitter = MarkdownHeaderTextSplitter(headers_to_split_on=[("#", "H1"), ("##", "H2")], strip_headers=False)
+    splits = splitter.split_text(text)
+    base_tokenizer = get_tokenizer()
+
+    print(f"Sections: {len(splits)} | ký tự: {len(text)}")
+    results = {}
+    for name, runner in [("legacy", run_legacy), ("incremental", run_incremental)]:
+        tokenizer = CountingTokenizer(base_tokenizer)
+        start = time.perf_counter()
+        results[name] = runner(tokenizer, copy.deepcopy(splits))
+        elapsed = time.perf_counter() - start
+        print(f"{name:12} {elapsed:8.3f}s | encode calls {tokenizer.calls:7} | ký tự đã tokenize {tokenizer.chars:12}")
+
+    legacy_counts = [c for c, _ in results["legacy"]]
+    drift = max((abs(a - b) for a, b in zip(legacy_counts, results["incremental"])), default=0)
+    print(f"Chunks: {len(legacy_counts)} vs {len(results['incremental'])} | lệch token tối đa: {drift}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark encode Dense + Sparse: 1 process (đường hiện tại) vs process pool
+Chạy: python scripts/bench_embedding.py --chunks 300 --workers 4 --threads 2
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.embedding_service import LocalDenseEmbedding, LocalSparseEmbedding, MultiProcessEmbedding
+
+
+def load_sample_chunks(num_chunks: int) -> list[str]:
+    """Cắt document.txt thành các đoạn, lặp lại cho đủ num_chunks"""
+    text = (project_root / "document.txt").read_text(encoding="utf-8")
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    return [f"[{i}] {paragraphs[i % len(paragraphs)]}" for i in range(num_chunks)]
+
+
+def compare_sparse(a: list[dict], b: list[dict]) -> float:
+    """Trả về sai lệch lớn nhất giữa hai danh sách sparse vector (inf nếu khác indices)"""
+    max_diff = 0.0
+    for x, y in zip(a, b):
+        if x["indices"] != y["indices"]:
+            return float("inf")
+        if x["values"]:
+            max_diff = max(max_diff, float(np.max(np.abs(np.array(x["values"]) - np.array(y["values"])))))
+    return max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = load_sample_chunks(args.chunks)
+    print(f"Chunks: {len(texts)} | workers: {args.workers} | threads/worker: {args.threads}")
+
+    # 1. Đường hiện tại: 1 process
+    dense_embedder = LocalDenseEmbedding()
+    sparse_embedder = LocalSparseEmbedding()
+
+    start = time.perf_counter()
+    dense_single = dense_embedder.embed(texts, show_progress_bar=False)
+    sparse_single = sparse_embedder.embed(texts)
+    single_time = time.perf_counter() - start
+
+    # 2. Process pool (warm-up để không tính thời gian load model trong worker)
+    with MultiProcessEmbedding(args.workers, args.threads) as pool:
+        pool.embed(texts[: args.workers])
+        start = time.perf_counter()
+        dense_multi, sparse_multi = pool.embed(texts)
+        multi_time = time.perf_counter() - start
+
+    dense_diff = float(np.max(np.abs(np.array(dense_single) - np.array(dense_multi))))
+    sparse_diff = compare_sparse(sparse_single, sparse_multi)
+
+    print(f"Single process : {single_time:.2f}s ({len(texts) / single_time:.1f} chunks/s)")
+    print(f"Process pool   : {multi_time:.2f}s ({len(texts) / multi_time:.1f} chunks/s)")
+    print(f"Speedup        : x{single_time / multi_time:.2f}")
+    print(f"Max |dense diff|  : {dense_diff:.2e}")
+    print(f"Max |sparse diff| : {sparse_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark đường ghi vector vào Qdrant: peak memory (tracemalloc) và throughput
+- legacy: dense.tolist() -> N PointStruct -> upsert (đường cũ)
+- batch : np.ndarray -> 1 Batch dạng cột (model_construct) -> upsert (VectorStoreService._build_batch)
+  (vẫn có 1 lần dense.tolist() ở biên Batch: qdrant-client không serialize được np.ndarray)
+Dùng vector ngẫu nhiên để tách riêng chi phí đóng gói/gửi khỏi chi phí encode.
+Chạy: python scripts/bench_ingest_memory.py --chunks 5000 [--url :memory:]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.config import settings
+from app.services.qdrant_service import DENSE_DIMENSION, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME, VectorStoreService
+
+COLLECTION = "bench_ingest_memory"
+BATCH_SIZE = 128
+
+
+def make_data(num_chunks: int):
+    rng = np.random.default_rng(0)
+    dense = rng.standard_normal((num_chunks, DENSE_DIMENSION)).astype(np.float32)
+    sparse = []
+    for _ in range(num_chunks):
+        indices = np.sort(rng.choice(30522, size=150, replace=False))
+        sparse.append({"indices": indices.tolist(), "values": rng.random(150).astype(np.float32).tolist()})
+    payloads = [{"tenant_id": "bench", "src_file": "bench.md", "content": "x" * 2000, "metadata": {}} for _ in range(num_chunks)]
+    return dense, sparse, payloads
+
+
+def write_legacy(client, dense, sparse, payloads):
+    for i in range(0, len(dense), BATCH_SIZE):
+        dense_list = dense[i : i + BATCH_SIZE].tolist()
+        points = [
+            models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector={DENSE_VECTOR_NAME: dense_list[j], SPARSE_VECTOR_NAME: sparse[i + j]},
+                payload=payloads[i + j],
+            )
+            for j in range(len(dense_list))
+        ]
+        client.upsert(collection_name=COLLECTION, points=points)
+
+
+def write_batch(client, dense, sparse, payloads):
+    service = SimpleNamespace(dense_vector=DENSE_VECTOR_NAME, sparse_vector=SPARSE_VECTOR_NAME)
+    for i in range(0, len(dense), BATCH_SIZE):
+        end = i + BATCH_SIZE
+        ids = [str(uuid.uuid4()) for _ in range(len(dense[i:end]))]
+        batch = VectorStoreService._build_batch(service, ids, dense[i:end], sparse[i:end], payloads[i:end])
+        client.upsert(collection_name=COLLECTION, points=batch)
+
+
+def reset_collection(client):
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config={DENSE_VECTOR_NAME: models.VectorParams(size=DENSE_DIMENSION, distance=models.Distance.COSINE)},
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--url", default=settings.qdrant_url, help="URL Qdrant hoặc ':memory:'")
+    args = parser.parse_args()
+
+    client = QdrantClient(location=":memory:") if args.url == ":memory:" else QdrantClient(url=args.url, timeout=120)
+    dense, sparse, payloads = make_data(args.chunks)
+
+    print(f"Chunks: {args.chunks} | dim: {DENSE_DIMENSION} | batch: {BATCH_SIZE}")
+    for name, writer in [("legacy", write_legacy), ("batch", write_batch)]:
+        reset_collection(client)
+        tracemalloc.start()
+        start = time.perf_counter()
+        writer(client, dense, sparse, payloads)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:8} {elapsed:7.2f}s  {args.chunks / elapsed:8.1f} chunks/s  peak {peak / 1024 / 1024:8.1f} MB")
+
+    client.delete_collection(COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark payload projection cho hybrid search (luồng không rerank):
+- full : with_payload=True, mỗi candidate mang theo content + metadata (hiện tại)
+- slim : payload selector SLIM_PAYLOAD_FIELDS, content lấy lazily theo id cho top-k cuối (fetch_payloads)
+Đo kích thước response (JSON payload) và latency. Chạy trên collection thật tại settings.qdrant_url;
+vector query được tính trước để chỉ đo phần Qdrant + truyền tải.
+Chạy: python scripts/bench_payload_projection.py --tenant-id 1 --role 1 --k 20 --final-k 5 --rounds 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.qdrant_service import SLIM_PAYLOAD_FIELDS, VectorStoreService
+
+QUERIES = [
+    "Quy trình xin nghỉ phép năm như thế nào?",
+    "Chính sách bảo hiểm cho nhân viên chính thức",
+    "Thời gian thử việc tối đa là bao lâu?",
+    "Quy định về làm thêm giờ và phụ cấp",
+]
+
+
+def payload_bytes(points) -> int:
+    return sum(len(json.dumps(point.payload or {}, ensure_ascii=False).encode("utf-8")) for point in points)
+
+
+def run(service: VectorStoreService, vectors, args, slim: bool) -> tuple[list[float], list[int]]:
+    latencies, sizes = [], []
+    payload_fields = SLIM_PAYLOAD_FIELDS if slim else None
+    for i in range(args.rounds):
+        dense, sparse = vectors[i % len(vectors)]
+        start = time.perf_counter()
+        points = service.client.query_points(
+            **service._hybrid_query(dense, sparse, args.tenant_id, args.role, args.k, payload_fields)
+        ).points
+        size = payload_bytes(points)
+        if slim:
+            # Chỉ top-k cuối cần content
+            final = service.fetch_payloads(points[: args.final_k])
+            size += payload_bytes(final)
+        latencies.append((time.perf_counter() - start) * 1000)
+        sizes.append(size)
+    return latencies, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenant-id", default="1")
+    parser.add_argument("--role", type=int, default=1)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--final-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    service = VectorStoreService()
+    vectors = [
+        (service.dense_embedder.get_dense_vector(q), service.sparse_embedder.get_sparse_vector(q)) for q in QUERIES
+    ]
+
+    # Warm-up kết nối
+    run(service, vectors, argparse.Namespace(**{**vars(args), "rounds": 5}), slim=False)
+
+    print(f"k={args.k} | final-k={args.final_k} | rounds={args.rounds}")
+    for name, slim in [("full", False), ("slim", True)]:
+        latencies, sizes = run(service, vectors, args, slim)
+        print(
+            f"{name:6} p50 {np.percentile(latencies, 50):7.2f} ms | p95 {np.percentile(latencies, 95):7.2f} ms"
+            f" | payload {np.mean(sizes) / 1024:8.1f} KB/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark latency query hybrid (prefetch Sparse + Dense, fusion RRF): REST vs gRPC, sync vs async
+Chạy trên collection thật (enterprise_docs) tại settings.qdrant_url; vector query được tính trước
+để chỉ đo phần truyền tải + Qdrant.
+Chạy: python scripts/bench_qdrant_transport.py --tenant-id 1 --role 1 --rounds 200 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.qdrant_service import VectorStoreService
+
+QUERIES = [
+    "Quy trình xin nghỉ phép năm như thế nào?",
+    "Chính sách bảo hiểm cho nhân viên chính thức",
+    "Thời gian thử việc tối đa là bao lâu?",
+    "Quy định về làm thêm giờ và phụ cấp",
+]
+
+
+def report(name: str, latencies: list[float], wall: float):
+    print(
+        f"{name:14} p50 {np.percentile(latencies, 50):7.2f} ms | p95 {np.percentile(latencies, 95):7.2f} ms"
+        f" | {len(latencies) / wall:8.1f} qps"
+    )
+
+
+def bench_sync(service: VectorStoreService, vectors, args) -> tuple[list[float], float]:
+    latencies = []
+    wall = time.perf_counter()
+    for i in range(args.rounds):
+        dense, sparse = vectors[i % len(vectors)]
+        start = time.perf_counter()
+        service.client.query_points(**service._hybrid_query(dense, sparse, args.tenant_id, args.role, args.k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, time.perf_counter() - wall
+
+
+async def bench_async(service: VectorStoreService, vectors, args) -> tuple[list[float], float]:
+    client = service._get_async_client()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i):
+        dense, sparse = vectors[i % len(vectors)]
+        async with semaphore:
+            start = time.perf_counter()
+            await client.query_points(**service._hybrid_query(dense, sparse, args.tenant_id, args.role, args.k))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.rounds)))
+    wall = time.perf_counter() - wall
+    await service.aclose()
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenant-id", default="1")
+    parser.add_argument("--role", type=int, default=1)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    rest = VectorStoreService(prefer_grpc=False)
+    grpc = VectorStoreService(prefer_grpc=True)
+    vectors = [
+        (rest.dense_embedder.get_dense_vector(q), rest.sparse_embedder.get_sparse_vector(q)) for q in QUERIES
+    ]
+
+    # Warm-up kết nối
+    bench_sync(rest, vectors, argparse.Namespace(**{**vars(args), "rounds": 5}))
+    bench_sync(grpc, vectors, argparse.Namespace(**{**vars(args), "rounds": 5}))
+
+    report("REST sync", *bench_sync(rest, vectors, args))
+    report("gRPC sync", *bench_sync(grpc, vectors, args))
+    report("REST async", *asyncio.run(bench_async(rest, vectors, args)))
+    report("gRPC async", *asyncio.run(bench_async(grpc, vectors, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark các collection profile (default / scalar / binary) trên Qdrant server:
+RAM của Qdrant, latency search dense và recall@k so với exact search float32.
+Cần Qdrant server đang chạy tại settings.qdrant_url (metrics RAM lấy từ /metrics).
+Chạy: python scripts/bench_quantization.py --points 50000 --queries 200
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.config import settings
+from app.services.qdrant_service import DENSE_DIMENSION, DENSE_VECTOR_NAME, build_quantization_config, build_search_params
+
+PROFILES = ["default", "scalar", "binary"]
+
+
+def qdrant_rss_mb() -> float:
+    """RSS của Qdrant server (memory_resident_bytes trong /metrics)"""
+    text = httpx.get(f"{settings.qdrant_url}/metrics", timeout=5).text
+    match = re.search(r"^memory_resident_bytes\s+(\d+)", text, flags=re.MULTILINE)
+    return int(match.group(1)) / 1024 / 1024 if match else float("nan")
+
+
+def random_unit_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def wait_until_green(client: QdrantClient, name: str):
+    while client.get_collection(name).status != models.CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=settings.qdrant_url, timeout=120)
+    vectors = random_unit_vectors(args.points, DENSE_DIMENSION, seed=0)
+    queries = random_unit_vectors(args.queries, DENSE_DIMENSION, seed=1)
+
+    ground_truth = None
+    print(f"{'profile':10} {'RAM +MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+
+    for profile in PROFILES:
+        name = f"bench_profile_{profile}"
+        if client.collection_exists(name):
+            client.delete_collection(name)
+
+        rss_before = qdrant_rss_mb()
+        client.create_collection(
+            collection_name=name,
+            vectors_config={
+                DENSE_VECTOR_NAME: models.VectorParams(size=DENSE_DIMENSION, distance=models.Distance.COSINE, on_disk=True)
+            },
+            quantization_config=build_quantization_config(profile),
+            on_disk_payload=profile != "default",
+        )
+        client.upload_collection(
+            collection_name=name,
+            vectors={DENSE_VECTOR_NAME: vectors},
+            ids=range(args.points),
+            batch_size=256,
+        )
+        wait_until_green(client, name)
+        rss_after = qdrant_rss_mb()
+
+        search_params = build_search_params(profile)
+        if profile == "default":
+            # Ground truth: exact search trên vector float32
+            ground_truth = [
+                {p.id for p in client.query_points(
+                    name, query=q.tolist(), using=DENSE_VECTOR_NAME, limit=args.k,
+                    search_params=models.SearchParams(exact=True),
+                ).points}
+                for q in queries
+            ]
+
+        latencies, recalls = [], []
+        for q, truth in zip(queries, ground_truth):
+            start = time.perf_counter()
+            points = client.query_points(
+                name, query=q.tolist(), using=DENSE_VECTOR_NAME, limit=args.k, search_params=search_params,
+            ).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len({p.id for p in points} & truth) / args.k)
+
+        print(
+            f"{profile:10} {rss_after - rss_before:9.1f} {np.percentile(latencies, 50):8.2f} "
+            f"{np.percentile(latencies, 95):8.2f} {np.mean(recalls):9.3f}"
+        )
+        client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark semantic split (gradient breakpoint) trên 1 tài liệu dài:
+- langchain: SemanticChunker(breakpoint_threshold_type="gradient")
+- native   : GradientSemanticSplitter (embed câu 1 lần theo batch + NumPy), có/không pooling vector chunk
+Đo thời gian và mức trùng khớp ranh giới chunk (theo chỉ số câu): precision / recall / F1 so với LangChain.
+Chạy: python scripts/bench_semantic_splitter.py --file data/md_dir/sample.md [--rounds 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from langchain_experimental.text_splitter import SemanticChunker
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.embedding_service import get_dense_embedder
+from app.services.semantic_splitter import GradientSemanticSplitter
+
+
+def boundaries(chunks, splitter: GradientSemanticSplitter) -> set:
+    """Tập chỉ số câu kết thúc mỗi chunk (trừ chunk cuối)."""
+    ends, position = set(), 0
+    for chunk in chunks[:-1]:
+        position += len(splitter.split_sentences(chunk))
+        ends.add(position)
+    return ends
+
+
+def timed(fn, rounds: int):
+    best, result = float("inf"), None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", required=True, help="File markdown / text dài")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text(encoding="utf-8")
+    embedder = get_dense_embedder()
+    langchain_splitter = SemanticChunker(embedder, breakpoint_threshold_type="gradient")
+    native_splitter = GradientSemanticSplitter(embedder)
+
+    # Warm-up model
+    embedder.embed(["khởi động"], show_progress_bar=False)
+
+    lc_time, lc_chunks = timed(lambda: langchain_splitter.split_text(text), args.rounds)
+    native_time, (native_chunks, _) = timed(lambda: native_splitter.split(text), args.rounds)
+    pooled_time, (_, pooled) = timed(lambda: native_splitter.split(text, pool_vectors=True), args.rounds)
+
+    print(f"Câu: {len(native_splitter.split_sentences(text))} | ký tự: {len(text)}")
+    print(f"{'langchain':10} {lc_time:8.3f}s | {len(lc_chunks):5} chunks")
+    print(f"{'native':10} {native_time:8.3f}s | {len(native_chunks):5} chunks | x{lc_time / native_time:.2f}")
+    print(f"{'native+pool':10} {pooled_time:8.3f}s | vectors {None if pooled is None else pooled.shape} (không phải embed lại chunk)")
+
+    expected, actual = boundaries(lc_chunks, native_splitter), boundaries(native_chunks, native_splitter)
+    matched = len(expected & actual)
+    precision = matched / len(actual) if actual else 1.0
+    recall = matched / len(expected) if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"Ranh giới: precision {precision:.3f} | recall {recall:.3f} | F1 {f1:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark pruning sparse vector (SPLADE): kích thước index và latency truy vấn trước/sau
+Dùng Qdrant local mode (:memory:) nên không cần Qdrant server.
+Chạy: python scripts/bench_sparse_pruning.py --chunks 500 --doc-top-k 128 --query-top-k 32
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.embedding_service import LocalSparseEmbedding
+
+SPARSE_VECTOR_NAME = "sparse-vector"
+
+
+def load_sample_chunks(num_chunks: int) -> list[str]:
+    """Cắt document.txt thành các đoạn, lặp lại cho đủ num_chunks"""
+    text = (project_root / "document.txt").read_text(encoding="utf-8")
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    return [f"[{i}] {paragraphs[i % len(paragraphs)]}" for i in range(num_chunks)]
+
+
+def run_case(embedder: LocalSparseEmbedding, texts: list[str], queries: list[str], limit: int = 20):
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name="bench",
+        vectors_config={},
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()},
+    )
+
+    start = time.perf_counter()
+    doc_vectors = embedder.embed(texts)
+    embed_time = time.perf_counter() - start
+
+    client.upsert(
+        collection_name="bench",
+        points=[
+            models.PointStruct(id=i, vector={SPARSE_VECTOR_NAME: models.SparseVector(**vec)})
+            for i, vec in enumerate(doc_vectors)
+        ],
+    )
+
+    nnz = [len(vec["indices"]) for vec in doc_vectors]
+    # Mỗi term lưu 1 index uint32 + 1 value float32
+    index_bytes = sum(nnz) * 8
+
+    latencies, hits = [], []
+    for query in queries:
+        query_vector = embedder.get_sparse_vector(query)
+        start = time.perf_counter()
+        result = client.query_points(
+            collection_name="bench",
+            query=models.SparseVector(**query_vector),
+            using=SPARSE_VECTOR_NAME,
+            limit=limit,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append([p.id for p in result.points])
+
+    return {
+        "embed_time": embed_time,
+        "avg_nnz": float(np.mean(nnz)),
+        "index_mb": index_bytes / 1024 / 1024,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "hits": hits,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--doc-top-k", type=int, default=128)
+    parser.add_argument("--doc-min-weight", type=float, default=0.0)
+    parser.add_argument("--query-top-k", type=int, default=32)
+    parser.add_argument("--query-min-weight", type=float, default=0.0)
+    args = parser.parse_args()
+
+    texts = load_sample_chunks(args.chunks)
+    queries = [t[:120] for t in texts[: args.queries]]
+
+    embedder = LocalSparseEmbedding(doc_top_k=0, doc_min_weight=0.0, query_top_k=0, query_min_weight=0.0)
+    baseline = run_case(embedder, texts, queries)
+
+    embedder.doc_top_k, embedder.doc_min_weight = args.doc_top_k, args.doc_min_weight
+    embedder.query_top_k, embedder.query_min_weight = args.query_top_k, args.query_min_weight
+    pruned = run_case(embedder, texts, queries)
+
+    # Overlap top-k giữa 2 cấu hình để ước lượng mất mát recall
+    overlap = np.mean([
+        len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(baseline["hits"], pruned["hits"])
+    ])
+
+    print(f"{'':12} {'embed(s)':>9} {'avg nnz':>9} {'index MB':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, r in [("baseline", baseline), ("pruned", pruned)]:
+        print(f"{name:12} {r['embed_time']:9.2f} {r['avg_nnz']:9.1f} {r['index_mb']:9.2f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f}")
+    print(f"Top-20 overlap (pruned vs baseline): {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
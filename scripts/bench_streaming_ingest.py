@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming ingest (OCR từng trang -> chunk section đã đóng -> embed/upsert) so với upload cả file:
+- batch    : chờ OCR hết file, chunk cả file, sync_document
+- streaming: 3 stage nối bằng queue có giới hạn (settings.ingest_streaming)
+OCR được mô phỏng: file markdown chia thành N trang, mỗi trang "OCR" mất --page-seconds.
+Đo thời gian tới khi search thấy chunk đầu tiên và tổng thời gian. Chạy trên Qdrant local mode (thư mục tạm).
+Chạy: python scripts/bench_streaming_ingest.py --file data/md_dir/sample.md --pages 20 --page-seconds 1.5
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import app.core.upload as upload
+from app.core.config import settings
+from app.services.qdrant_service import VectorStoreService
+
+TENANT_ID = "bench_tenant"
+ROLES = [1]
+
+
+class SimulatedOCR:
+    """Trả markdown có sẵn theo từng trang với độ trễ cố định mỗi trang."""
+
+    def __init__(self, pages, page_seconds: float):
+        self.pages = pages
+        self.page_seconds = page_seconds
+
+    def iter_pages(self, path_input):
+        for page_text in self.pages:
+            time.sleep(self.page_seconds)
+            yield page_text
+
+    def processing_data(self, path_input):
+        Path(upload.PATH_OUTPUT_FILE).mkdir(parents=True, exist_ok=True)
+        output = Path(upload.PATH_OUTPUT_FILE) / (path_input.stem + ".md")
+        output.write_text("".join(self.iter_pages(path_input)), encoding="utf-8")
+
+
+def split_pages(text: str, num_pages: int):
+    # Cắt theo dòng để mô phỏng ranh giới trang (section có thể nằm vắt qua 2 trang)
+    lines = text.splitlines(keepends=True)
+    size = max(1, len(lines) // num_pages)
+    return ["".join(lines[i : i + size]) for i in range(0, len(lines), size)]
+
+
+def first_searchable(db_client: VectorStoreService, src_name: str, started_at: float, done: threading.Event):
+    """Poll số chunk của tài liệu cho tới khi > 0; trả về thời gian (s) kể từ started_at."""
+    doc_filter = db_client._document_filter(TENANT_ID, src_name)
+    while not done.is_set():
+        if db_client.client.count(collection_name=db_client.collection_name, count_filter=doc_filter, exact=True).count:
+            return time.perf_counter() - started_at
+        time.sleep(0.05)
+    return time.perf_counter() - started_at
+
+
+def run(mode: str, pages, args, db_client: VectorStoreService):
+    settings.ingest_streaming = mode == "streaming"
+    upload._ocr_client = SimulatedOCR(pages, args.page_seconds)
+    src_name = f"bench_{mode}.pdf"
+
+    result, done = {}, threading.Event()
+    started_at = time.perf_counter()
+    poller = threading.Thread(target=lambda: result.update(first=first_searchable(db_client, src_name, started_at, done)))
+    poller.start()
+
+    _, total = upload.ProcessFileInput().process_file_upload(Path(src_name), TENANT_ID, ROLES, src_name=src_name)
+    done.set()
+    poller.join()
+    db_client.delete_document(TENANT_ID, src_name)
+    return result["first"], total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", required=True, help="File markdown dùng làm output OCR")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-seconds", type=float, default=1.5, help="Thời gian OCR mô phỏng cho mỗi trang")
+    args = parser.parse_args()
+
+    pages = split_pages(Path(args.file).read_text(encoding="utf-8"), args.pages)
+    with tempfile.TemporaryDirectory() as local_path:
+        db_client = VectorStoreService(local_path=local_path)
+        upload._db_client = db_client
+
+        print(f"Trang: {len(pages)} | OCR mô phỏng {args.page_seconds}s/trang")
+        for mode in ["batch", "streaming"]:
+            first, total = run(mode, pages, args, db_client)
+            print(f"{mode:10} search được sau {first:7.2f}s | tổng {total:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
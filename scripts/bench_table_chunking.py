@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Phân bố kích thước chunk (token) khi tài liệu có bảng Markdown lớn (vd. spreadsheet đã OCR):
+- before: bảng lớn đi qua structure split -> semantic split / HARD_CAP fallback (cắt ngang dòng, mất header)
+- after : bảng lớn chia theo nhóm dòng <= chunking_table_max_tokens, lặp lại header ở mỗi nhóm
+Báo cáo: số chunk, min / p50 / p90 / max / mean token, số chunk > MAX_TOKENS, số chunk bảng thiếu header.
+Chạy: python scripts/bench_table_chunking.py --rows 400 [--file data/md_dir/sample.md]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.chunking_service import MAX_TOKENS, ChunkingService
+
+HEADER_ROW = "| Mã NV | Họ và tên | Phòng ban | Chức danh | Ngày vào làm | Lương cơ bản |"
+
+
+def make_markdown(num_rows: int) -> str:
+    rows = [
+        f"| NV{i:05d} | Nguyễn Văn {i} | Phòng {i % 7 + 1} | Chuyên viên bậc {i % 5 + 1} | 0{i % 9 + 1}/01/2020 | {8_000_000 + i * 10_000} |"
+        for i in range(num_rows)
+    ]
+    return "\n\n".join([
+        "# Báo cáo nhân sự",
+        "## Danh sách nhân viên",
+        "Bảng dưới đây liệt kê toàn bộ nhân viên đang làm việc tại công ty.",
+        "\n".join([HEADER_ROW, "|---|---|---|---|---|---|", *rows]),
+        "## Ghi chú",
+        "Số liệu được cập nhật theo kỳ lương gần nhất.",
+    ])
+
+
+def describe(name: str, chunks, header_line: str):
+    tokens = np.array([chunk["metadata"]["token_count"] for chunk in chunks])
+    # Chunk có dòng bảng nhưng không có header -> LLM không biết cột nào là gì
+    headless = sum(
+        1 for chunk in chunks
+        if any(line.startswith("|") for line in chunk["content"].splitlines()) and header_line not in chunk["content"]
+    )
+    print(
+        f"{name:7} chunks {len(chunks):5} | min {tokens.min():5} | p50 {int(np.percentile(tokens, 50)):5}"
+        f" | p90 {int(np.percentile(tokens, 90)):5} | max {tokens.max():5} | mean {tokens.mean():7.1f}"
+        f" | > MAX_TOKENS {int((tokens > MAX_TOKENS).sum()):4} | bảng thiếu header {headless:4}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--file", help="File markdown có bảng lớn thay cho dữ liệu sinh ngẫu nhiên")
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text(encoding="utf-8") if args.file else make_markdown(args.rows)
+    header_line = HEADER_ROW if not args.file else next(
+        (line for line in text.splitlines() if line.startswith("|")), HEADER_ROW
+    )
+
+    service = ChunkingService()
+    for name, enabled in [("before", False), ("after", True)]:
+        service.table_row_groups = enabled
+        chunks = service.process_hybrid_splitting(text, "bench_tenant", "bench.md", [1])
+        describe(name, chunks, header_line)
+
+
+if __name__ == "__main__":
+    main()
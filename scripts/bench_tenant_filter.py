@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark latency search có filter tenant khi số tenant tăng:
+- shared: keyword index thường + HNSW toàn cục (m=16) - layout hiện tại
+- tenant: tenant index (is_tenant=True) + graph riêng từng tenant (m=0, payload_m=16)
+Cần Qdrant server tại settings.qdrant_url.
+Chạy: python scripts/bench_tenant_filter.py --points-per-tenant 2000 --tenants 1 10 50
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.config import settings
+
+COLLECTION = "bench_tenant_filter"
+DIM = 1024
+
+LAYOUTS = {
+    "shared": (models.PayloadSchemaType.KEYWORD, models.HnswConfigDiff(m=16, ef_construct=100)),
+    "tenant": (
+        models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+        models.HnswConfigDiff(m=0, payload_m=16, ef_construct=100),
+    ),
+}
+
+
+def build_collection(client: QdrantClient, layout: str, num_tenants: int, points_per_tenant: int):
+    tenant_schema, hnsw_config = LAYOUTS[layout]
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE),
+        hnsw_config=hnsw_config,
+    )
+    # Payload index phải có trước khi upload để Qdrant build graph theo tenant
+    client.create_payload_index(COLLECTION, "tenant_id", tenant_schema)
+    client.create_payload_index(COLLECTION, "accessed_role", models.PayloadSchemaType.INTEGER)
+
+    rng = np.random.default_rng(0)
+    total = num_tenants * points_per_tenant
+    vectors = rng.standard_normal((total, DIM)).astype(np.float32)
+    payload = [
+        {"tenant_id": str(i // points_per_tenant), "accessed_role": [int(rng.integers(1, 4))]}
+        for i in range(total)
+    ]
+    client.upload_collection(COLLECTION, vectors=vectors, payload=payload, ids=range(total), batch_size=256)
+
+    while client.get_collection(COLLECTION).status != models.CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def measure(client: QdrantClient, num_tenants: int, queries: np.ndarray) -> tuple[float, float]:
+    latencies = []
+    for i, q in enumerate(queries):
+        query_filter = models.Filter(must=[
+            models.FieldCondition(key="tenant_id", match=models.MatchValue(value=str(i % num_tenants))),
+            models.FieldCondition(key="accessed_role", match=models.MatchAny(any=[1, 2])),
+        ])
+        start = time.perf_counter()
+        client.query_points(COLLECTION, query=q.tolist(), query_filter=query_filter, limit=20)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--points-per-tenant", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=settings.qdrant_url, timeout=300)
+    queries = np.random.default_rng(1).standard_normal((args.queries, DIM)).astype(np.float32)
+
+    print(f"{'tenants':>8} {'layout':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for num_tenants in args.tenants:
+        for layout in LAYOUTS:
+            build_collection(client, layout, num_tenants, args.points_per_tenant)
+            p50, p95 = measure(client, num_tenants, queries)
+            print(f"{num_tenants:8} {layout:>8} {p50:8.2f} {p95:8.2f}")
+
+    client.delete_collection(COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Fixture dùng chung cho các test chunking / ingest: ChunkingService không tải model thật
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+class FakeEmbeddings:
+    """Embedding cố định theo độ dài câu - đủ cho semantic split, không cần tải model."""
+
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed(self, texts, show_progress_bar=False):
+        import numpy as np
+        return np.array(self.embed_documents(texts), dtype=np.float32)
+
+
+@pytest.fixture
+def chunking_service():
+    """ChunkingService với tokenizer WordLevel + Whitespace (1 từ = 1 token) thay cho tokenizer của model."""
+    pytest.importorskip("pydantic_settings")
+    pytest.importorskip("langchain_text_splitters")
+    pytest.importorskip("langchain_experimental")
+    pytest.importorskip("sentence_transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+
+    from app.services.chunking_service import ChunkingService
+
+    word_level = tokenizers.Tokenizer(tokenizers.models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    word_level.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=word_level, unk_token="[UNK]")
+
+    return ChunkingService(embedding_client=FakeEmbeddings(), tokenizer=tokenizer)
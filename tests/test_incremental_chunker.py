@@ -0,0 +1,188 @@
+"""
+Test IncrementalChunker: nạp markdown theo từng trang phải cho ra đúng các chunk của
+process_hybrid_splitting / process_small_to_big trên cả file (nội dung, metadata, point_id)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+TENANT_ID = "test_tenant"
+SRC_FILE = "so_tay_nhan_vien.pdf"
+ROLES = [1, 2]
+
+
+def _paragraph(topic: str, words: int) -> str:
+    sentence = f"Quy định về {topic} áp dụng cho nhân viên chính thức của công ty."
+    count = max(1, words // len(sentence.split()))
+    return " ".join([sentence] * count)
+
+
+def _table(rows: int) -> str:
+    lines = ["| Mã NV | Họ và tên | Phòng ban |", "|---|---|---|"]
+    lines += [f"| NV{i:04d} | Nguyễn Văn {i} | Phòng {i % 5 + 1} |" for i in range(rows)]
+    return "\n".join(lines)
+
+
+DOCUMENT = "\n\n".join([
+    "Tài liệu nội bộ, không phát hành ra ngoài.",
+    "# Giới thiệu",
+    _paragraph("giới thiệu", 60),
+    "## Tầm nhìn",
+    _paragraph("tầm nhìn", 150),
+    "## Sứ mệnh",
+    _paragraph("sứ mệnh", 650),
+    "# Giới thiệu",
+    _paragraph("lịch sử", 90),
+    "# Quy trình kỹ thuật",
+    "```bash\n# không phải header\nmake deploy\n```",
+    _paragraph("triển khai", 120),
+    "## Triển khai",
+    _paragraph("môi trường", 1400),
+    "# Danh sách nhân sự",
+    _table(300),
+    "## Ghi chú",
+    _paragraph("ghi chú", 30),
+    "#",
+    _paragraph("phụ lục", 40),
+    "# Nghỉ phép",
+    "## Phép năm",
+    _paragraph("phép năm", 220),
+    "## Nghỉ ốm",
+    _paragraph("nghỉ ốm", 20),
+]) + "\n"
+
+# 1 H1 + nhiều H2 (trường hợp phổ biến): phải emit chunk theo H2 trước khi hết tài liệu
+SINGLE_H1_DOCUMENT = "\n\n".join([
+    "# Sổ tay nhân viên",
+    _paragraph("mục đích", 30),
+    *[
+        block
+        for i in range(30)
+        for block in (f"## Mục {i + 1}", _paragraph(f"mục {i + 1}", [40, 120, 260, 90, 480][i % 5]))
+    ],
+    "## Mục 30",
+    _paragraph("mục 30 bổ sung", 50),
+    "### Chi tiết",
+    "## Phụ lục",
+    _paragraph("phụ lục", 70),
+]) + "\n"
+
+DOCUMENTS = [
+    pytest.param(DOCUMENT, id="many-h1"),
+    pytest.param(SINGLE_H1_DOCUMENT, id="single-h1"),
+]
+
+
+def _pages_by_chars(text: str, size: int):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def _pages_by_lines(text: str, size: int):
+    lines = text.splitlines(keepends=True)
+    return ["".join(lines[i : i + size]) for i in range(0, len(lines), size)]
+
+
+def _comparable(chunks):
+    # chunk_id là uuid4 ngẫu nhiên, không phụ thuộc nội dung
+    return [{key: value for key, value in chunk.items() if key != "chunk_id"} for chunk in chunks]
+
+
+def _feed_pages(service, pages, small_to_big=False):
+    from app.services.chunking_service import IncrementalChunker
+
+    chunker = IncrementalChunker(service, TENANT_ID, SRC_FILE, ROLES, small_to_big=small_to_big)
+    batches = [chunker.feed(page) for page in pages]
+    batches.append(chunker.close())
+    return [batch for batch in batches if batch[1]]
+
+
+def _assign_point_ids(batches):
+    pytest.importorskip("qdrant_client")
+    from app.services.qdrant_service import VectorStoreService
+
+    # assign_point_ids không dùng kết nối Qdrant
+    store, occurrences = object.__new__(VectorStoreService), {}
+    for chunks in batches:
+        store.assign_point_ids(chunks, occurrences)
+    return [chunk["point_id"] for chunks in batches for chunk in chunks]
+
+
+PAGINATIONS = [
+    pytest.param(lambda text: [text], id="single-page"),
+    pytest.param(lambda text: _pages_by_chars(text, 1), id="1-char"),
+    pytest.param(lambda text: _pages_by_chars(text, 97), id="97-chars"),
+    pytest.param(lambda text: _pages_by_chars(text, 1500), id="1500-chars"),
+    pytest.param(lambda text: _pages_by_lines(text, 1), id="1-line"),
+    pytest.param(lambda text: _pages_by_lines(text, 4), id="4-lines"),
+]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("paginate", PAGINATIONS)
+def test_incremental_matches_whole_file(chunking_service, document, paginate):
+    pages = paginate(document)
+    assert "".join(pages) == document
+
+    expected = chunking_service.process_hybrid_splitting(document, TENANT_ID, SRC_FILE, ROLES)
+    batches = _feed_pages(chunking_service, pages)
+    actual = [chunk for _, chunks in batches for chunk in chunks]
+
+    assert _comparable(actual) == _comparable(expected)
+    assert _assign_point_ids([chunks for _, chunks in batches]) == _assign_point_ids([expected])
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("paginate", PAGINATIONS)
+def test_incremental_small_to_big_matches_whole_file(chunking_service, document, paginate):
+    pages = paginate(document)
+
+    expected_parents, expected_children = chunking_service.process_small_to_big(document, TENANT_ID, SRC_FILE, ROLES)
+    batches = _feed_pages(chunking_service, pages, small_to_big=True)
+    parents = [parent for batch_parents, _ in batches for parent in batch_parents]
+    children = [child for _, batch_children in batches for child in batch_children]
+
+    assert _comparable(parents) == _comparable(expected_parents)
+    assert _comparable(children) == _comparable(expected_children)
+    assert _assign_point_ids([chunks for _, chunks in batches]) == _assign_point_ids([expected_children])
+
+
+def test_incremental_emits_before_close(chunking_service):
+    """Streaming thật sự: các H1 đã đóng được chunk trước khi hết tài liệu."""
+    batches = _feed_pages(chunking_service, _pages_by_lines(DOCUMENT, 4))
+    assert len(batches) > 1
+
+
+def test_single_h1_emits_h2_sections_before_close(chunking_service):
+    """1 H1 + nhiều H2: các section H2 được chunk dần theo trang, không dồn hết vào close()."""
+    from app.services.chunking_service import IncrementalChunker
+
+    chunker = IncrementalChunker(chunking_service, TENANT_ID, SRC_FILE, ROLES)
+    fed = [chunks for page in _pages_by_lines(SINGLE_H1_DOCUMENT, 4) for _, chunks in [chunker.feed(page)]]
+    _, closed = chunker.close()
+
+    streamed = sum(len(chunks) for chunks in fed)
+    assert sum(1 for chunks in fed if chunks) > 5
+    assert streamed > len(closed)
+    # Phần còn giữ lại tới close() chỉ là đoạn cuối tài liệu, không phải cả file
+    assert len(chunker.buffer) == 0 and len(closed) <= 3
+
+
+def test_no_cut_inside_code_block_or_repeated_h1(chunking_service):
+    from app.services.chunking_service import IncrementalChunker
+
+    chunker = IncrementalChunker(chunking_service, TENANT_ID, SRC_FILE, ROLES)
+    assert chunker.feed("# A\n\nMở đầu.\n\n```\n") == (None, [])
+    assert chunker.feed("# B trong code block\n```\n\n") == (None, [])
+    assert chunker.feed("# A\n\nTiếp tục A.\n\n") == (None, [])
+    # Dòng H1 chưa kết thúc bằng \n: chưa biết tiêu đề đầy đủ -> chưa cắt
+    assert chunker.feed("# C") == (None, [])
+    _, chunks = chunker.feed("\n\nNội dung C.\n")
+    assert chunks and {chunk["metadata"]["h1"] for chunk in chunks} == {"A"}
+    _, rest = chunker.close()
+    assert {chunk["metadata"]["h1"] for chunk in rest} == {"C"}
@@ -0,0 +1,66 @@
+"""
+Test bộ phát hiện câu hỏi nối tiếp (detect_follow_up) trước khi viết lại câu hỏi
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+pytest.importorskip("pydantic_settings")
+
+from app.services.query_rewriter import detect_follow_up
+
+HISTORY = [
+    {"role": "user", "content": "Quy trình xin nghỉ phép năm như thế nào?"},
+    {"role": "assistant", "content": "Nhân viên gửi đơn cho trưởng phòng trước 3 ngày làm việc."},
+]
+
+
+@pytest.mark.parametrize("query", [
+    "Nó nộp ở đâu?",
+    "Anh ấy thuộc phòng nào?",
+    "Quy trình này mất bao lâu?",
+    "Còn phòng kế toán thì sao?",
+    "Còn hợp đồng thử việc?",
+    "Vậy còn nhân viên thời vụ được nghỉ mấy ngày?",
+    "Họ được nghỉ bao nhiêu ngày?",
+    "Chúng có được tính vào lương tháng 13 không?",
+])
+def test_follow_up_with_history(query):
+    assert detect_follow_up(query, HISTORY) == "anaphora"
+
+
+@pytest.mark.parametrize("query", [
+    "Nó nộp ở đâu?",
+    "Quy trình này mất bao lâu?",
+    "Còn phòng kế toán thì sao?",
+    "Lương?",
+])
+def test_no_history_never_flags(query):
+    assert detect_follow_up(query, None) is None
+    assert detect_follow_up(query, []) is None
+
+
+@pytest.mark.parametrize("query", [
+    "Còn bao nhiêu ngày phép năm được chuyển sang năm sau?",
+    "Còn thiếu giấy tờ gì khi làm hồ sơ bảo hiểm xã hội cho nhân viên mới?",
+    "Danh sách phòng ban, trong đó phòng nào có nhiều nhân viên nhất?",
+    "Sau khi ký hợp đồng chính thức, sau đó nhân viên cần nộp những giấy tờ gì?",
+    "Chính sách bảo hiểm sức khỏe dành cho nhân viên chính thức gồm những quyền lợi nào?",
+    "Chúng tôi cần chuẩn bị hồ sơ gì khi tuyển dụng nhân viên mới?",
+    "Chúng ta có bao nhiêu ngày nghỉ lễ trong năm 2024?",
+    "Họ và tên trên hợp đồng lao động ghi theo giấy tờ nào?",
+    "Cách sửa họ tên trên sổ bảo hiểm xã hội như thế nào?",
+    "Năm đó công ty áp dụng mức lương tối thiểu vùng bao nhiêu?",
+])
+def test_standalone_questions_with_history(query):
+    assert detect_follow_up(query, HISTORY) is None
+
+
+def test_short_query_with_history():
+    assert detect_follow_up("Lương?", HISTORY) == "short"
@@ -0,0 +1,118 @@
+"""
+Test RetrievalCache: generation counter của tenant làm mất hiệu lực bộ ứng viên đã cache
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("redis")
+pytest.importorskip("msgpack")
+pytest.importorskip("zstandard")
+pytest.importorskip("qdrant_client")
+
+from qdrant_client import models
+
+from app.services.retrieval_cache import RetrievalCache
+
+TENANT_ID = "test_tenant"
+EMPLOYEE_ID = "nv001"
+ROLES = [1, 2]
+
+
+class InMemoryRedis:
+    """Các lệnh Redis mà RetrievalCache dùng (get / set / incr / pipeline), lưu trong dict."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1).encode()
+        return int(self.data[key])
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        return [self.client.get(key) for key in self.commands]
+
+
+@pytest.fixture
+def cache():
+    retrieval_cache = RetrievalCache()
+    retrieval_cache.redis_client = InMemoryRedis()
+    return retrieval_cache
+
+
+def _points():
+    return [
+        models.ScoredPoint(id=f"00000000-0000-0000-0000-00000000000{i}", version=0, score=1.0 - i / 10,
+                           payload={"src_file": "noi_quy.pdf", "content": f"đoạn {i}", "content_hash": f"h{i}"})
+        for i in range(3)
+    ]
+
+
+def test_put_then_get_hits(cache):
+    entry, generation = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    assert entry is None
+    cache.put(TENANT_ID, EMPLOYEE_ID, ROLES, "Quy trình nghỉ phép?", [1.0, 0.0], _points(), generation)
+
+    entry, _ = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    assert entry is not None
+    assert [str(point.id) for point in entry["points"]] == [str(point.id) for point in _points()]
+    # Chỉ lưu payload rút gọn, content lấy lại theo id khi dùng
+    assert all("content" not in point.payload for point in entry["points"])
+
+
+def test_invalidate_during_turn_is_a_miss(cache):
+    """Tài liệu đổi giữa get() và put() của cùng 1 lượt -> entry mang generation cũ, lượt sau không dùng."""
+    _, generation = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    cache.invalidate_tenant(TENANT_ID)
+    cache.put(TENANT_ID, EMPLOYEE_ID, ROLES, "Quy trình nghỉ phép?", [1.0, 0.0], _points(), generation)
+
+    entry, _ = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    assert entry is None
+
+
+def test_invalidate_after_put_is_a_miss(cache):
+    _, generation = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    cache.put(TENANT_ID, EMPLOYEE_ID, ROLES, "Quy trình nghỉ phép?", [1.0, 0.0], _points(), generation)
+    cache.invalidate_tenant(TENANT_ID)
+
+    entry, _ = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    assert entry is None
+
+
+def test_other_roles_miss(cache):
+    _, generation = cache.get(TENANT_ID, EMPLOYEE_ID, ROLES)
+    cache.put(TENANT_ID, EMPLOYEE_ID, ROLES, "Quy trình nghỉ phép?", [1.0, 0.0], _points(), generation)
+
+    entry, _ = cache.get(TENANT_ID, EMPLOYEE_ID, [1])
+    assert entry is None
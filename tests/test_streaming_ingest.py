@@ -0,0 +1,101 @@
+"""
+Test streaming ingest: upload đi qua nhánh settings.ingest_streaming
+(OCR từng trang -> IncrementalChunker -> stream_document) với OCR / Qdrant giả lập
+"""
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+TENANT_ID = "test_tenant"
+ROLES = [1]
+
+PAGES = [
+    "# Quy định chung\n\nNội quy áp dụng cho toàn bộ nhân viên chính thức và thử việc.\n\n",
+    "## Giờ làm việc\n\nNhân viên làm việc từ thứ Hai đến thứ Sáu, sáng 8 giờ đến 17 giờ.\n\n",
+    "# Nghỉ phép\n\n## Phép năm\n\nMỗi nhân viên có 12 ngày phép năm.\n\n",
+    "## Nghỉ ốm\n\nNghỉ ốm cần giấy xác nhận của cơ sở y tế.\n",
+]
+
+
+class StubOCR:
+    """OCR giả lập: trả markdown có sẵn theo từng trang."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def iter_pages(self, path_input):
+        self.calls.append(path_input)
+        yield from self.pages
+
+
+class FakeIndexManager:
+    @contextmanager
+    def ingest(self, tenant_id=None):
+        yield
+
+
+class FakeVectorStore:
+    """Chỉ ghi lại các đợt (parents, chunks) mà stream_document nhận được."""
+
+    def __init__(self):
+        self.index_manager = FakeIndexManager()
+        self.batches = []
+
+    def stream_document(self, tenant_id, src_file, batches, started_at=None):
+        for parents, chunks in batches:
+            self.batches.append((tenant_id, src_file, parents, chunks))
+        total = sum(len(chunks) for _, _, _, chunks in self.batches)
+        return {"total_chunks": total, "upserted": total, "deleted": 0, "cache_hit_ratio": 0.0}
+
+
+def test_process_file_upload_streaming(monkeypatch, chunking_service):
+    import app.core.upload as upload
+    from app.core.config import settings
+
+    ocr_client, db_client = StubOCR(PAGES), FakeVectorStore()
+    monkeypatch.setattr(settings, "ingest_streaming", True)
+    monkeypatch.setattr(settings, "retrieval_small_to_big", False)
+    monkeypatch.setattr(settings, "retrieval_cache_enabled", False)
+    monkeypatch.setattr(upload, "_ocr_client", ocr_client)
+    monkeypatch.setattr(upload, "_chunking_client", chunking_service)
+    monkeypatch.setattr(upload, "_db_client", db_client)
+
+    src_file = Path("noi_quy.pdf")
+    markdown_doc, _ = upload.ProcessFileInput().process_file_upload(src_file, TENANT_ID, ROLES, src_name="noi_quy.pdf")
+
+    assert ocr_client.calls == [src_file]
+    assert markdown_doc == "".join(PAGES)
+    assert db_client.batches
+    chunks = [chunk for _, _, _, batch in db_client.batches for chunk in batch]
+    assert all(tenant == TENANT_ID and src == "noi_quy.pdf" for tenant, src, _, _ in db_client.batches)
+    assert all(parents is None for _, _, parents, _ in db_client.batches)
+    assert {chunk["metadata"]["h1"] for chunk in chunks} == {"Quy định chung", "Nghỉ phép"}
+    assert "Mỗi nhân viên có 12 ngày phép năm." in "\n".join(chunk["content"] for chunk in chunks)
+
+
+def test_streaming_ocr_error_propagates(monkeypatch, chunking_service):
+    import app.core.upload as upload
+    from app.core.config import settings
+
+    class FailingOCR(StubOCR):
+        def iter_pages(self, path_input):
+            yield self.pages[0]
+            raise RuntimeError("OCR lỗi ở trang 2")
+
+    monkeypatch.setattr(settings, "ingest_streaming", True)
+    monkeypatch.setattr(settings, "retrieval_small_to_big", False)
+    monkeypatch.setattr(settings, "retrieval_cache_enabled", False)
+    monkeypatch.setattr(upload, "_ocr_client", FailingOCR(PAGES))
+    monkeypatch.setattr(upload, "_chunking_client", chunking_service)
+    monkeypatch.setattr(upload, "_db_client", FakeVectorStore())
+
+    with pytest.raises(RuntimeError, match="OCR lỗi"):
+        upload.ProcessFileInput().process_file_upload(Path("noi_quy.pdf"), TENANT_ID, ROLES, src_name="noi_quy.pdf")